@@ -7,6 +7,7 @@ from collections import defaultdict
 import heapq
 from utils import is_valid_permutation, generate_permutations, calculate_overlap, hash_permutation, unhash_permutation, kmer_to_int, int_to_kmer
 from graph_utils import build_de_bruijn_graph, add_weights_to_debruijn, analyze_debruijn_graph
+from laminate_utils import compile_laminate_stack
 
 def is_prodigal(sequence, all_permutations, n, min_length=20, overlap_threshold=0.95):
     """Checks if a sequence is a 'Prodigal Result'."""
@@ -97,6 +98,30 @@ def calculate_winners_losers(superpermutations, n, k=None):
     return winners_losers
 
 
+def update_winners_losers(winners, losers, new_winners, new_losers):
+    """Adds newly observed winner/loser weights into the running totals.
+
+    Args:
+        winners (dict): Running {(n, kmer): weight} winner totals (updated in place).
+        losers (dict): Running {(n, kmer): weight} loser totals (updated in place).
+        new_winners (dict): Winner weights to add.
+        new_losers (dict): Loser weights to add.
+
+    Returns:
+        set: The (n, kmer) keys whose totals changed, so dependent structures
+        (such as De Bruijn edge weights) can be refreshed incrementally.
+    """
+    changed = set()
+    for kmer, weight in new_winners.items():
+        if weight:
+            winners[kmer] = winners.get(kmer, 0) + weight
+            changed.add(kmer)
+    for kmer, weight in new_losers.items():
+        if weight:
+            losers[kmer] = losers.get(kmer, 0) + weight
+            changed.add(kmer)
+    return changed
+
 def identify_anti_prodigals(superpermutations, n, k, overlap_threshold, winners, losers, anti_prodigal_threshold):
     """Identifies 'anti-prodigal' k-mers within a set of superpermutations.
 
@@ -501,19 +526,13 @@ def insert_n_plus_1(n7_sequence, n, winners, losers, layout_memory, laminates, a
     n7_list = [int(x) for x in n7_sequence]
 
     # --- Early Laminate Filtering ---
+    # ALL laminates and anti-laminates, fused into one automaton (one table lookup per symbol).
+    # Each laminate constrains the windows of its own edge length; the old extra n-2 check ran
+    # (n-1)-edge laminates against (n-2)-windows. Pass the (n, n-2) laminates to check n-2 windows.
+    laminate_automaton = compile_laminate_stack(list(laminates) + list(anti_laminates), n)
+
     def is_fully_compatible(perm):
-    # Check against ALL laminates and anti-laminates
-        for laminate in laminates:
-            if not is_compatible(perm, laminate, n, n-1): #Check n-1
-                return False
-            if not is_compatible(perm, laminate, n, n-2): #Check n-2
-                return False
-        for anti_laminate in anti_laminates:
-            if not is_compatible(perm, anti_laminate, n, n-1):
-                return False
-            if not is_compatible(perm, anti_laminate, n, n-2):
-                return False
-        return True
+        return laminate_automaton.accepts(perm)
 
     # Iterate through all possible insertion positions
     for i in range(len(n7_list) + 1):
@@ -525,7 +544,7 @@ def insert_n_plus_1(n7_sequence, n, winners, losers, layout_memory, laminates, a
             # Basic filtering:
             valid = True
             #Anti-Laminate Check (n-1 and n-2)
-            if not is_fully_compatible(tuple(new_perm), "anti"):
+            if not is_fully_compatible(tuple(new_perm)):
                 valid = False
 
             #Loser check (n-1 and n-2)
@@ -626,7 +645,7 @@ def calculate_sequence_score(sequence, n, winners, losers, layout_memory, lamina
 
     # 5. Prodigal Bonus
     prodigal_bonus = 0
-    best_prodigals = prodigal_manager.get_best_prodigals(n=n, task="generation", context={})
+    best_prodigals = prodigal_manager.get_best_prodigals(n=n, task="generation", context={})  # Every prodigal can earn the bonus
     for p_id, p_data in best_prodigals.items():
         if p_data['sequence'] in sequence:
             prodigal_bonus += 500
@@ -14,6 +14,7 @@ config_n6 = {
         "de_bruijn": 0.05,
         "mutation": 0.05,
         "random_constrained": 0.0,  # Not used in construction phase.
+        "atsp_local_search": 0.1,  # Iterated local search over the overlap ATSP
     },
     "formula_set": "set_1",  # Which set of formulas to use
     "action_function": "action_a6",  # Use action function A6
@@ -42,12 +43,26 @@ config_n6 = {
     "prodigal_min_length": 10,
     "prodigal_overlap_threshold": 0.98,
     "anti_prodigal_threshold": 2.0,
+    "prodigal_ranking_weights": {},  # Overrides for prodigal_manager.DEFAULT_RANKING_WEIGHTS
+    "prodigal_backend": "json",  # "sqlite" keeps prodigals in a SQLite database instead of memory
+    "prodigal_journal": True,  # JSON backend: journal every new prodigal instead of rewriting the file on save
     "max_bridge_length": 100,  # Maximum length for bridge sequences
+    "bridge_candidates": 5,  # Bridges returned by the A* bridge search
+    "bridge_missing_bonus": 0.25,  # Bridge cost reduction per missing permutation covered (< 1)
     "de_bruijn_k": 5,  # k value for De Bruijn graph
+    "de_bruijn_beam_width": 32,  # Paths kept per step by find_high_weight_paths
+    "de_bruijn_max_expansions": 1000000,  # Edge expansion budget for the beam search
+    "de_bruijn_time_budget": 5.0,  # Seconds allowed for the beam search
+    "atsp_time_budget": 10.0,  # Seconds allowed for the ATSP local search
+    "atsp_workers": 1,  # Independent seeded ATSP runs, one per process
+    "prodigal_workers": 1,  # Processes extending/analyzing new prodigals in add_prodigals
+    "prodigal_select_count": 100,  # Top prodigals fetched by strategies and scoring (get_best_prodigals count)
     "megawinner_lengths": [10, 11],  # Lengths for MegaWinners/MegaLosers
     "megawinner_loser_threshold": 2.0, # Threshold multiplier for MegaWinner/MegaLoser identification
     "num_laminates_to_select": 5,  # Number of laminates to select from the album
     "laminate_merge_method": "intersection", # How to merge laminates
+    "laminate_connectivity_samples": 32,  # Node pairs sampled by the connectivity estimate
+    "laminate_connectivity_time_budget": 0.05,  # Seconds allowed for the connectivity estimate
     #Data files set to none, because all data will be generated.
     "data_filepaths": {
         "winners_losers": None,
@@ -69,6 +84,7 @@ config_n7 = {
         "de_bruijn": 0.05,
         "mutation": 0.05,
         "random_constrained": 0.0,
+        "atsp_local_search": 0.1,  # Iterated local search over the overlap ATSP
     },
     "formula_set": "set_1", # Which set of formulas to use
     "action_function": "action_a6",
@@ -97,12 +113,26 @@ config_n7 = {
     "prodigal_min_length": 20,
     "prodigal_overlap_threshold": 0.98,
     "anti_prodigal_threshold": 2.0,
+    "prodigal_ranking_weights": {},  # Overrides for prodigal_manager.DEFAULT_RANKING_WEIGHTS
+    "prodigal_backend": "json",  # "sqlite" keeps prodigals in a SQLite database instead of memory
+    "prodigal_journal": True,  # JSON backend: journal every new prodigal instead of rewriting the file on save
     "max_bridge_length": 150,
+    "bridge_candidates": 5,  # Bridges returned by the A* bridge search
+    "bridge_missing_bonus": 0.25,  # Bridge cost reduction per missing permutation covered (< 1)
     "de_bruijn_k": 6,
+    "de_bruijn_beam_width": 32,  # Paths kept per step by find_high_weight_paths
+    "de_bruijn_max_expansions": 1000000,  # Edge expansion budget for the beam search
+    "de_bruijn_time_budget": 10.0,  # Seconds allowed for the beam search
+    "atsp_time_budget": 30.0,  # Seconds allowed for the ATSP local search
+    "atsp_workers": 2,  # Independent seeded ATSP runs, one per process
+    "prodigal_workers": 2,  # Processes extending/analyzing new prodigals in add_prodigals
+    "prodigal_select_count": 200,  # Top prodigals fetched by strategies and scoring (get_best_prodigals count)
     "megawinner_lengths": [12, 13, 19, 20],
     "megawinner_loser_threshold": 2.0,
     "num_laminates_to_select": 5,
     "laminate_merge_method": "intersection",
+    "laminate_connectivity_samples": 32,  # Node pairs sampled by the connectivity estimate
+    "laminate_connectivity_time_budget": 0.05,  # Seconds allowed for the connectivity estimate
     #Data files set to none, because all data will be generated.
     "data_filepaths": {
         "winners_losers": None,
@@ -124,6 +154,7 @@ config_n8 = {
         "de_bruijn": 0.05, # Reduced
         "mutation": 0.05, # Increased mutation
         "random_constrained": 0.0, # Only for testing
+        "atsp_local_search": 0.1,  # Iterated local search over the overlap ATSP
     },
     "formula_set": "set_1", # Which set of formulas to use
     "action_function": "action_a6", # Still using a hybrid, refined action function
@@ -152,12 +183,26 @@ config_n8 = {
     "prodigal_min_length": 50,  # Increased prodigal length for n=8
     "prodigal_overlap_threshold": 0.98,  # High overlap threshold
     "anti_prodigal_threshold": 1.5,  # Tuned threshold
+    "prodigal_ranking_weights": {},  # Overrides for prodigal_manager.DEFAULT_RANKING_WEIGHTS
+    "prodigal_backend": "json",  # "sqlite" keeps prodigals in a SQLite database instead of memory
+    "prodigal_journal": True,  # JSON backend: journal every new prodigal instead of rewriting the file on save
     "max_bridge_length": 250, # Maximum length for bridge sequences
+    "bridge_candidates": 5,  # Bridges returned by the A* bridge search
+    "bridge_missing_bonus": 0.25,  # Bridge cost reduction per missing permutation covered (< 1)
     "de_bruijn_k": 7,  # k value for De Bruijn graph
+    "de_bruijn_beam_width": 64,  # Paths kept per step by find_high_weight_paths
+    "de_bruijn_max_expansions": 1000000,  # Edge expansion budget for the beam search
+    "de_bruijn_time_budget": 30.0,  # Seconds allowed for the beam search
+    "atsp_time_budget": 120.0,  # Seconds allowed for the ATSP local search
+    "atsp_workers": 4,  # Independent seeded ATSP runs, one per process
+    "prodigal_workers": 4,  # Processes extending/analyzing new prodigals in add_prodigals
+    "prodigal_select_count": 400,  # Top prodigals fetched by strategies and scoring (get_best_prodigals count)
     "megawinner_lengths": [14, 15, 21, 22, 30, 40, 50],  # Lengths for MegaWinners/MegaLosers
     "megawinner_loser_threshold": 2.5, # Increased threshold
     "num_laminates_to_select": 10,
     "laminate_merge_method": "intersection", # Using intersection for merging
+    "laminate_connectivity_samples": 32,  # Node pairs sampled by the connectivity estimate
+    "laminate_connectivity_time_budget": 0.05,  # Seconds allowed for the connectivity estimate
     #Data files set to none, because all data will be generated.
     "data_filepaths": {
         "winners_losers": None,
@@ -167,4 +212,4 @@ config_n8 = {
         "anti_laminates": None,
         "best_superpermutation": None,
     },
-}
\ No newline at end of file
+}
\ No newline at end of file
@@ -0,0 +1,17 @@
+# conftest.py
+import sys
+import types
+
+# This tree does not ship analysis_scripts_final, whose analysis hooks prodigal_manager imports.
+# Tests patch the hooks they need; any other call fails loudly.
+try:
+    import analysis_scripts_final  # noqa: F401
+except ImportError:
+    def _missing_hook(*args, **kwargs):
+        raise NotImplementedError("analysis_scripts_final is not available; patch this hook in the test.")
+
+    _hooks = types.ModuleType("analysis_scripts_final")
+    for _name in ("calculate_winners_losers", "identify_anti_prodigals", "is_prodigal", "calculate_sequence_score",
+                  "find_prodigal_results", "calculate_extensibility_score", "analyze_prodigal", "extend_prodigal"):
+        setattr(_hooks, _name, _missing_hook)
+    sys.modules["analysis_scripts_final"] = _hooks
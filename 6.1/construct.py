@@ -3,6 +3,7 @@ import random
 import logging
 import time
 import math
+import os
 from collections import defaultdict
 import heapq
 
@@ -13,6 +14,7 @@ import graph
 import laminate
 import prodigal
 from formulas import sp_v14, segment_length_best  # Import specific formulas
+from graph_utils import permutation_de_bruijn_graph, add_weights_to_debruijn, find_high_weight_paths, update_cached_edge_weights, load_overlap_graph, find_bridges, run_atsp_search, tour_from_sequence
 
 
 def construct_superpermutation(n, config):
@@ -36,7 +38,9 @@ def construct_superpermutation(n, config):
     winners = defaultdict(float)  # Using defaultdict for easier updates
     losers = defaultdict(float)
     layout_memory = {}  # Using a standard dictionary
-    prodigal_manager = prodigal.ProdigalManager(n)  # Manage prodigals
+    prodigal_manager = prodigal.ProdigalManager(n, ranking_weights=config.get("prodigal_ranking_weights"),
+                                               backend=config.get("prodigal_backend", "json"),
+                                               journal=config.get("prodigal_journal", False))  # Manage prodigals
     laminates = {}  # { (n, k): [list of laminates] }
     anti_laminates = {}
     best_known_length = float('inf')  # Start with infinity
@@ -86,7 +90,7 @@ def construct_superpermutation(n, config):
 
         if current_n <= 5:
             # --- Base Cases (n <= 5) ---  Use direct generation
-            superpermutation = utils.generate_n_minus_1_superpermutation(current_n, config["seed"])
+            superpermutation = utils.generate_n_minus_1_superpermutation(current_n, config["seed"], config)
             if superpermutation:
                 logging.info(f"Generated minimal superpermutation for n={current_n} (length: {len(superpermutation)})")
                 best_known_length = len(superpermutation)
@@ -137,7 +141,7 @@ def construct_superpermutation(n, config):
                                                                         winners, losers, layout_memory,
                                                                         best_known_length, config["seed"],
                                                                         laminates.get((current_n, current_n-1),[]), anti_laminates.get((current_n, current_n-1),[]),
-                                                                        constraint_laminates, missing_permutations)
+                                                                        constraint_laminates, missing_permutations, config)
                 #Check length.
                 if hypothetical_sp:
                     if len(hypothetical_sp) > best_known_length:
@@ -154,7 +158,8 @@ def construct_superpermutation(n, config):
                 )  # No layout_memory_filename for single-process
 
                 # 4. Data Update and Analysis
-                analysis.update_winners_losers(winners, losers, new_winners, new_losers) # Update winners/losers
+                changed_kmers = analysis.update_winners_losers(winners, losers, new_winners, new_losers) # Update winners/losers
+                update_cached_edge_weights(current_n, changed_kmers, winners, losers) # Refresh only the changed De Bruijn edges
 
                 new_anti_prodigals = analysis.identify_anti_prodigals([hypothetical_sp], current_n, current_n-1, 0.6, winners, losers, 2) #Get  anti-prodigals
                 if new_anti_prodigals:
@@ -172,8 +177,8 @@ def construct_superpermutation(n, config):
 
                 # Find and add new prodigal results.
                 new_prodigals = analysis.find_prodigal_results(hypothetical_sp, current_n)
-                for prodigal_seq in new_prodigals:
-                    prodigal_manager.add_prodigal(prodigal_seq,current_n, "dynamic_generation", winners, losers, layout_memory, laminates.get((current_n, current_n-1),[]), anti_laminates.get((current_n, current_n-1),[]))
+                prodigal_manager.add_prodigals(new_prodigals, current_n, "dynamic_generation", winners, losers, layout_memory, laminates.get((current_n, current_n-1),[]), anti_laminates.get((current_n, current_n-1),[]),
+                                               workers=config.get("prodigal_workers", 1))
                 # ... (Other analysis functions, as needed) ...
 
                 # 5. Check for Completion and Validity
@@ -188,10 +193,16 @@ def construct_superpermutation(n, config):
                         with open(f"best_superpermutation_n{current_n}.txt", "w") as f:
                             f.write(best_known_superpermutation)
 
-                        # Create new constraint laminate
-                        constraint_laminates = []
-                        constraint_laminates.append(create_constraint_laminate(best_known_superpermutation, current_n, current_n - 1))
-                        constraint_laminates.append(create_constraint_laminate(best_known_superpermutation, current_n, current_n - 2))
+                        # Update the constraint laminates in place (only changed edges are applied and logged)
+                        if len(constraint_laminates) == 2:
+                            laminate.refresh_laminate(constraint_laminates[0], best_known_superpermutation, current_n, current_n - 1)
+                            laminate.refresh_laminate(constraint_laminates[1], best_known_superpermutation, current_n, current_n - 2)
+                            for constraint_laminate in constraint_laminates:
+                                constraint_laminate.trim_log(constraint_laminate.version)  # Nothing here replays these deltas
+                        else:
+                            constraint_laminates = []
+                            constraint_laminates.append(create_constraint_laminate(best_known_superpermutation, current_n, current_n - 1))
+                            constraint_laminates.append(create_constraint_laminate(best_known_superpermutation, current_n, current_n - 2))
 
 
                     # Even if it's not shorter, we might still want to keep it (for diversity)
@@ -212,6 +223,8 @@ def construct_superpermutation(n, config):
         # Extract and save all relevant data to be carried over
         # to the next n value.  This includes:
 
+    prodigal_manager.save_prodigals()
+    prodigal_manager.close()  # Stops the add_prodigals worker pool and syncs the journal
     return best_known_superpermutation
 
 
@@ -223,14 +236,15 @@ def select_strategy(n, config, laminates, anti_laminates):
     # Example of dynamic strategy selection based on laminate density/connectivity:
     if laminates:  # Use the first laminate for analysis, for now
         laminate_density = analyze_laminate_density(laminates[0])
-        laminate_connectivity = analyze_laminate_connectivity(laminates[0])
+        laminate_connectivity = analyze_laminate_connectivity(laminates[0], config.get("laminate_connectivity_samples", 32),
+                                                              config.get("laminate_connectivity_time_budget", 0.05)) # Sampled, cached per laminate version
 
         # Adjust strategy weights based on laminate properties (example)
         if laminate_density < 0.1:
             # If laminate is sparse, increase weight for exploratory strategies
             strategy_weights[available_strategies.index("random_constrained")] *= 2
             strategy_weights[available_strategies.index("de_bruijn")] *= 1.5
-        elif laminate_connectivity > 0.8:
+        elif laminate_connectivity is not None and laminate_connectivity > 0.8:
             # If laminate is highly connected, increase weight for strategies that exploit structure
             strategy_weights[available_strategies.index("prodigal_combination")] *= 2
             strategy_weights[available_strategies.index("n_minus_1_shell")] *= 1.5
@@ -245,23 +259,25 @@ def select_strategy(n, config, laminates, anti_laminates):
     strategy = random.choices(available_strategies, weights=normalized_weights)[0]
     return strategy
 
-def generate_hypothetical_superpermutation(n, strategy, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations = None):
+def generate_hypothetical_superpermutation(n, strategy, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations = None, config = None):
     """Generates a complete hypothetical superpermutation using a specified strategy."""
 
     random.seed(seed)
+    if config is None:
+        config = {}
 
     if strategy == "n_minus_1_shell":
         # 1. Select n-1 Segments
-        segments = select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memory)
+        segments = select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memory, config.get("prodigal_select_count"))
         # 2. Insert nth Symbol
         extended_segments = [analysis.insert_n_plus_1(seg, n, winners, losers, layout_memory, laminates, anti_laminates) for seg in segments]
         # 3. Connect Segments
-        superpermutation = connect_segments(n, extended_segments, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations)
+        superpermutation = connect_segments(n, extended_segments, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations, config)
         return superpermutation
 
     elif strategy == "prodigal_combination":
         #Get best prodigals
-        best_prodigals = prodigal_manager.get_best_prodigals(n=n, task="generation", context={})
+        best_prodigals = prodigal_manager.get_best_prodigals(n=n, task="generation", context={}, count=config.get("prodigal_select_count"))
         num_prodigals_to_combine = random.randint(2, min(4, len(best_prodigals))) # Combine 2-4 Prodigals, limit by how many exist.  Could make this dynamic
         if num_prodigals_to_combine == 0:
             return None #If there aren't any prodigals, we can't use this.
@@ -333,12 +349,16 @@ def generate_hypothetical_superpermutation(n, strategy, prodigal_manager, winner
     elif strategy == "de_bruijn":
         # De Bruijn graph-guided generation
         k = n - 1
-        dbg = build_de_bruijn_graph(list(get_kmers("".join(str(p) for p in generate_permutations(n)),n,k)), n, k) # Build a complete graph.
-        add_weights_to_debruijn(dbg, winners, losers)
+        dbg = permutation_de_bruijn_graph(n, k)  # Cached per n, built once from the overlap graph.
+        if dbg.weights_n is None:
+            add_weights_to_debruijn(dbg, winners, losers)  # Kept current afterwards by update_cached_edge_weights
 
         # Find a long, high-weight path (not necessarily Hamiltonian)
-        start_node = random.choice(list(dbg.nodes))  # Choose a random starting node
-        paths = find_high_weight_paths(dbg, start_node, best_known_length) # Use function
+        start_node = dbg.label(random.randrange(dbg.num_nodes))  # Choose a random starting node
+        paths = find_high_weight_paths(dbg, start_node, best_known_length,
+                                       beam_width=config.get("de_bruijn_beam_width", 32),
+                                       max_expansions=config.get("de_bruijn_max_expansions", 1000000),
+                                       time_budget=config.get("de_bruijn_time_budget", 10.0)) # Bounded beam search
 
         best_path = None
         if paths:
@@ -416,6 +436,21 @@ def generate_hypothetical_superpermutation(n, strategy, prodigal_manager, winner
 
         return "".join(working_copy)
 
+    elif strategy == "atsp_local_search":
+        # Iterated local search over the overlap ATSP, from the best saved sequence or a greedy tour
+        initial_tour = None
+        best_file = f"best_superpermutation_n{n}.txt"
+        if os.path.exists(best_file):
+            with open(best_file, "r") as f:
+                initial_tour = tour_from_sequence(f.read().strip(), n)
+        sequence, length = run_atsp_search(n, initial_tour,
+                                           time_budget=config.get("atsp_time_budget", 10.0),
+                                           seed=seed, workers=config.get("atsp_workers", 1))
+        logging.info(f"ATSP local search: n={n}, best length={length}")
+        if length > best_known_length:
+            return None
+        return sequence
+
     elif strategy == "random_constrained":
         # Generate a random permutation sequence, of set length.
         superperm_list = []
@@ -473,7 +508,7 @@ def complete_from_partial(partial_superpermutation, n, missing_permutations, pro
 
     return "".join(working_superpermutation)
 
-def select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memory):
+def select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memory, prodigal_count=None):
     """Selects a set of (n-1)-segments to use as the foundation for the n-superpermutation.
 
     This function embodies the "n-1 shell" strategy. It selects segments from
@@ -486,6 +521,7 @@ def select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memor
         winners (dict): Dictionary of winner k-mers and their weights.
         losers (dict): Dictionary of loser k-mers and their weights.
         layout_memory (LayoutMemory): The LayoutMemory instance.
+        prodigal_count (int): How many of the best n-1 prodigals to add (None adds all).
 
     Returns:
         list: A list of (n-1)-segment strings.
@@ -507,7 +543,7 @@ def select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memor
 
     # 3. Add "Best" Prodigals (if any are better than current segments)
     # Get best prodigals, filtering by n-1
-    best_prodigals = prodigal_manager.get_best_prodigals(n=n-1, task="generation", context={})
+    best_prodigals = prodigal_manager.get_best_prodigals(n=n-1, task="generation", context={}, count=prodigal_count)
     best_prodigals_list = [best_prodigals[p]['sequence'] for p in best_prodigals]
     segments.extend(best_prodigals_list)
 
@@ -523,8 +559,10 @@ def select_n_minus_1_segments(n, prodigal_manager, winners, losers, layout_memor
 
     return selected_segments
 
-def connect_segments(n, segments, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations):
+def connect_segments(n, segments, prodigal_manager, winners, losers, layout_memory, best_known_length, seed, laminates, anti_laminates, constraint_laminates, missing_permutations, config=None):
     """Connects the extended n-1 segments using bridge sequences."""
+    if config is None:
+        config = {}
     combined = ""
     for seg in segments:
       if combined == "":
@@ -532,24 +570,25 @@ def connect_segments(n, segments, prodigal_manager, winners, losers, layout_memo
         continue
       overlap = calculate_overlap(combined, seg)
       if overlap == 0: #Need to use the combiner
-          prefix = combined[-(n-1):]
-          suffix = seg[:n-1]
-          candidates = generate_bridge_candidates("".join(prefix), "".join(suffix), missing_permutations, n, winners, losers, layout_memory, laminates, anti_laminates)
+          candidates = generate_bridge_candidates(combined[-n:], seg[:n], missing_permutations, n, winners, losers, layout_memory, laminates, anti_laminates,
+                                                  config.get("max_bridge_length", 100),
+                                                  num_bridges=config.get("bridge_candidates", 5),
+                                                  missing_bonus=config.get("bridge_missing_bonus", 0.25))
           if candidates:
-              # Choose the best candidate based on winners/losers, and other data
+              # Prefer the shortest bridge, breaking ties with the winner/loser weights of the (n-1)-mers it creates
               best_candidate = None
-              best_score = -float('inf')
-              for cand_hash in candidates:
-                  cand_perm = unhash_permutation(cand_hash, n)
-                  cand_str = "".join(str(x) for x in cand_perm)
-                  score = calculate_score(combined, cand_hash, prodigal_manager, winners, losers, layout_memory, n, missing_permutations, {}, anti_laminates)
-
-                  if score > best_score:
+              best_score = None
+              for cost, bridge in candidates:
+                  joined = combined[-(n-1):] + bridge
+                  kmer_score = sum(winners.get((n, joined[i:i + n - 1]), 0) - losers.get((n, joined[i:i + n - 1]), 0)
+                                   for i in range(1, len(bridge) + 1))
+                  score = (-cost, kmer_score)
+                  if best_score is None or score > best_score:
                       best_score = score
-                      best_candidate = cand_str
+                      best_candidate = bridge
 
-              overlap = calculate_overlap(combined, best_candidate)
-              combined += best_candidate[overlap:]
+              combined += best_candidate  # Now ends with the start of seg
+              combined += seg[calculate_overlap(combined, seg):]
           else:
               return None #Skip if we cannot connect.
 
@@ -561,10 +600,21 @@ def connect_segments(n, segments, prodigal_manager, winners, losers, layout_memo
     return combined
     #pass
 
-#Placeholder, as this is handled in analysis.
-def generate_bridge_candidates(segment1, segment2, missing_permutations, n, winners, losers, layout_memory, laminates, anti_laminates, max_length):
-  pass
-	
+def generate_bridge_candidates(segment1, segment2, missing_permutations, n, winners, losers, layout_memory, laminates, anti_laminates, max_length, num_bridges=5, missing_bonus=0.25):
+    """Finds the top-k bridge sequences from the end of segment1 to the start of segment2.
+
+    Starts from the direct junction (appending the start of segment2) and runs
+    an A* search (graph_utils.find_bridges) over the cached permutation overlap
+    graph for n for anything cheaper, bounded by max_length appended symbols.
+    Bridges that cover permutations from missing_permutations are rewarded.
+
+    Returns:
+        list: (cost, bridge) tuples, best first. Appending `bridge` to segment1
+        makes it end with the start of segment2.
+    """
+    return find_bridges(load_overlap_graph(n), segment1, segment2, max_length,
+                        num_bridges=num_bridges, missing=missing_permutations, missing_bonus=missing_bonus)
+
 File: construct.py (v6.0 - Design Document)
 
 Purpose: This file contains the main logic for constructing superpermutations. It implements the iterative n-building approach, starting from n=1 and working up to the target n value. The primary construction strategy is the "n_minus_1_shell" approach, which leverages data and structures from n-1 superpermutations.
@@ -5,6 +5,9 @@ import pickle
 import os
 from layout_memory import LayoutMemory
 import networkx as nx
+import numpy as np
+from graph_utils import kmers_to_codes
+from laminate_utils import AntiLaminate, BitsetLaminate
 
 # All of these functions will be very similar to before, but will work with internal data
 
@@ -63,39 +66,119 @@ def load_prodigal_data(n, filename_prefix="prodigal_results"):
     return _load_data(f"prodigals_n{n}", f"{filename_prefix}_n{n}.json", {})
 
 # --- Laminates and Anti-Laminates ---
-# Since these are dictionaries of NetworkX graphs, we'll simulate saving/loading
-# with a simplified representation (just storing the number of graphs for each type).
+# Stored as integer edge codes instead of pickled networkx edge views. An edge
+# (u, v) is encoded as the k-mer code of u + v[-1] (graph_utils.kmers_to_codes).
+# Each album is a small .npz header (n, version, per-laminate key, edge length,
+# source, kind and offsets) plus one .npy file holding every laminate's sorted
+# codes back to back. A laminate's codes are its edges; an AntiLaminate's are its
+# removed universe edges followed by its extra edges (`removed_counts` splits
+# them), so it stays O(removed) on disk. The .npy file is memory-mapped on load,
+# so only the slices being decoded are read, but each laminate's bitset is still
+# built from its slice (a copy), so loaded laminates never alias the file. Both
+# files are replaced atomically, edges first, and the header's offsets must match
+# the edges file.
+
+LAMINATE_FORMAT_VERSION = 2  # Version 1 files (edge lists only) still load
+LAMINATE_KIND, ANTI_LAMINATE_KIND = 0, 1
+
+def laminate_edge_codes(graph):
+    """Returns (edge_length, sorted int64 edge codes) for a laminate graph."""
+    if isinstance(graph, BitsetLaminate):
+        return graph.edge_length, np.sort(graph.edge_codes())
+    edges = [u + v[-1] for u, v in graph.edges()]
+    if not edges:
+        return 0, np.zeros(0, dtype=np.int64)
+    edge_length = len(edges[0])
+    return edge_length, np.unique(kmers_to_codes(edges, edge_length))
+
+def _save_atomically(path, write):
+    """Calls write(file) on a temporary file, then moves it over `path`, so readers never see half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _save_laminate_album(album, n, filename_prefix):
+    keys, edge_lengths, sources, kinds, removed_counts, chunks = [], [], [], [], [], []
+    for key, graph_list in album.items():
+        for graph in graph_list:
+            if isinstance(graph, AntiLaminate):
+                edge_length = graph.edge_length
+                removed = np.array(sorted(graph.removed), dtype=np.int64)
+                codes = np.concatenate([removed, np.array(sorted(graph.extra), dtype=np.int64)])
+                kinds.append(ANTI_LAMINATE_KIND)
+                removed_counts.append(len(removed))
+            else:
+                edge_length, codes = laminate_edge_codes(graph)
+                kinds.append(LAMINATE_KIND)
+                removed_counts.append(0)
+            keys.append(key)
+            edge_lengths.append(edge_length)
+            sources.append(str(graph.graph.get("source", "")))
+            chunks.append(codes)
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in chunks], out=offsets[1:])
+    edges = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    _save_atomically(f"{filename_prefix}_n{n}_edges.npy", lambda f: np.save(f, edges))
+    _save_atomically(f"{filename_prefix}_n{n}.npz", lambda f: np.savez(
+        f, version=LAMINATE_FORMAT_VERSION, n=n, keys=np.array(keys, dtype=np.int64).reshape(-1, 2),
+        edge_lengths=np.array(edge_lengths, dtype=np.int64), sources=np.array(sources, dtype=str),
+        kinds=np.array(kinds, dtype=np.int8), removed_counts=np.array(removed_counts, dtype=np.int64), offsets=offsets))
+
+def _load_laminate_album(n, filename_prefix, as_graphs):
+    try:
+        header = np.load(f"{filename_prefix}_n{n}.npz")
+        edges = np.load(f"{filename_prefix}_n{n}_edges.npy", mmap_mode="r")
+    except FileNotFoundError:
+        return {}
+    version = int(header["version"])
+    if version not in (1, LAMINATE_FORMAT_VERSION):
+        raise ValueError(f"Unsupported laminate file version {version} in {filename_prefix}_n{n}.npz")
+    offsets = header["offsets"]
+    if offsets[-1] != len(edges):
+        raise ValueError(f"{filename_prefix}_n{n}.npz does not match {filename_prefix}_n{n}_edges.npy (interrupted save?)")
+    num_laminates = len(offsets) - 1
+    kinds = header["kinds"].tolist() if version > 1 else [LAMINATE_KIND] * num_laminates
+    removed_counts = header["removed_counts"].tolist() if version > 1 else [0] * num_laminates
+    album = {}
+    for i, (key, edge_length, source) in enumerate(zip(header["keys"].tolist(), header["edge_lengths"].tolist(), header["sources"].tolist())):
+        codes = edges[offsets[i]:offsets[i + 1]]  # View into the memory map; decoding below copies what it keeps
+        if kinds[i] == ANTI_LAMINATE_KIND:
+            removed, extra = codes[:removed_counts[i]].tolist(), codes[removed_counts[i]:].tolist()
+            laminate = AntiLaminate(key[0], edge_length, removed, set(extra), source)
+        else:
+            laminate = None
+        if as_graphs:
+            graph = nx.DiGraph(source=source)
+            kmers = [str(code) for code in (laminate.edge_codes() if laminate is not None else codes).tolist()]
+            graph.add_edges_from((kmer[:-1], kmer[1:]) for kmer in kmers)
+            album.setdefault(tuple(key), []).append(graph)
+        else:
+            if laminate is None:
+                laminate = BitsetLaminate.from_codes(key[0], edge_length, codes, source)
+            album.setdefault(tuple(key), []).append(laminate)
+    return album
 
 def save_laminates(laminates, n, filename_prefix="laminates"):
-    # In a real implementation, you might use pickle or a graph serialization format.
-    laminate_data = {key: [g.edges() for g in graph_list] for key, graph_list in laminates.items()}
-    _save_data(f"laminates_n{n}", laminate_data, f"{filename_prefix}_n{n}.pkl")
-
-def load_laminates(n, filename_prefix="laminates"):
-    laminate_data = _load_data(f"laminates_n{n}", f"{filename_prefix}_n{n}.pkl", {})
-    laminates = {}
-    for key, edge_list in laminate_data.items():
-      laminates[key] = []
-      for edges in edge_list:
-        graph = nx.DiGraph()
-        graph.add_edges_from(edges)
-        laminates[key].append(graph)
-    return laminates
+    _save_laminate_album(laminates, n, filename_prefix)
+
+def load_laminates(n, filename_prefix="laminates", as_graphs=False):
+    """Loads laminates as {(n, k): [BitsetLaminate]}, or as networkx graphs if as_graphs is set."""
+    return _load_laminate_album(n, filename_prefix, as_graphs)
 
 def save_anti_laminates(anti_laminates, n, filename_prefix="anti_laminates"):
-    anti_laminate_data = {key: [g.edges() for g in graph_list] for key, graph_list in anti_laminates.items()}
-    _save_data(f"anti_laminates_n{n}", anti_laminate_data, f"{filename_prefix}_n{n}.pkl")
-
-def load_anti_laminates(n, filename_prefix="anti_laminates"):
-    anti_laminate_data = _load_data(f"anti_laminates_n{n}", f"{filename_prefix}_n{n}.pkl", {})
-    anti_laminates = {}
-    for key, edge_list in anti_laminate_data.items():
-      anti_laminates[key] = []
-      for edges in edge_list:
-        graph = nx.DiGraph()
-        graph.add_edges_from(edges)
-        anti_laminates[key].append(graph)
-    return anti_laminates
+    _save_laminate_album(anti_laminates, n, filename_prefix)
+
+def load_anti_laminates(n, filename_prefix="anti_laminates", as_graphs=False):
+    """Loads anti-laminates as {(n, k): [AntiLaminate or BitsetLaminate]}, or as networkx graphs if as_graphs is set.
+
+    AntiLaminates come back as AntiLaminates (rebuilt from their removal sets);
+    anti-laminates that were saved as plain graphs or BitsetLaminates come back
+    as BitsetLaminates.
+    """
+    return _load_laminate_album(n, filename_prefix, as_graphs)
 
 # --- Workbooks (Conceptual - for internal use) ---
 
@@ -55,7 +55,7 @@ def c_n_factorial_diff(n, a, b, c):
 
 def c_n_debruijn(n, a, b, c):
     """De Bruijn graph based C(n) formula. Status: Experimental."""
-    graph = build_de_bruijn_graph(["".join(map(str, p)) for p in generate_permutations(n - 1)], n - 1, n-2)
+    graph = build_de_bruijn_graph(["".join(map(str, p)) for p in generate_permutations(n - 1)], n - 1, n-2, compact=True)
     imbalance = analyze_debruijn_graph(graph, n-1, n-2)['imbalance']
     return a * imbalance + b * n + c
 
@@ -63,7 +63,7 @@ def c_n_debruijn(n, a, b, c):
 def i_n_factorial_diff(n, a=0.5, b=2, c=5, d=0, e=5.5):
     """Formula for I(n) based on factorial difference and De Bruijn imbalance. Status: Promising."""
     # Placeholder for De Bruijn graph analysis
-    graph = build_de_bruijn_graph(["".join(map(str, p)) for p in generate_permutations(n - 1)], n - 1, n-2)
+    graph = build_de_bruijn_graph(["".join(map(str, p)) for p in generate_permutations(n - 1)], n - 1, n-2, compact=True)
     imbalance = analyze_debruijn_graph(graph, n - 1, n-2)['imbalance']
     return round(((math.factorial(n-1) - math.factorial(n-2)) / (n * b)  - (n - c)) * (1.33 + 0.01 * (n-6)) + (imbalance - 2) * e)
 
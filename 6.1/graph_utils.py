@@ -1,11 +1,174 @@
 # graph_utils.py
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+import hashlib
 import logging
-from utils import calculate_overlap, is_valid_permutation, kmer_to_int, int_to_kmer
+import itertools
+import collections
+import concurrent.futures
+import functools
+import math
+import os
+import random
+import time
+from utils import calculate_overlap, is_valid_permutation, kmer_to_int, int_to_kmer, permutation_rank
 import heapq
 
-def build_de_bruijn_graph(kmers, n, k):
-    """Builds a De Bruijn graph from a list of k-mers."""
+
+def kmers_to_codes(kmers, k):
+    """Converts an iterable of k-mer strings to an int64 array of k-mer codes.
+
+    A k-mer code is the k-mer's digits read as a base-10 integer (the same
+    encoding as utils.kmer_to_int), so codes of equal-length k-mers sort in
+    lexicographic order.
+    """
+    kmers = list(kmers)
+    if not kmers:
+        return np.zeros(0, dtype=np.int64)
+    digits = np.frombuffer("".join(kmers).encode("ascii"), dtype=np.uint8).reshape(-1, k).astype(np.int64) - 48
+    powers = 10 ** np.arange(k - 1, -1, -1, dtype=np.int64)
+    return digits @ powers
+
+
+class DeBruijnGraph:
+    """A compact De Bruijn graph with integer node IDs and CSR adjacency.
+
+    Nodes are the distinct (k-1)-mers, and a node ID is the node's index in the
+    sorted `node_codes` array. Edges are the distinct k-mers, sorted by code.
+    Sorting k-mer codes sorts by prefix first and last digit second, which is
+    exactly CSR order, so an edge ID indexes `indices`, `edge_codes` and the
+    parallel `winner_weight`/`loser_weight` arrays directly.
+    """
+
+    def __init__(self, k, node_codes, edge_codes, indptr, indices):
+        self.k = k
+        self.node_codes = node_codes  # Sorted (k-1)-mer codes, one per node ID
+        self.edge_codes = edge_codes  # Sorted k-mer codes, one per edge ID
+        self.indptr = indptr  # Out-edges of node i are edge IDs indptr[i]:indptr[i+1]
+        self.indices = indices  # Target node ID of each edge
+        self.winner_weight = np.zeros(len(edge_codes), dtype=np.float64)
+        self.loser_weight = np.zeros(len(edge_codes), dtype=np.float64)
+        self.weights_n = None  # n value of the (n, kmer) keys the weights were read from
+
+    @classmethod
+    def from_kmers(cls, kmers, k):
+        """Builds the graph from an iterable of k-mer strings (duplicates are ignored)."""
+        edge_codes = np.unique(kmers_to_codes(kmers, k))
+        return cls.from_codes(edge_codes, k)
+
+    @classmethod
+    def from_codes(cls, edge_codes, k, node_codes=None):
+        """Builds the graph from an array of k-mer codes (plus any isolated (k-1)-mer `node_codes`)."""
+        edge_codes = np.unique(np.asarray(edge_codes, dtype=np.int64))
+        prefixes = edge_codes // 10
+        suffixes = edge_codes % (10 ** (k - 1))
+        node_codes = np.union1d(np.union1d(prefixes, suffixes), np.asarray(node_codes if node_codes is not None else [], dtype=np.int64))
+        sources = np.searchsorted(node_codes, prefixes)
+        indices = np.searchsorted(node_codes, suffixes)
+        indptr = np.zeros(len(node_codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_codes)), out=indptr[1:])
+        return cls(k, node_codes, edge_codes, indptr, indices)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Converts a string-node networkx De Bruijn graph, keeping any edge weights and isolated nodes."""
+        edges = list(graph.edges(data=True))
+        nodes = list(graph.nodes)
+        if not nodes:
+            return cls.from_codes(np.zeros(0, dtype=np.int64), 2)
+        k = len(nodes[0]) + 1
+        compact = cls.from_codes(kmers_to_codes((u + v[-1] for u, v, _ in edges), k), k, kmers_to_codes(nodes, k - 1))
+        edge_ids = compact.edge_ids([u + v[-1] for u, v, _ in edges])
+        compact.winner_weight[edge_ids] = [data.get('winner_weight', 0) for _, _, data in edges]
+        compact.loser_weight[edge_ids] = [data.get('loser_weight', 0) for _, _, data in edges]
+        return compact
+
+    def to_networkx(self):
+        """Converts back to a networkx.DiGraph with string nodes and weight attributes."""
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.label(i) for i in range(self.num_nodes))
+        sources = self.edge_sources()
+        for e in range(self.num_edges):
+            graph.add_edge(self.label(sources[e]), self.label(self.indices[e]),
+                           winner_weight=float(self.winner_weight[e]),
+                           loser_weight=float(self.loser_weight[e]))
+        return graph
+
+    @property
+    def num_nodes(self):
+        return len(self.node_codes)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_codes)
+
+    def node_id(self, label):
+        """Returns the node ID of a (k-1)-mer string, or -1 if it is not in the graph."""
+        code = int(label)
+        i = int(np.searchsorted(self.node_codes, code))
+        if i < self.num_nodes and self.node_codes[i] == code:
+            return i
+        return -1
+
+    def label(self, node_id):
+        """Returns the (k-1)-mer string of a node ID."""
+        return str(int(self.node_codes[node_id]))
+
+    def edge_ids(self, kmers):
+        """Returns the edge IDs of a list of k-mer strings (-1 where the edge is absent)."""
+        codes = kmers_to_codes(kmers, self.k)
+        ids = np.searchsorted(self.edge_codes, codes)
+        ids[ids >= self.num_edges] = 0
+        found = self.edge_codes[ids] == codes if self.num_edges else np.zeros(len(codes), dtype=bool)
+        return np.where(found, ids, -1)
+
+    def kmer(self, edge_id):
+        """Returns the k-mer string spelled by an edge."""
+        return str(int(self.edge_codes[edge_id]))
+
+    def neighbors(self, node_id):
+        """Returns the target node IDs of a node's out-edges (a view, not a copy)."""
+        return self.indices[self.indptr[node_id]:self.indptr[node_id + 1]]
+
+    def out_edges(self, node_id):
+        """Returns the range of edge IDs leaving a node."""
+        return range(self.indptr[node_id], self.indptr[node_id + 1])
+
+    def edge_sources(self):
+        """Returns the source node ID of every edge."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+
+    def out_degrees(self):
+        return np.diff(self.indptr)
+
+    def in_degrees(self):
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def adjacency_matrix(self):
+        """Returns the adjacency matrix as a scipy.sparse CSR matrix (shares the index arrays)."""
+        data = np.ones(self.num_edges, dtype=np.float64)
+        return sp.csr_matrix((data, self.indices, self.indptr), shape=(self.num_nodes, self.num_nodes))
+
+    def fingerprint(self):
+        """Returns a content hash of the graph's node and edge sets."""
+        return hashlib.sha1(np.ascontiguousarray(self.edge_codes).tobytes() + np.ascontiguousarray(self.node_codes).tobytes()
+                            + bytes([self.k])).hexdigest()
+
+
+def build_de_bruijn_graph(kmers, n, k, compact=False):
+    """Builds a De Bruijn graph from a list of k-mers.
+
+    With compact=True, returns a DeBruijnGraph instead of a networkx.DiGraph.
+    """
+    if compact:
+        kmers = list(kmers)
+        # Like the networkx path, the k-mer length comes from the k-mers themselves.
+        graph = DeBruijnGraph.from_kmers(kmers, len(kmers[0]) if kmers else k)
+        logging.debug(f"Compact De Bruijn graph constructed with {graph.num_nodes} nodes and {graph.num_edges} edges.")
+        return graph
     graph = nx.DiGraph()
     for kmer in kmers:
         prefix = kmer[:-1]
@@ -14,121 +177,1048 @@ def build_de_bruijn_graph(kmers, n, k):
     logging.debug(f"De Bruijn graph constructed with {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges.")
     return graph
 
-def add_weights_to_debruijn(graph: nx.DiGraph, winners: dict, losers: dict):
+def add_weights_to_debruijn(graph: nx.DiGraph, winners: dict, losers: dict, n=None):
     """Adds 'winner_weight' and 'loser_weight' attributes to the edges of a De Bruijn graph.
 
+    Both representations use the same keys: an edge is the k-mer it spells,
+    looked up as (n, kmer), so they get identical weights and
+    update_cached_edge_weights keeps them current.
+
     Args:
-        graph: The De Bruijn graph (networkx.DiGraph).
+        graph: The De Bruijn graph (networkx.DiGraph or DeBruijnGraph).
         winners: A dictionary of Winner k-mers and their weights.
         losers: A dictionary of Loser k-mers and their weights.
+        n: The n value used in the (n, kmer) keys. Defaults to k + 1, the
+            k = n-1 graph used by the de_bruijn strategy.
     """
 
+    if isinstance(graph, DeBruijnGraph):
+        if n is None:
+            n = graph.k + 1
+        graph.winner_weight[:] = gather_kmer_weights(dense_kmer_weights(winners, n, graph.k), graph.edge_codes)
+        graph.loser_weight[:] = gather_kmer_weights(dense_kmer_weights(losers, n, graph.k), graph.edge_codes)
+        graph.weights_n = n
+        return
+
     for u, v, data in graph.edges(data=True):
-        kmer = u[1:] + v[-1]  # Reconstruct the k-mer from the edge
-        # Lookup the kmer in the winners and losers dictionaries, using the (n, kmer) tuple as key
-        n = len(u) + 1  # Infer n from the node length. Nodes are (n-1)-mers
-        data['winner_weight'] = winners.get((n, kmer), 0)
-        data['loser_weight'] = losers.get((n, kmer), 0) #Will be negative
+        kmer = u + v[-1]  # The k-mer spelled by the edge (nodes are (k-1)-mers)
+        key_n = n if n is not None else len(kmer) + 1
+        data['winner_weight'] = winners.get((key_n, kmer), 0)
+        data['loser_weight'] = losers.get((key_n, kmer), 0) #Will be negative
+
+def dense_kmer_weights(weights, n, k):
+    """Converts the length-k entries of a {(n, kmer): weight} dict to sorted (codes, values) arrays."""
+    items = [(kmer, w) for (key_n, kmer), w in weights.items()
+             if key_n == n and isinstance(kmer, str) and len(kmer) == k]
+    if not items:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    codes = kmers_to_codes([kmer for kmer, _ in items], k)
+    values = np.array([w for _, w in items], dtype=np.float64)
+    order = np.argsort(codes)
+    return codes[order], values[order]
+
+def gather_kmer_weights(dense_weights, codes):
+    """Looks up the weight of every code in `codes` from dense_kmer_weights output (0 if absent)."""
+    weight_codes, weight_values = dense_weights
+    if len(weight_codes) == 0:
+        return np.zeros(len(codes), dtype=np.float64)
+    idx = np.minimum(np.searchsorted(weight_codes, codes), len(weight_codes) - 1)
+    return np.where(weight_codes[idx] == codes, weight_values[idx], 0.0)
+
+def update_edge_weights(graph, changed_kmers, winners, losers):
+    """Refreshes only the edges whose (n, kmer) keys are in `changed_kmers`.
 
-def find_high_weight_paths(graph: nx.DiGraph, start_node: str, length_limit: int, num_paths=10) -> list[list[str]]:
+    `changed_kmers` is the set returned by analysis.update_winners_losers. Graphs
+    that have not been weighted yet are left alone; they are filled in full by
+    add_weights_to_debruijn on first use.
+    """
+    if graph.weights_n is None:
+        return
+    kmers = [kmer for key_n, kmer in changed_kmers
+             if key_n == graph.weights_n and isinstance(kmer, str) and len(kmer) == graph.k]
+    if not kmers:
+        return
+    edge_ids = graph.edge_ids(kmers)
+    for kmer, e in zip(kmers, edge_ids):
+        if e >= 0:
+            graph.winner_weight[e] = winners.get((graph.weights_n, kmer), 0)
+            graph.loser_weight[e] = losers.get((graph.weights_n, kmer), 0)
+
+def update_cached_edge_weights(n, changed_kmers, winners, losers):
+    """Applies update_edge_weights to every cached permutation De Bruijn graph for n."""
+    for (graph_n, _), graph in _permutation_dbg_cache.items():
+        if graph_n == n:
+            update_edge_weights(graph, changed_kmers, winners, losers)
+
+def find_high_weight_paths(graph, start_node: str, length_limit, num_paths=10, beam_width=32,
+                           max_expansions=1_000_000, time_budget=None) -> list[list[str]]:
     """
     Finds high-weight paths in the De Bruijn graph starting from a given node.
     Prioritizes longer paths, and higher weights.
 
+    Runs an iterative beam search: each step extends the `beam_width` best
+    partial paths by one edge. With n = k + 1, every edge after the first
+    completes an n-symbol window; a path never visits the same permutation
+    twice (tracked by permutation rank in an n!-bit bytearray per beam entry,
+    copied only when two kept paths branch off it), and may take at most n-1
+    steps in a row that add no new permutation. Paths are stored as parent
+    pointers into flat arrays instead of list copies. The search stops at
+    `length_limit` nodes (may be float('inf')), after `max_expansions` edge
+    expansions, or after `time_budget` seconds, whichever comes first.
+
     Returns a *list* of paths, where a path is a list of *strings*.
     """
-    best_paths = []
+    if not isinstance(graph, DeBruijnGraph):
+        graph = DeBruijnGraph.from_networkx(graph)
+    start = graph.node_id(start_node)
+    if start < 0:
+        return []
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    edge_codes = graph.edge_codes.tolist()
+    weights = (graph.winner_weight + graph.loser_weight).tolist()
+    n = graph.k + 1
+    ranks = {}  # {window code: permutation rank, or -1 if the window is not a permutation}
 
-    def dfs(current_node, current_path, current_weight):
-        nonlocal best_paths
-        if len(current_path) > length_limit:
-            return
+    def window_rank(code):
+        rank = ranks.get(code)
+        if rank is None:
+            digits = tuple(int(d) for d in str(code))
+            rank = permutation_rank(digits) if is_valid_permutation(digits, n) else -1
+            ranks[code] = rank
+        return rank
 
-        # Calculate a score that prioritizes length and then weight.  Simple sum for now.
-        score = len(current_path) + current_weight
+    # Entry i of the path store is node path_node[i], reached over edge path_edge[i] from entry path_parent[i].
+    path_node = [start]
+    path_parent = [-1]
+    path_edge = [-1]
+    beam = [(0.0, 0, bytearray(math.factorial(n) // 8 + 1), 0)]  # (path weight, entry, visited ranks, idle steps)
+    best_paths = [(1.0, 0)]  # Min-heap of (score, entry); score = path length + weight
+    expansions = 0
+    # Every n steps add at least one of the n! permutations
+    length_limit = int(min(length_limit, n * (math.factorial(n) + 1) + 1))
 
-        if len(best_paths) < num_paths:
-            heapq.heappush(best_paths, (score, current_path.copy()))  # Use heappush
-        elif score > best_paths[0][0]:  # Compare to the lowest score in the heap
-            heapq.heapreplace(best_paths, (score, current_path.copy())) # Use heapreplace
+    for length in range(2, length_limit + 1):
+        candidates = []
+        for weight, entry, visited, idle in beam:
+            node = path_node[entry]
+            incoming = path_edge[entry]
+            for e in range(indptr[node], indptr[node + 1]):
+                rank = window_rank(edge_codes[incoming] * 10 + edge_codes[e] % 10) if incoming >= 0 else -1
+                if rank < 0:
+                    if idle < n - 1:
+                        candidates.append((weight + weights[e], entry, e, visited, idle + 1, rank))
+                elif not visited[rank >> 3] & (1 << (rank & 7)):
+                    candidates.append((weight + weights[e], entry, e, visited, 0, rank))
+            expansions += indptr[node + 1] - indptr[node]
+        if not candidates:
+            break
 
-        for neighbor in graph.neighbors(current_node):
-            edge_data = graph.get_edge_data(current_node, neighbor)
-            new_weight = current_weight + edge_data.get('winner_weight', 0) + edge_data.get('loser_weight', 0) #Using the weights.
-            dfs(neighbor, current_path + [neighbor], new_weight)
+        selected = heapq.nlargest(beam_width, candidates, key=lambda c: c[0])
+        users = collections.Counter(id(c[3]) for c in selected)  # Kept paths sharing each bitset
+        beam = []
+        for weight, parent, e, visited, idle, rank in selected:
+            if rank >= 0:
+                if users[id(visited)] > 1:
+                    users[id(visited)] -= 1
+                    visited = bytearray(visited)  # Another kept path still needs the original
+                visited[rank >> 3] |= 1 << (rank & 7)
+            path_node.append(indices[e])
+            path_parent.append(parent)
+            path_edge.append(e)
+            entry = len(path_node) - 1
+            beam.append((weight, entry, visited, idle))
+            score = length + weight
+            if len(best_paths) < num_paths:
+                heapq.heappush(best_paths, (score, entry))
+            elif score > best_paths[0][0]:
+                heapq.heapreplace(best_paths, (score, entry))
 
-    dfs(start_node, [start_node], 0)
-    return [path for score, path in sorted(best_paths, reverse=True)] #Return just the paths
+        if expansions >= max_expansions or (deadline is not None and time.monotonic() > deadline):
+            logging.debug(f"Beam search stopped at path length {length} after {expansions} expansions.")
+            break
 
-def analyze_debruijn_graph(graph, n, k):
+    paths = []
+    for score, entry in sorted(best_paths, reverse=True):
+        path = []
+        while entry >= 0:
+            path.append(graph.label(path_node[entry]))
+            entry = path_parent[entry]
+        paths.append(path[::-1])
+    return paths
+
+ANALYSIS_LEVELS = ("basic", "spectral", "full")
+_analysis_cache = {}  # {(fingerprint, level, num_eigenvalues, num_samples, seed): analysis}
+_ANALYSIS_CACHE_SIZE = 128
+
+def analyze_debruijn_graph(graph, n, k, level="basic", num_eigenvalues=6, num_samples=32, seed=0):
     """
     Performs various analyses on a De Bruijn graph.
 
+    The work done depends on `level`:
+        "basic": size, density, degree statistics, imbalance, strongly connected
+            components and cycle presence. Linear time; this is the default.
+        "spectral": adds the `num_eigenvalues` smallest eigenvalues of the
+            (symmetrized) Laplacian and the algebraic connectivity, using a
+            sparse shift-invert eigensolver.
+        "full": adds sampled estimates of the average node connectivity and the
+            minimum edge cut, from `num_samples` random node pairs.
+
+    Accepts a networkx.DiGraph or a DeBruijnGraph. Results are cached by graph
+    fingerprint, so repeated calls on the same graph are free.
+
     Returns a dictionary containing analysis results.
     """
+    if level not in ANALYSIS_LEVELS:
+        raise ValueError(f"Invalid analysis level: {level}")
+    if not isinstance(graph, DeBruijnGraph):
+        graph = DeBruijnGraph.from_networkx(graph)
+
+    cache_key = (graph.fingerprint(), level, num_eigenvalues, num_samples, seed)
+    if cache_key in _analysis_cache:
+        return dict(_analysis_cache[cache_key])
+
     analysis = {}
+    num_nodes = graph.num_nodes
+    num_edges = graph.num_edges
 
     # Basic Graph Properties
-    analysis['num_nodes'] = graph.number_of_nodes()
-    analysis['num_edges'] = graph.number_of_edges()
-    analysis['density'] = nx.density(graph)
+    analysis['num_nodes'] = num_nodes
+    analysis['num_edges'] = num_edges
+    analysis['density'] = num_edges / (num_nodes * (num_nodes - 1)) if num_nodes > 1 else 0
 
     # Node Degree Distribution
-    in_degrees = [d for n, d in graph.in_degree()]
-    out_degrees = [d for n, d in graph.out_degree()]
-    analysis['avg_in_degree'] = sum(in_degrees) / len(in_degrees) if in_degrees else 0
-    analysis['min_in_degree'] = min(in_degrees, default=0)
-    analysis['max_in_degree'] = max(in_degrees, default=0)
-    analysis['avg_out_degree'] = sum(out_degrees) / len(out_degrees) if out_degrees else 0
-    analysis['min_out_degree'] = min(out_degrees, default=0)
-    analysis['max_out_degree'] = max(out_degrees, default=0)
+    in_degrees = graph.in_degrees()
+    out_degrees = graph.out_degrees()
+    analysis['avg_in_degree'] = float(in_degrees.mean()) if num_nodes else 0
+    analysis['min_in_degree'] = int(in_degrees.min()) if num_nodes else 0
+    analysis['max_in_degree'] = int(in_degrees.max(initial=0))
+    analysis['avg_out_degree'] = float(out_degrees.mean()) if num_nodes else 0
+    analysis['min_out_degree'] = int(out_degrees.min()) if num_nodes else 0
+    analysis['max_out_degree'] = int(out_degrees.max(initial=0))
 
     # --- Imbalance Calculation ---
-    total_imbalance = 0
-    for node in graph.nodes:
-        in_degree = graph.in_degree(node)
-        out_degree = graph.out_degree(node)
-        total_imbalance += abs(in_degree - out_degree)
-    analysis['imbalance'] = total_imbalance / (2.0 * graph.number_of_edges()) if graph.number_of_edges() > 0 else 0
-
-    # Connectivity
-    try:
-        analysis['is_strongly_connected'] = nx.is_strongly_connected(graph)
-        analysis['num_strongly_connected_components'] = nx.number_strongly_connected_components(graph)
-        analysis['average_node_connectivity'] = nx.average_node_connectivity(graph)
-    except nx.NetworkXError:
+    total_imbalance = int(np.abs(in_degrees - out_degrees).sum())
+    analysis['imbalance'] = total_imbalance / (2.0 * num_edges) if num_edges > 0 else 0
+
+    # Connectivity (strongly connected components)
+    if num_nodes > 0:
+        adjacency = graph.adjacency_matrix()
+        num_components, labels = connected_components(adjacency, directed=True, connection='strong')
+        component_sizes = np.bincount(labels)
+        analysis['is_strongly_connected'] = num_components == 1
+        analysis['num_strongly_connected_components'] = int(num_components)
+        analysis['largest_strongly_connected_component'] = int(component_sizes.max())
+        # A directed graph has a cycle iff some SCC has more than one node, or there is a self-loop.
+        analysis['has_cycles'] = bool(component_sizes.max() > 1 or np.any(graph.edge_sources() == graph.indices))
+    else:
         analysis['is_strongly_connected'] = False
         analysis['num_strongly_connected_components'] = 0
-        analysis['average_node_connectivity'] = 0
-
-    # Cycles (Simplified - just checks for presence/absence)
-    try:
-        nx.find_cycle(graph, orientation="original")
-        analysis['has_cycles'] = True
-    except nx.NetworkXNoCycle:
+        analysis['largest_strongly_connected_component'] = 0
         analysis['has_cycles'] = False
 
-    # Diameter (Computationally Expensive - use with caution!)
-    # try:
-    #     analysis['diameter'] = nx.diameter(graph) # This can be VERY slow
-    # except nx.NetworkXError:
-    #     analysis['diameter'] = -1 # Indicate that diameter couldn't be calculated
+    # Spectral Analysis (sparse, only the few smallest eigenvalues)
+    if level in ("spectral", "full"):
+        try:
+            spectrum = _smallest_laplacian_eigenvalues(graph, num_eigenvalues)
+            analysis['laplacian_spectrum'] = spectrum.tolist()
+            analysis['algebraic_connectivity'] = float(spectrum[1]) if len(spectrum) > 1 else 0.0
+        except Exception as e:
+            logging.warning(f"Spectral analysis failed: {e}")
+            analysis['laplacian_spectrum'] = []
+            analysis['algebraic_connectivity'] = -1
 
-    # Spectral Analysis (Example - could add more)
-    try:
-        laplacian_spectrum = nx.laplacian_spectrum(graph)
-        analysis['laplacian_spectrum'] = laplacian_spectrum.tolist()  # Convert numpy array to list
-        analysis['algebraic_connectivity'] = nx.algebraic_connectivity(graph) # Second smallest eigenvalue of the Laplacian
-    except Exception as e:
-        logging.warning(f"Spectral analysis failed: {e}")
-        analysis['laplacian_spectrum'] = []
-        analysis['algebraic_connectivity'] = -1
-    #Minimum Cut
+    # Sampled connectivity and minimum cut
+    if level == "full":
+        try:
+            analysis.update(_sampled_connectivity(graph, num_samples, seed))
+        except Exception as e:
+            logging.warning(f"Connectivity sampling failed: {e}")
+            analysis['average_node_connectivity'] = 0
+            analysis['min_cut'] = -1
+            analysis['min_cut_value'] = -1
+
+    if len(_analysis_cache) >= _ANALYSIS_CACHE_SIZE:
+        _analysis_cache.pop(next(iter(_analysis_cache)))  # Drop the oldest entry
+    _analysis_cache[cache_key] = analysis
+    return dict(analysis)
+
+def _smallest_laplacian_eigenvalues(graph, num_eigenvalues):
+    """Returns the smallest eigenvalues of the symmetrized Laplacian, ascending."""
+    adjacency = graph.adjacency_matrix()
+    undirected = ((adjacency + adjacency.T) > 0).astype(np.float64)
+    laplacian = sp.diags(np.asarray(undirected.sum(axis=1)).ravel()) - undirected
+    num_nodes = graph.num_nodes
+    if num_nodes <= num_eigenvalues + 1 or num_nodes < 64:
+        return np.maximum(np.sort(np.linalg.eigvalsh(laplacian.toarray()))[:num_eigenvalues], 0.0)
+    # Shift-invert just below zero finds the eigenvalues closest to 0, i.e. the smallest.
+    values = eigsh(laplacian.tocsc(), k=num_eigenvalues, sigma=-1e-3, which='LM', return_eigenvectors=False)
+    return np.sort(np.maximum(values, 0.0))
+
+def _sampled_connectivity(graph, num_samples, seed):
+    """Estimates average node connectivity and the minimum edge cut from random node pairs."""
+    nx_graph = graph.to_networkx()
+    nodes = list(nx_graph.nodes)
+    if len(nodes) < 2:
+        return {'average_node_connectivity': 0, 'min_cut': set(), 'min_cut_value': 0}
+    rng = np.random.default_rng(seed)
+    total = 0
+    best_cut_value = None
+    best_pair = None
+    for _ in range(num_samples):
+        u, v = rng.choice(len(nodes), size=2, replace=False)
+        s, t = nodes[u], nodes[v]
+        total += nx.node_connectivity(nx_graph, s, t)
+        cut_value = nx.edge_connectivity(nx_graph, s, t)
+        if best_cut_value is None or cut_value < best_cut_value:
+            best_cut_value, best_pair = cut_value, (s, t)
+    min_cut = nx.minimum_edge_cut(nx_graph, *best_pair) if best_cut_value > 0 else set()
+    return {
+        'average_node_connectivity': total / num_samples,
+        'min_cut': min_cut,
+        'min_cut_value': len(min_cut),
+    }
+
+# --- Permutation Overlap Graph ---
+
+GRAPH_CACHE_DIR = "graph_cache"
+_overlap_graph_cache = {}  # {n: PermutationOverlapGraph}
+_permutation_dbg_cache = {}  # {(n, k): DeBruijnGraph}
+
+
+def rank_permutations(perms):
+    """Vectorized lexicographic rank of each row of an (m, n) array of permutations of 1..n."""
+    perms = np.asarray(perms)
+    n = perms.shape[1]
+    ranks = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n - 1):
+        smaller = (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+        ranks += smaller * math.factorial(n - 1 - i)
+    return ranks
+
+
+class PermutationOverlapGraph:
+    """Weighted overlap graph over the n! permutations, stored as CSR arrays.
+
+    Node i is the permutation of lexicographic rank i (row i of `permutations`).
+    Each node has an edge to every permutation reachable with overlap n-1, n-2
+    and n-3, and `cost` holds the number of symbols appended (n - overlap).
+    Successors of a node are ordered by cost.
+    """
+
+    ARRAYS = ("permutations", "indptr", "indices", "cost")
+
+    def __init__(self, n, permutations, indptr, indices, cost):
+        self.n = n
+        self.permutations = permutations  # (n!, n) uint8, row = rank
+        self.indptr = indptr
+        self.indices = indices  # Successor ranks
+        self.cost = cost  # Symbols appended to reach each successor
+
+    @classmethod
+    def build(cls, n):
+        """Builds the overlap graph for n from scratch (vectorized over all permutations)."""
+        perms = np.array(list(itertools.permutations(range(1, n + 1))), dtype=np.uint8).reshape(-1, n)
+        num_perms = len(perms)
+        succ_blocks = []
+        cost_blocks = []
+        for overlap in (n - 1, n - 2, n - 3):
+            if overlap < 1:
+                continue
+            tail = n - overlap
+            # The successor keeps p[tail:] and appends p[:tail] in every order.
+            for order in itertools.permutations(range(tail)):
+                successors = np.concatenate([perms[:, tail:], perms[:, list(order)]], axis=1)
+                succ_blocks.append(rank_permutations(successors))
+                cost_blocks.append(np.full(num_perms, tail, dtype=np.uint8))
+        degree = len(succ_blocks)
+        indices = np.stack(succ_blocks, axis=1).reshape(-1).astype(np.int32)
+        cost = np.stack(cost_blocks, axis=1).reshape(-1)
+        indptr = np.arange(0, num_perms * degree + 1, degree, dtype=np.int64)
+        logging.debug(f"Permutation overlap graph for n={n} built with {num_perms} nodes and {len(indices)} edges.")
+        return cls(n, perms, indptr, indices, cost)
+
+    def save(self, directory=GRAPH_CACHE_DIR):
+        """Saves the arrays as .npy files in `directory` so they can be memory-mapped on load."""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f"overlap_graph_n{self.n}_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, n, directory=GRAPH_CACHE_DIR, mmap=True):
+        """Loads a saved graph. Raises FileNotFoundError if it has not been saved yet."""
+        mmap_mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(directory, f"overlap_graph_n{n}_{name}.npy"), mmap_mode=mmap_mode)
+                  for name in cls.ARRAYS]
+        return cls(n, *arrays)
+
+    @property
+    def num_nodes(self):
+        return len(self.permutations)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def successors(self, rank):
+        """Returns (successor_ranks, costs) for a permutation rank (views, not copies)."""
+        start, end = self.indptr[rank], self.indptr[rank + 1]
+        return self.indices[start:end], self.cost[start:end]
+
+    def permutation_string(self, rank):
+        """Returns the permutation of a rank as a digit string."""
+        return "".join(str(x) for x in self.permutations[rank])
+
+
+def load_overlap_graph(n, cache_dir=GRAPH_CACHE_DIR):
+    """Returns the overlap graph for n, memory-mapping it from cache_dir.
+
+    The graph is built and saved on first use, and kept in-process afterwards.
+    """
+    if n in _overlap_graph_cache:
+        return _overlap_graph_cache[n]
     try:
-        analysis['min_cut'] = nx.minimum_edge_cut(graph) #Gets the set of edges
-        analysis['min_cut_value'] = len(analysis['min_cut']) #Gets the number of edges.
-    except:
-        analysis['min_cut'] = -1
-        analysis['min_cut_value'] = -1
+        overlap_graph = PermutationOverlapGraph.load(n, cache_dir)
+    except FileNotFoundError:
+        logging.info(f"No cached overlap graph for n={n}. Building it.")
+        overlap_graph = PermutationOverlapGraph.build(n)
+        try:
+            overlap_graph.save(cache_dir)
+        except OSError as e:
+            logging.warning(f"Could not save overlap graph for n={n}: {e}")
+    _overlap_graph_cache[n] = overlap_graph
+    return overlap_graph
+
+
+def permutation_de_bruijn_graph(n, k, cache_dir=GRAPH_CACHE_DIR):
+    """Returns the compact De Bruijn graph of every k-mer occurring inside an n-permutation.
+
+    The k-mers come from the cached overlap graph's permutation table, so the
+    graph is derived once per (n, k) instead of being rebuilt from the
+    concatenation of all n! permutations on every call.
+    """
+    if (n, k) not in _permutation_dbg_cache:
+        perms = load_overlap_graph(n, cache_dir).permutations.astype(np.int64)
+        powers = 10 ** np.arange(k - 1, -1, -1, dtype=np.int64)
+        codes = np.concatenate([perms[:, i:i + k] @ powers for i in range(n - k + 1)])
+        _permutation_dbg_cache[(n, k)] = DeBruijnGraph.from_codes(codes, k)
+    return _permutation_dbg_cache[(n, k)]
+
+
+# --- Rotation-Cycle Graph ---
+
+_cycle_graph_cache = {}  # {n: RotationCycleGraph}
+
+
+class RotationCycleGraph:
+    """Overlap graph contracted over rotation cycles (1-cycles).
+
+    The n rotations of a permutation form a 1-cycle that is traversed by n-1
+    overlap-(n-1) steps, so the search only has to choose the order of the
+    (n-1)! cycles. Cycle c is identified by the rank of its rotation that
+    starts with 1, and a state c * n + j means "entered cycle c at rotation j"
+    (the canonical rotation shifted left by j). Entering at rotation j and
+    traversing the whole cycle leaves at rotation j-1, so every state has a
+    fixed exit permutation, and its transitions are the 2-edges and 3-edges
+    from that exit into other cycles.
+    """
+
+    def __init__(self, n, cycle_perms, cycle_of, rotation_of, state_rank, indptr, next_state, cost):
+        self.n = n
+        self.cycle_perms = cycle_perms  # ((n-1)!, n) canonical rotation of each cycle
+        self.cycle_of = cycle_of  # Permutation rank -> cycle ID
+        self.rotation_of = rotation_of  # Permutation rank -> rotation within its cycle
+        self.state_rank = state_rank  # State (cycle * n + rotation) -> permutation rank
+        self.indptr = indptr  # Transitions of state s are indptr[s]:indptr[s+1]
+        self.next_state = next_state  # Entry state in the next cycle
+        self.cost = cost  # Symbols appended by the transition (2 or 3)
+
+    @classmethod
+    def build(cls, overlap_graph):
+        """Builds the contracted graph from a PermutationOverlapGraph (vectorized)."""
+        n = overlap_graph.n
+        perms = np.asarray(overlap_graph.permutations)
+        num_perms = len(perms)
+        pos1 = np.argmax(perms == 1, axis=1)
+        rotate = (np.arange(n)[None, :] + pos1[:, None]) % n
+        canonical = np.take_along_axis(perms, rotate, axis=1)
+        cycle_of = rank_permutations(canonical)  # Ranks of permutations starting with 1 are 0..(n-1)!-1
+        rotation_of = (n - pos1) % n
+        state_rank = np.zeros(num_perms, dtype=np.int64)
+        state_rank[cycle_of * n + rotation_of] = np.arange(num_perms)
+        cycle_perms = perms[:num_perms // n]
+
+        states = np.arange(num_perms)
+        state_cycle = states // n
+        exit_rank = state_rank[state_cycle * n + (states % n - 1) % n]
+        degrees = np.diff(overlap_graph.indptr)
+        if not np.all(degrees == degrees[0]):
+            raise ValueError("RotationCycleGraph expects a regular overlap graph.")
+        successors = np.asarray(overlap_graph.indices).reshape(num_perms, -1)[exit_rank]
+        costs = np.asarray(overlap_graph.cost).reshape(num_perms, -1)[exit_rank]
+        keep = (costs >= 2) & (cycle_of[successors] != state_cycle[:, None])
+        next_state = (cycle_of[successors] * n + rotation_of[successors])[keep].astype(np.int32)
+        cost = costs[keep]
+        indptr = np.zeros(num_perms + 1, dtype=np.int64)
+        np.cumsum(keep.sum(axis=1), out=indptr[1:])
+        return cls(n, cycle_perms, cycle_of, rotation_of, state_rank, indptr, next_state, cost)
+
+    @property
+    def num_cycles(self):
+        return len(self.cycle_perms)
+
+    @property
+    def num_states(self):
+        return len(self.state_rank)
+
+    def state_of(self, rank):
+        """Returns the state for entering a permutation's cycle at that permutation."""
+        return int(self.cycle_of[rank]) * self.n + int(self.rotation_of[rank])
+
+    def transitions(self, state):
+        """Returns (next_states, costs) for leaving the cycle entered at `state` (views)."""
+        start, end = self.indptr[state], self.indptr[state + 1]
+        return self.next_state[start:end], self.cost[start:end]
+
+    def entry_string(self, state):
+        """Returns the permutation a state enters its cycle at, as a digit string."""
+        cycle, rotation = divmod(state, self.n)
+        perm = self.cycle_perms[cycle]
+        return "".join(str(x) for x in np.roll(perm, -rotation))
+
+    def path_length(self, states, costs):
+        """Length of the superpermutation spelled by a path of entry states and transition costs."""
+        return self.n + len(states) * (self.n - 1) + int(sum(costs))
+
+    def expand_path(self, states, costs):
+        """Expands a path over cycles into the superpermutation string, in linear time.
+
+        `states` are the entry states of the visited cycles and `costs[i]` is the
+        cost of the transition from states[i] to states[i+1].
+        """
+        if not states:
+            return ""
+        entry = self.entry_string(states[0])
+        pieces = [entry]
+        for i, state in enumerate(states):
+            pieces.append(entry[:self.n - 1])  # Traverse the whole 1-cycle
+            if i + 1 < len(states):
+                entry = self.entry_string(states[i + 1])
+                pieces.append(entry[self.n - costs[i]:])
+        return "".join(pieces)
+
+
+def load_cycle_graph(n, cache_dir=GRAPH_CACHE_DIR):
+    """Returns the rotation-cycle graph for n, built once from the cached overlap graph."""
+    if n not in _cycle_graph_cache:
+        _cycle_graph_cache[n] = RotationCycleGraph.build(load_overlap_graph(n, cache_dir))
+    return _cycle_graph_cache[n]
+
+
+def greedy_cycle_walk(cycle_graph, start_state):
+    """Builds a path that visits every cycle, greedily taking the cheapest transition.
+
+    When every transition leads to an already visited cycle, a breadth-first
+    search over states finds the nearest unvisited cycle, and the cycles passed
+    on the way are traversed again.
+
+    Returns:
+        tuple: (states, costs) suitable for RotationCycleGraph.expand_path.
+    """
+    n = cycle_graph.n
+    visited = np.zeros(cycle_graph.num_cycles, dtype=bool)
+    states = [start_state]
+    costs = []
+    visited[start_state // n] = True
+    num_visited = 1
+    indptr, next_state, cost = cycle_graph.indptr, cycle_graph.next_state, cycle_graph.cost
+    while num_visited < cycle_graph.num_cycles:
+        state = states[-1]
+        options = range(indptr[state], indptr[state + 1])
+        step = next((e for e in options if not visited[next_state[e] // n]), None)  # Transitions are sorted by cost
+        if step is not None:
+            states.append(int(next_state[step]))
+            costs.append(int(cost[step]))
+        else:
+            detour = _nearest_unvisited_cycle(cycle_graph, state, visited)
+            if detour is None:
+                break
+            detour_states, detour_costs = detour
+            states.extend(detour_states)
+            costs.extend(detour_costs)
+        if not visited[states[-1] // n]:
+            visited[states[-1] // n] = True
+            num_visited += 1
+    return states, costs
+
+
+def _nearest_unvisited_cycle(cycle_graph, state, visited):
+    """Breadth-first search from a state to the closest state in an unvisited cycle."""
+    n = cycle_graph.n
+    parent = {state: (None, 0)}
+    queue = collections.deque([state])
+    while queue:
+        current = queue.popleft()
+        next_states, costs = cycle_graph.transitions(current)
+        for nxt, c in zip(next_states.tolist(), costs.tolist()):
+            if nxt in parent:
+                continue
+            parent[nxt] = (current, c)
+            if not visited[nxt // n]:
+                path_states, path_costs = [], []
+                while nxt != state:
+                    prev, c = parent[nxt]
+                    path_states.append(nxt)
+                    path_costs.append(c)
+                    nxt = prev
+                return path_states[::-1], path_costs[::-1]
+            queue.append(nxt)
+    return None
+
+# --- ATSP Local Search ---
+
+def tour_from_cycle_walk(cycle_graph, states):
+    """Expands a path over rotation cycles into a tour of permutation ranks (first visits only)."""
+    n = cycle_graph.n
+    seen = np.zeros(cycle_graph.num_states, dtype=bool)
+    tour = []
+    for state in states:
+        cycle, rotation = divmod(state, n)
+        for i in range(n):
+            rank = int(cycle_graph.state_rank[cycle * n + (rotation + i) % n])
+            if not seen[rank]:
+                seen[rank] = True
+                tour.append(rank)
+    return tour
+
+def tour_from_sequence(sequence, n):
+    """Returns the permutation ranks of a sequence in order of first occurrence.
+
+    Permutations missing from the sequence are appended in rank order, so the
+    result is always a complete tour.
+    """
+    seen = np.zeros(math.factorial(n), dtype=bool)
+    tour = []
+    for i in range(len(sequence) - n + 1):
+        window = sequence[i:i + n]
+        if len(set(window)) == n:
+            perm = tuple(int(x) for x in window)
+            if is_valid_permutation(perm, n):
+                rank = permutation_rank(perm)
+                if not seen[rank]:
+                    seen[rank] = True
+                    tour.append(rank)
+    tour.extend(np.flatnonzero(~seen).tolist())
+    return tour
+
+def tour_to_string(overlap_graph, tour):
+    """Spells a tour of permutation ranks as a superpermutation, overlapping each step maximally."""
+    if not tour:
+        return ""
+    strings = [overlap_graph.permutation_string(rank) for rank in tour]
+    pieces = [strings[0]]
+    for prev, current in zip(strings, strings[1:]):
+        pieces.append(current[calculate_overlap(prev, current):])
+    return "".join(pieces)
+
+def atsp_local_search(overlap_graph, initial_tour, time_budget=10.0, seed=0, max_segment=3, kick_span=50):
+    """Shortens a tour of all permutations with iterated local search on the overlap ATSP.
+
+    The tour is kept as a doubly linked list closed through a depot node (entering
+    the first permutation costs n, leaving the last costs 0), so its cost is the
+    length of the spelled superpermutation. The neighbourhood is reversal-free
+    (reversing a segment would change every overlap in it), and made of:
+
+    - Or-opt: relocate a segment of up to `max_segment` permutations next to one
+      of its cheap overlap-graph neighbours.
+    - Segment exchange (the reversal-free 3-opt move): a -> [B] -> [C] -> d
+      becomes a -> [C] -> [B] -> d, for adjacent segments B and C within
+      2 * `kick_span` positions whose new links a -> C and C -> B are
+      overlap-graph edges.
+
+    Every local optimum is perturbed with a random double-bridge kick (the same
+    segment swap, with random segments of up to `kick_span` permutations).
+    Moves are evaluated in O(1) from cached overlap costs, and a kick that makes
+    the tour worse is undone from a journal of link changes.
+
+    Args:
+        overlap_graph (PermutationOverlapGraph): Graph for the current n.
+        initial_tour (list): Permutation ranks, each exactly once.
+        time_budget (float): Seconds to search for.
+        seed (int): Random seed for the kicks.
+        max_segment (int): Longest segment moved by Or-opt.
+        kick_span (int): Maximum length of the segments swapped by a kick
+            (segment exchanges look 2 * kick_span positions ahead).
+
+    Returns:
+        tuple: (length, tour) of the best tour found.
+    """
+    n = overlap_graph.n
+    num_perms = overlap_graph.num_nodes
+    if len(initial_tour) != num_perms:
+        raise ValueError("initial_tour must visit every permutation exactly once.")
+    deadline = time.time() + time_budget
+    rng = random.Random(seed)
+    strings = ["".join(map(str, row)) for row in overlap_graph.permutations.tolist()]
+    indptr = np.asarray(overlap_graph.indptr)
+    indices = np.asarray(overlap_graph.indices)
+    rows = np.repeat(np.arange(num_perms, dtype=np.int64), np.diff(indptr))
+    known_cost = dict(zip((rows * num_perms + indices).tolist(), np.asarray(overlap_graph.cost).tolist()))
+    succ_lists = [indices[indptr[r]:indptr[r + 1]].tolist() for r in range(num_perms)] + [[]]
+    order = np.argsort(indices, kind="stable")
+    pred_indptr = np.searchsorted(indices[order], np.arange(num_perms + 1))
+    pred_lists = [rows[order[pred_indptr[r]:pred_indptr[r + 1]]].tolist() for r in range(num_perms)] + [[]]
+    depot = num_perms
+
+    def c(a, b):
+        if a == depot:
+            return n
+        if b == depot:
+            return 0
+        cost = known_cost.get(a * num_perms + b)
+        if cost is None:  # Not an overlap-graph edge, so the overlap is below n-3
+            cost = n - calculate_overlap(strings[a], strings[b])
+        return cost
+
+    # Linked tour; every change goes through link() so it can be undone
+    succ = [0] * (num_perms + 1)
+    pred = [0] * (num_perms + 1)
+    ring = [depot] + list(initial_tour)
+    for a, b in zip(ring, ring[1:] + ring[:1]):
+        succ[a], pred[b] = b, a
+    journal = []
+
+    def link(a, b):
+        journal.append((a, succ[a], b, pred[b]))
+        succ[a], pred[b] = b, a
+
+    def undo():
+        while journal:
+            a, old_succ, b, old_pred = journal.pop()
+            succ[a], pred[b] = old_succ, old_pred
+
+    def segment_exchange(s0):
+        """Returns (delta, move) of the best improving exchange of [s0..b1] with the segment after it."""
+        a = pred[s0]
+        position = {}
+        node = s0
+        for i in range(2 * kick_span):
+            if node == a:
+                break  # Walked around the whole tour
+            position[node] = i
+            node = succ[node]
+        best_delta, best_move = 0, None
+        for c0 in succ_lists[a]:
+            j = position.get(c0)
+            if not j:  # c0 must start a segment after [s0..b1]
+                continue
+            b1 = pred[c0]
+            base = c(a, c0) - c(a, s0) - c(b1, c0)
+            for c1 in pred_lists[s0]:
+                k = position.get(c1)
+                if k is None or k < j:
+                    continue
+                d = succ[c1]
+                delta = base + c(c1, s0) + c(b1, d) - c(c1, d)
+                if delta < best_delta:
+                    best_delta, best_move = delta, (a, b1, c0, c1, d)
+        return best_delta, best_move
+
+    def or_opt(queue, queued):
+        """Applies improving Or-opt and segment exchange moves around queued nodes; returns the total delta."""
+        total = 0
+        checks = 0
+        while queue:
+            checks += 1
+            if checks % 256 == 0 and time.time() > deadline:
+                break
+            s0 = queue.pop()
+            queued[s0] = False
+            segment = [s0]
+            touched = None
+            for _ in range(max_segment):
+                end = segment[-1]
+                p, q = pred[s0], succ[end]
+                if q == s0 or p == end:
+                    break
+                gain = c(p, s0) + c(end, q) - c(p, q)
+                best_delta, best_move = 0, None
+                if gain > 0:
+                    for v in pred_lists[s0]:
+                        w = succ[v]
+                        if v == p or v in segment or w in segment:
+                            continue
+                        delta = c(v, s0) + c(end, w) - c(v, w) - gain
+                        if delta < best_delta:
+                            best_delta, best_move = delta, (v, w)
+                    for w in succ_lists[end]:
+                        v = pred[w]
+                        if w == q or v in segment or w in segment:
+                            continue
+                        delta = c(v, s0) + c(end, w) - c(v, w) - gain
+                        if delta < best_delta:
+                            best_delta, best_move = delta, (v, w)
+                if best_move is not None:
+                    v, w = best_move
+                    link(p, q)
+                    link(v, s0)
+                    link(end, w)
+                    total += best_delta
+                    touched = (p, q, v, w, s0, end)
+                    break
+                if q == depot:
+                    break
+                segment.append(q)
+            if touched is None:
+                best_delta, best_move = segment_exchange(s0)
+                if best_move is not None:
+                    a, b1, c0, c1, d = best_move
+                    link(a, c0)
+                    link(c1, s0)
+                    link(b1, d)
+                    total += best_delta
+                    touched = (a, s0, b1, c0, c1, d)
+            for node in touched or ():
+                if node != depot and not queued[node]:
+                    queued[node] = True
+                    queue.append(node)
+        return total
+
+    queued = [True] * num_perms + [False]
+    queue = list(initial_tour)
+    rng.shuffle(queue)
+    cost = sum(c(a, succ[a]) for a in ring)
+    cost += or_opt(queue, queued)
+    journal.clear()
+    best_cost = cost
+    while time.time() < deadline:
+        # Double-bridge kick: a -> [B] -> [C] -> d becomes a -> [C] -> [B] -> d
+        a = rng.randrange(num_perms + 1)
+        walk = [a]
+        for _ in range(rng.randrange(kick_span) + rng.randrange(kick_span) + 3):
+            walk.append(succ[walk[-1]])
+        if a in walk[1:]:
+            continue  # Kick wraps around the tour
+        split = rng.randrange(2, len(walk) - 1)
+        b0, b1, c0, c1, d = walk[1], walk[split - 1], walk[split], walk[-2], walk[-1]
+        delta = c(a, c0) + c(c1, b0) + c(b1, d) - c(a, b0) - c(b1, c0) - c(c1, d)
+        link(a, c0)
+        link(c1, b0)
+        link(b1, d)
+        queue = [node for node in (a, b0, b1, c0, c1, d) if node != depot]
+        for node in queue:
+            queued[node] = True
+        delta += or_opt(queue, queued)
+        for node in queue:
+            queued[node] = False
+        if delta <= 0:  # Sideways moves are kept to drift across plateaus
+            cost += delta
+            journal.clear()
+            if cost < best_cost:
+                best_cost = cost
+                logging.debug(f"ATSP local search: n={n}, length={best_cost}")
+        else:
+            undo()
+    tour = []
+    node = succ[depot]
+    while node != depot:
+        tour.append(node)
+        node = succ[node]
+    return best_cost, tour
+
+def _atsp_worker(args):
+    """Runs one atsp_local_search in a worker process, loading the memory-mapped overlap graph."""
+    n, initial_tour, time_budget, seed, cache_dir = args
+    return atsp_local_search(load_overlap_graph(n, cache_dir), initial_tour, time_budget, seed)
+
+def run_atsp_search(n, initial_tour=None, time_budget=10.0, seed=0, workers=1, cache_dir=GRAPH_CACHE_DIR):
+    """Runs the ATSP local search, optionally as independent seeded runs on several cores.
+
+    Without an initial tour, starts from a greedy walk over the rotation-cycle graph.
+
+    Returns:
+        tuple: (superpermutation, length) of the best tour found.
+    """
+    overlap_graph = load_overlap_graph(n, cache_dir)
+    if initial_tour is None:
+        cycle_graph = load_cycle_graph(n, cache_dir)
+        states, _ = greedy_cycle_walk(cycle_graph, cycle_graph.state_of(0))
+        initial_tour = tour_from_cycle_walk(cycle_graph, states)
+    if workers > 1:
+        jobs = [(n, initial_tour, time_budget, seed + i, cache_dir) for i in range(workers)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_atsp_worker, jobs))
+    else:
+        results = [atsp_local_search(overlap_graph, initial_tour, time_budget, seed)]
+    length, tour = min(results, key=lambda result: result[0])
+    return tour_to_string(overlap_graph, tour), length
+
+# --- Bridge Search ---
+
+@functools.lru_cache(maxsize=4096)
+def _tail_permutations(tail, n):
+    """Returns {rank: symbols appended} for the permutations that best extend the end of a sequence.
+
+    Uses the longest suffix of `tail` (at least n-3 symbols) made of distinct
+    symbols, and completes it with the missing symbols in every order. Cached,
+    so callers must not modify the returned dict.
+    """
+    symbols = set(str(x) for x in range(1, n + 1))
+    for overlap in range(min(n, len(tail)), max(n - 3, 1) - 1, -1):
+        suffix = tail[len(tail) - overlap:]
+        if len(set(suffix)) == overlap and set(suffix) <= symbols:
+            rest = sorted(symbols - set(suffix))
+            return {permutation_rank(tuple(int(x) for x in suffix + "".join(order))): n - overlap
+                    for order in itertools.permutations(rest)}
+    return {}
+
+@functools.lru_cache(maxsize=4096)
+def _head_permutations(head, n):
+    """Returns (ranks, overlap) for the permutations that end with the longest usable prefix of `head` (cached)."""
+    symbols = set(str(x) for x in range(1, n + 1))
+    for overlap in range(min(n, len(head)), max(n - 3, 1) - 1, -1):
+        prefix = head[:overlap]
+        if len(set(prefix)) == overlap and set(prefix) <= symbols:
+            rest = sorted(symbols - set(prefix))
+            return frozenset(permutation_rank(tuple(int(x) for x in "".join(order) + prefix))
+                             for order in itertools.permutations(rest)), overlap
+    return frozenset(), 0
+
+def _direct_junction(segment1, head, n, missing, missing_bonus):
+    """Returns (cost, bridge) for simply appending `head` to segment1, reusing their overlap.
+
+    The cost is the number of appended symbols minus `missing_bonus` for every
+    missing permutation the junction creates.
+    """
+    bridge = head[calculate_overlap(segment1, head):]
+    joined = segment1[-(n - 1):] + bridge
+    covered = 0
+    if missing_bonus:
+        for i in range(len(bridge)):
+            window = tuple(int(x) for x in joined[i:i + n])
+            if is_valid_permutation(window, n) and hash(window) in missing:
+                covered += 1
+    return len(bridge) - missing_bonus * covered, bridge
+
+def find_bridges(overlap_graph, segment1, segment2, max_length, num_bridges=5, missing=None,
+                 missing_bonus=0.5, max_expansions=50000):
+    """Finds the cheapest bridges from the end of segment1 to the start of segment2.
+
+    The direct junction (appending the start of segment2, reusing whatever
+    overlaps) always works and costs at most n, so it seeds the result and
+    bounds the search: an A* search over the permutation overlap graph then
+    only looks for bridges that are strictly cheaper. A path costs the number
+    of symbols it appends, minus `missing_bonus` for every permutation in
+    `missing` (a set of utils.hash_permutation values) that it covers. The bonus
+    is kept below 1, so every edge still has a positive cost, and the heuristic
+    (1 - missing_bonus) * (n - overlap(p, goal)) is a lower bound on what
+    remains. Paths never revisit a permutation, and each permutation is
+    expanded at most `num_bridges` times (the usual k-shortest-paths bound).
+
+    Args:
+        overlap_graph (PermutationOverlapGraph): Graph for the current n.
+        segment1 (str): Sequence to bridge from (only its last n symbols are used).
+        segment2 (str): Sequence to bridge to (only its first n symbols are used).
+        max_length (int): Maximum number of symbols a bridge may append.
+        num_bridges (int): Number of bridges to return.
+        missing (set): Hashes of permutations still missing from the superpermutation.
+        missing_bonus (float): Cost reduction per covered missing permutation (< 1).
+        max_expansions (int): Node expansion budget.
+
+    Returns:
+        list: Up to `num_bridges` (cost, bridge) tuples, best first, where `bridge`
+        is the string to append to segment1 so that it ends with the start of
+        segment2, and `cost` is len(bridge). The first bridge never costs more
+        than the direct junction.
+    """
+    n = overlap_graph.n
+    goals, head_overlap = _head_permutations(segment2[:n], n)
+    if not goals:
+        return []
+    if not missing:
+        missing, missing_bonus = set(), 0.0  # Nothing to reward, so keep the heuristic tight
+    direct_cost, direct = _direct_junction(segment1, segment2[:head_overlap], n, missing, missing_bonus)
+    candidates = [(direct_cost, direct)] if len(direct) <= max_length else []
+    starts = _tail_permutations(segment1[-n:], n)
+    if not starts:
+        return [(len(bridge), bridge) for _, bridge in candidates]
+    upper = direct_cost - 1e-9 if candidates else math.inf  # Only strictly cheaper bridges are worth searching for
+    goal_prefixes = {goal[:o]: o for goal in (overlap_graph.permutation_string(r) for r in goals) for o in range(1, n)}
+    perms = overlap_graph.permutations
+    estimates = {}
+
+    def heuristic(rank):
+        if rank in goals:
+            return 0.0
+        if rank not in estimates:
+            perm_str = overlap_graph.permutation_string(rank)
+            overlap = max((o for o in range(n - 1, 0, -1) if goal_prefixes.get(perm_str[-o:]) == o), default=0)
+            estimates[rank] = (1 - missing_bonus) * (n - overlap)
+        return estimates[rank]
+
+    def covers_missing(rank):
+        return missing_bonus if hash(tuple(perms[rank].tolist())) in missing else 0.0
+
+    # Search entry i: permutation entry_rank[i], reached from entry_parent[i] by appending entry_added[i] symbols.
+    entry_rank, entry_parent, entry_added, entry_length = [], [], [], []
+
+    def on_path(entry, rank):
+        while entry >= 0:
+            if entry_rank[entry] == rank:
+                return True
+            entry = entry_parent[entry]
+        return False
+
+    open_heap = []
+    for rank, added in starts.items():
+        entry_rank.append(rank)
+        entry_parent.append(-1)
+        entry_added.append(added)
+        entry_length.append(added)
+        cost = added - covers_missing(rank)
+        if cost + heuristic(rank) < upper:
+            heapq.heappush(open_heap, (cost + heuristic(rank), cost, len(entry_rank) - 1))
+
+    bridges = []
+    seen_bridges = {direct}
+    expanded = {}  # {rank: times expanded}
+    expansions = 0
+    while open_heap and len(bridges) < num_bridges and expansions < max_expansions:
+        _, cost, entry = heapq.heappop(open_heap)
+        rank = entry_rank[entry]
+        if rank in goals:
+            bridge = _reconstruct_bridge(overlap_graph, entry, entry_rank, entry_parent, entry_added)
+            if bridge not in seen_bridges:
+                seen_bridges.add(bridge)
+                bridges.append((cost, bridge))
+            continue
+        if expanded.get(rank, 0) >= num_bridges:
+            continue
+        expanded[rank] = expanded.get(rank, 0) + 1
+        expansions += 1
+        successors, costs = overlap_graph.successors(rank)
+        for succ, added in zip(successors.tolist(), costs.tolist()):
+            length = entry_length[entry] + added
+            if length > max_length or on_path(entry, succ):
+                continue
+            new_cost = cost + added - covers_missing(succ)
+            if new_cost + heuristic(succ) >= upper:
+                continue
+            entry_rank.append(succ)
+            entry_parent.append(entry)
+            entry_added.append(added)
+            entry_length.append(length)
+            heapq.heappush(open_heap, (new_cost + heuristic(succ), new_cost, len(entry_rank) - 1))
+    # A* pops bridges cheapest first, and all of them beat the direct junction
+    return [(len(bridge), bridge) for _, bridge in (bridges + candidates)[:num_bridges]]
 
-    return analysis
\ No newline at end of file
+def _reconstruct_bridge(overlap_graph, entry, entry_rank, entry_parent, entry_added):
+    """Rebuilds the appended symbols of a search entry by walking its parent pointers."""
+    pieces = []
+    while entry >= 0:
+        added = entry_added[entry]
+        if added:
+            pieces.append(overlap_graph.permutation_string(entry_rank[entry])[-added:])
+        entry = entry_parent[entry]
+    return "".join(reversed(pieces))
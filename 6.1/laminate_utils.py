@@ -1,24 +1,586 @@
 # laminate_utils.py
+import atexit
+import logging
+import bisect
+import itertools
+import json
+import os
+import time
+import weakref
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, maximum_flow
 import networkx as nx
-from utils import is_valid_permutation, hash_permutation, unhash_permutation, generate_permutations
+from utils import is_valid_permutation, hash_permutation, unhash_permutation, generate_permutations, permutation_rank, permutation_unrank
+from graph_utils import permutation_de_bruijn_graph, load_overlap_graph, GRAPH_CACHE_DIR, kmers_to_codes, dense_kmer_weights, gather_kmer_weights
+
+_edge_universe_cache = {}  # {(n, edge_length): (sorted edge codes, {code: edge ID})}
+_anti_template_cache = {}  # {(n, k): read-only words with every universe bit set}
+
+def edge_universe(n, edge_length, cache_dir=GRAPH_CACHE_DIR):
+    """Returns the fixed edge universe for laminates of n with edges spelling `edge_length`-mers.
+
+    The universe is the edge set of graph_utils.permutation_de_bruijn_graph(n,
+    edge_length) (every k-mer of distinct symbols), so an edge ID here is the
+    edge's CSR index in that graph. The codes are saved to cache_dir and
+    memory-mapped on later runs.
+
+    Returns:
+        tuple: (sorted int64 edge codes, {code: edge ID}).
+    """
+    key = (n, edge_length)
+    if key not in _edge_universe_cache:
+        path = os.path.join(cache_dir, f"edge_universe_n{n}_k{edge_length}.npy")
+        if not (n >= 2 and 1 <= edge_length <= n):
+            codes = np.zeros(0, dtype=np.int64)
+        elif os.path.exists(path):
+            codes = np.load(path, mmap_mode="r")
+        else:
+            codes = permutation_de_bruijn_graph(n, edge_length, cache_dir).edge_codes
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(path, codes)
+            except OSError as e:
+                logging.warning(f"Could not save edge universe for n={n}, k={edge_length}: {e}")
+        _edge_universe_cache[key] = (codes, dict(zip(codes.tolist(), range(len(codes)))))
+    return _edge_universe_cache[key]
+
+def anti_laminate_template(n, k):
+    """Returns the bitset words of the complete anti-laminate for (n, k), computed once per process."""
+    if (n, k) not in _anti_template_cache:
+        words = BitsetLaminate.full(n, k).words
+        words.flags.writeable = False
+        _anti_template_cache[(n, k)] = words
+    return _anti_template_cache[(n, k)]
+
+
+class BitsetLaminate:
+    """A laminate stored as a bitset over the edge IDs of its edge universe.
+
+    Bit i of `words` is set when universe edge i is in the laminate. Edges that
+    fall outside the universe (k-mers with a repeated symbol) are kept in the
+    small `extra` set of codes. The class mirrors the parts of the networkx
+    DiGraph API that laminate code uses (has_edge, edges, nodes, neighbors,
+    add/remove), and as_networkx() converts for anything else.
+
+    Every effective change bumps `version` and appends (version, added codes,
+    removed codes) to the append-only `delta_log`, so dependent caches and
+    other workers can catch up from a version instead of copying the laminate.
+    The log keeps at most `max_log_entries` entries; a holder of an older
+    version gets a ValueError from deltas_since and needs a full copy.
+    """
+
+    max_log_entries = 256
+
+    def __init__(self, n, edge_length, words=None, extra=None, source=""):
+        self.n = n
+        self.edge_length = edge_length
+        self.universe, self.edge_index = edge_universe(n, edge_length)
+        num_words = (len(self.universe) + 63) // 64
+        self.words = words if words is not None else np.zeros(num_words, dtype=np.uint64)
+        self.extra = extra if extra is not None else set()  # Codes outside the universe
+        self.graph = {"source": source}  # networkx-style graph attributes
+        self._compat = {}  # {k: bit-packed compatibility by permutation rank}
+        self.version = 0
+        self.delta_log = []  # [(version, added codes, removed codes)]
+        self.log_start = 0  # Version the log starts after (older entries were trimmed)
+
+    @classmethod
+    def from_codes(cls, n, edge_length, codes, source=""):
+        """Builds a laminate from an array of edge codes (vectorized), at version 0 with an empty log."""
+        laminate = cls(n, edge_length, source=source)
+        laminate._set_codes(np.unique(np.asarray(codes, dtype=np.int64)), True)
+        return laminate
+
+    @classmethod
+    def from_graph(cls, graph, n):
+        """Converts a networkx laminate graph."""
+        kmers = [u + v[-1] for u, v in graph.edges()]
+        edge_length = len(kmers[0]) if kmers else 0
+        codes = np.array([int(kmer) for kmer in kmers], dtype=np.int64)
+        return cls.from_codes(n, edge_length, codes, source=graph.graph.get("source", ""))
+
+    @classmethod
+    def full(cls, n, edge_length, source=""):
+        """Returns the laminate containing every edge of the universe."""
+        laminate = cls(n, edge_length, source=source)
+        laminate.words[:] = np.uint64(0xFFFFFFFFFFFFFFFF)
+        tail = len(laminate.universe) % 64
+        if tail:
+            laminate.words[-1] = np.uint64((1 << tail) - 1)
+        return laminate
+
+    def __getstate__(self):
+        """Pickles without the edge universe and compiled tables; __setstate__ takes them from the per-process cache."""
+        state = self.__dict__.copy()
+        for name in ("universe", "edge_index", "_compat"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.universe, self.edge_index = edge_universe(self.n, self.edge_length)
+        self._compat = {}
+
+    def copy(self):
+        laminate = BitsetLaminate(self.n, self.edge_length, self.words.copy(), set(self.extra), self.graph.get("source", ""))
+        laminate.version, laminate.delta_log, laminate.log_start = self.version, list(self.delta_log), self.log_start
+        return laminate
+
+    # --- Edge codes and IDs ---
+
+    def _ids(self, codes):
+        """Splits codes into universe edge IDs and the codes outside the universe."""
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(self.universe):
+            return np.zeros(0, dtype=np.int64), codes
+        ids = np.minimum(np.searchsorted(self.universe, codes), len(self.universe) - 1)
+        found = self.universe[ids] == codes
+        return ids[found], codes[~found]
+
+    def _set_codes(self, codes, present):
+        """Sets or clears edges without logging."""
+        ids, outside = self._ids(codes)
+        masks = np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64))
+        if present:
+            np.bitwise_or.at(self.words, ids >> 6, masks)
+            self.extra.update(outside.tolist())
+        else:
+            np.bitwise_and.at(self.words, ids >> 6, ~masks)
+            self.extra.difference_update(outside.tolist())
+
+    def add_codes(self, codes):
+        """Adds edges by code; returns the codes that were not already present."""
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        added = codes[~self.contains_codes(codes)]
+        self._set_codes(added, True)
+        self._record(added, codes[:0])
+        return added
+
+    def remove_codes(self, codes):
+        """Removes edges by code; returns the codes that were present."""
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        removed = codes[self.contains_codes(codes)]
+        self._set_codes(removed, False)
+        self._record(codes[:0], removed)
+        return removed
+
+    # --- Delta log ---
+
+    def _record(self, added, removed):
+        if not len(added) and not len(removed):
+            return
+        self.version += 1
+        self.delta_log.append((self.version, added, removed))
+        if len(self.delta_log) > self.max_log_entries:
+            self.trim_log(self.delta_log[-self.max_log_entries - 1][0])
+        self._refresh_compat(np.concatenate([added, removed]))
+
+    def deltas_since(self, version):
+        """Returns the delta log entries after `version` (what a holder of that version is missing)."""
+        if version < self.log_start:
+            raise ValueError(f"Delta log starts after version {self.log_start}; version {version} needs a full copy.")
+        return [entry for entry in self.delta_log if entry[0] > version]
+
+    def apply_deltas(self, deltas):
+        """Replays delta log entries from another laminate (e.g. a bouncing-batch cell)."""
+        for _, added, removed in deltas:
+            self.add_codes(added)
+            self.remove_codes(removed)
+
+    def trim_log(self, version):
+        """Drops log entries up to `version` once every consumer has seen them."""
+        self.delta_log = [entry for entry in self.delta_log if entry[0] > version]
+        self.log_start = max(self.log_start, min(version, self.version))
+
+    def contains_codes(self, codes):
+        """Returns a boolean array telling which edge codes are in the laminate."""
+        codes = np.asarray(codes, dtype=np.int64)
+        result = np.zeros(len(codes), dtype=bool)
+        if len(self.universe):
+            ids = np.minimum(np.searchsorted(self.universe, codes), len(self.universe) - 1)
+            found = self.universe[ids] == codes
+            bits = (self.words[ids >> 6] >> (ids & 63).astype(np.uint64)) & np.uint64(1)
+            result = found & (bits == 1)
+        if self.extra:
+            result |= np.isin(codes, np.fromiter(self.extra, dtype=np.int64, count=len(self.extra)))
+        return result
+
+    def has_code(self, code):
+        """Single-edge test: one dict lookup and one bit test."""
+        edge_id = self.edge_index.get(code)
+        if edge_id is None:
+            return code in self.extra
+        return bool((int(self.words[edge_id >> 6]) >> (edge_id & 63)) & 1)
+
+    def edge_ids(self):
+        """Returns the universe edge IDs in the laminate (sorted)."""
+        bits = np.unpackbits(self.words.view(np.uint8), bitorder="little")[:len(self.universe)]
+        return np.flatnonzero(bits)
+
+    def edge_codes(self):
+        """Returns all edge codes in the laminate, universe edges first (each part sorted)."""
+        return np.concatenate([self.universe[self.edge_ids()], np.array(sorted(self.extra), dtype=np.int64)])
+
+    # --- Compatibility tables ---
+
+    def compatibility_table(self, k):
+        """Returns is_compatible(perm, self, n, k) for every n-permutation, bit-packed by rank.
+
+        Compiled on first use from the cached permutation table and kept until
+        the laminate changes.
+        """
+        if k not in self._compat:
+            perms = load_overlap_graph(self.n).permutations
+            self._compat[k] = np.packbits(self._compatible(perms, k), bitorder="little")
+        return self._compat[k]
+
+    def _compatible(self, perms, k):
+        perms = np.asarray(perms, dtype=np.int64)
+        num_windows = self.n - k + 1
+        compatible = np.full(len(perms), num_windows <= 0 or k == self.edge_length)
+        if num_windows > 0 and k == self.edge_length:
+            powers = 10 ** np.arange(k - 1, -1, -1, dtype=np.int64)
+            for i in range(num_windows):
+                compatible &= self.contains_codes(perms[:, i:i + k] @ powers)
+        return compatible
+
+    def _refresh_compat(self, changed):
+        """Updates compiled tables for the permutations containing the changed edges only."""
+        if self.edge_length not in self._compat:
+            return  # Tables for other window sizes do not depend on the edges
+        if len(changed) > 256:
+            del self._compat[self.edge_length]  # Cheaper to recompile on next use
+            return
+        ranks = sorted(set(rank for code in changed.tolist() for rank in _ranks_containing(str(code), self.n)))
+        if not ranks:
+            return
+        ranks = np.array(ranks, dtype=np.int64)
+        compatible = self._compatible(load_overlap_graph(self.n).permutations[ranks], self.edge_length)
+        table = self._compat[self.edge_length]
+        masks = np.left_shift(np.uint8(1), (ranks & 7).astype(np.uint8))
+        np.bitwise_and.at(table, ranks >> 3, ~masks)
+        np.bitwise_or.at(table, (ranks >> 3)[compatible], masks[compatible])
+
+    def compatible_ranks(self, ranks, k):
+        """Batch compatibility lookup for an array of permutation ranks (boolean array)."""
+        ranks = np.asarray(ranks, dtype=np.int64)
+        table = self.compatibility_table(k)
+        return ((table[ranks >> 3] >> (ranks & 7).astype(np.uint8)) & 1).astype(bool)
+
+    # --- networkx-style API ---
+
+    def has_edge(self, u, v):
+        if not v or len(u) + 1 != self.edge_length or u[1:] != v[:-1]:
+            return False
+        return self.has_code(int(u + v[-1]))
+
+    def add_edge(self, u, v):
+        if u[1:] == v[:-1]:
+            self.add_codes([int(u + v[-1])])
+
+    def add_edges_from(self, edges):
+        self.add_codes([int(u + v[-1]) for u, v in edges if u[1:] == v[:-1]])
+
+    def remove_edge(self, u, v):
+        self.remove_codes([int(u + v[-1])])
+
+    def edges(self):
+        return [(kmer[:-1], kmer[1:]) for kmer in map(str, self.edge_codes().tolist())]
+
+    @property
+    def nodes(self):
+        return set(u for edge in self.edges() for u in edge)
+
+    def neighbors(self, u):
+        result = [str(code)[1:] for code in self.extra if str(code)[:-1] == u]
+        if len(self.universe) and len(u) + 1 == self.edge_length:
+            dbg = permutation_de_bruijn_graph(self.n, self.edge_length)
+            node = dbg.node_id(u)
+            if node >= 0:
+                result += [dbg.kmer(e)[1:] for e in dbg.out_edges(node) if self.has_code(int(dbg.edge_codes[e]))]
+        return result
+
+    def number_of_edges(self):
+        return int(np.unpackbits(self.words.view(np.uint8)).sum()) + len(self.extra)
+
+    def number_of_nodes(self):
+        codes = self.edge_codes()
+        if not len(codes):
+            return 0
+        return len(np.union1d(codes // 10, codes % (10 ** (self.edge_length - 1))))
+
+    def to_networkx(self):
+        graph = nx.DiGraph(**self.graph)
+        graph.add_edges_from(self.edges())
+        return graph
+
+    # --- Bitwise merges ---
+
+    def _check_compatible(self, other):
+        if (self.n, self.edge_length) != (other.n, other.edge_length):
+            raise ValueError("Laminates must share n and edge length to be merged.")
+
+    def __and__(self, other):
+        self._check_compatible(other)
+        return BitsetLaminate(self.n, self.edge_length, self.words & other.words, self.extra & other.extra)
+
+    def __or__(self, other):
+        self._check_compatible(other)
+        return BitsetLaminate(self.n, self.edge_length, self.words | other.words, self.extra | other.extra)
+
+    def density(self):
+        """Fraction of the edge universe present in the laminate (a popcount)."""
+        if not len(self.universe):
+            return 0.0
+        return (self.number_of_edges() - len(self.extra)) / len(self.universe)
+
+
+class AntiLaminate(BitsetLaminate):
+    """An anti-laminate stored as the cached complete template minus a sparse removal set.
+
+    Creating one costs O(len(removed)). Single-edge tests never touch the
+    bitset; `words` is materialized from the template on first use by the
+    vectorized operations (merges, popcounts, edge listings).
+    """
+
+    def __init__(self, n, k, removed=None, extra=None, source=""):
+        self.n = n
+        self.edge_length = k
+        self.universe, self.edge_index = edge_universe(n, k)
+        self.removed = set(code for code in removed if code in self.edge_index) if removed is not None else set()  # Removed universe edges
+        self.extra = extra if extra is not None else set()
+        self.graph = {"source": source}
+        self._words = None
+        self._compat = {}
+        self.version = 0
+        self.delta_log = []
+        self.log_start = 0
+
+    @property
+    def words(self):
+        if self._words is None:
+            words = anti_laminate_template(self.n, self.edge_length).copy()
+            ids = np.array([self.edge_index[code] for code in self.removed], dtype=np.int64)
+            np.bitwise_and.at(words, ids >> 6, ~np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64)))
+            self._words = words
+        return self._words
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_words"] = None  # Materialized again from the template on first use
+        return state
+
+    def copy(self):
+        laminate = AntiLaminate(self.n, self.edge_length, self.removed, set(self.extra), self.graph.get("source", ""))
+        laminate.version, laminate.delta_log, laminate.log_start = self.version, list(self.delta_log), self.log_start
+        return laminate
+
+    def _set_codes(self, codes, present):
+        code_list = np.asarray(codes, dtype=np.int64).tolist()
+        if present:
+            self.removed.difference_update(code_list)
+            self.extra.update(code for code in code_list if code not in self.edge_index)
+        else:
+            self.removed.update(code for code in code_list if code in self.edge_index)
+            self.extra.difference_update(code_list)
+        if self._words is not None:
+            super()._set_codes(codes, present)
+
+    def contains_codes(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        if self._words is None and len(codes) <= 1024:  # Small queries skip materializing the bitset
+            return np.array([self.has_code(code) for code in codes.tolist()], dtype=bool)
+        return super().contains_codes(codes)
+
+    def has_code(self, code):
+        if code in self.edge_index:
+            return code not in self.removed
+        return code in self.extra
+
+    def number_of_edges(self):
+        return len(self.universe) - len(self.removed) + len(self.extra)
+
+
+class WeightedLaminate:
+    """A laminate with a float32 confidence per edge of its edge universe.
+
+    `weights[i]` is the confidence of universe edge i (0 means absent); edges
+    outside the universe keep their confidence in the small `extra` dict.
+    threshold() turns it back into a hard BitsetLaminate.
+    """
+
+    def __init__(self, n, edge_length, weights=None, extra=None, source=""):
+        self.n = n
+        self.edge_length = edge_length
+        self.universe, self.edge_index = edge_universe(n, edge_length)
+        self.weights = weights if weights is not None else np.zeros(len(self.universe), dtype=np.float32)
+        self.extra = extra if extra is not None else {}  # {code: confidence} outside the universe
+        self.graph = {"source": source}
+
+    @classmethod
+    def from_laminate(cls, laminate, weight=1.0):
+        """Gives every edge of a BitsetLaminate the same confidence."""
+        weights = _laminate_bits(laminate).astype(np.float32) * np.float32(weight)
+        return cls(laminate.n, laminate.edge_length, weights, {code: float(weight) for code in laminate.extra}, laminate.graph.get("source", ""))
+
+    def copy(self):
+        return WeightedLaminate(self.n, self.edge_length, self.weights.copy(), dict(self.extra), self.graph.get("source", ""))
+
+    def weights_of_codes(self, codes):
+        """Returns the confidence of every edge code (0 for absent edges)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        result = np.zeros(len(codes), dtype=np.float32)
+        found = np.zeros(len(codes), dtype=bool)
+        if len(self.universe):
+            ids = np.minimum(np.searchsorted(self.universe, codes), len(self.universe) - 1)
+            found = self.universe[ids] == codes
+            result[found] = self.weights[ids[found]]
+        if self.extra:
+            for i in np.flatnonzero(~found):
+                result[i] = self.extra.get(int(codes[i]), 0.0)
+        return result
+
+    def edge_weight(self, u, v):
+        if not v:
+            return 0.0
+        return float(self.weights_of_codes([_kmer_code(u + v[-1])])[0])
+
+    def has_edge(self, u, v):
+        return self.edge_weight(u, v) > 0
+
+    def threshold(self, min_weight):
+        """Returns the hard BitsetLaminate of edges with confidence >= min_weight."""
+        laminate = BitsetLaminate(self.n, self.edge_length, source=self.graph.get("source", ""))
+        bits = np.zeros(len(laminate.words) * 64, dtype=np.uint8)
+        bits[:len(self.universe)] = (self.weights >= min_weight) & (self.weights > 0)
+        laminate.words = np.packbits(bits, bitorder="little").view(np.uint64)
+        laminate.extra = {code for code, weight in self.extra.items() if weight >= min_weight and weight > 0}
+        return laminate
+
+    def edges(self, data=False):
+        """Yields (u, v) for edges with nonzero confidence, or (u, v, {"weight": w}) with data=True."""
+        ids = np.flatnonzero(self.weights)
+        items = list(zip(self.universe[ids].tolist(), self.weights[ids].tolist())) + [(code, w) for code, w in sorted(self.extra.items()) if w]
+        for code, weight in items:
+            kmer = str(code)
+            yield (kmer[:-1], kmer[1:], {"weight": weight}) if data else (kmer[:-1], kmer[1:])
+
+    def number_of_edges(self):
+        return int(np.count_nonzero(self.weights)) + sum(1 for w in self.extra.values() if w)
+
+    def to_networkx(self):
+        graph = nx.DiGraph(**self.graph)
+        graph.add_edges_from(self.edges(data=True))
+        return graph
+
+
+def _laminate_bits(laminate):
+    """Returns a laminate's membership as a uint8 0/1 array over its edge universe."""
+    return np.unpackbits(laminate.words.view(np.uint8), bitorder="little")[:len(laminate.universe)]
+
+def weighted_merge(laminates, weights=None, threshold=None):
+    """Merges BitsetLaminates/WeightedLaminates into a WeightedLaminate of average confidence.
+
+    Every laminate becomes one row of a (laminates x universe) matrix, and the
+    merge is a single weighted reduction over the rows. Edge confidence is the
+    weighted mean, so it lies in [0, 1] for hard laminates.
+
+    Args:
+        laminates (list): Laminates sharing n and edge length.
+        weights (list): Per-laminate weights (default: all 1).
+        threshold (float): If given, return threshold(threshold) instead.
+    """
+    first = laminates[0]
+    if any((lam.n, lam.edge_length) != (first.n, first.edge_length) for lam in laminates):
+        raise ValueError("Laminates must share n and edge length to be merged.")
+    weights = np.ones(len(laminates), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+    if len(weights) != len(laminates):
+        raise ValueError("Need one weight per laminate.")
+    total = float(weights.sum())
+    if total <= 0:
+        raise ValueError("Laminate weights must have a positive sum.")
+
+    hard = [i for i, lam in enumerate(laminates) if not isinstance(lam, WeightedLaminate)]
+    soft = [i for i, lam in enumerate(laminates) if isinstance(lam, WeightedLaminate)]
+    merged = np.zeros(len(first.universe), dtype=np.float32)
+    if hard:
+        # Unpack all bitsets at once: (len(hard), universe) 0/1 matrix
+        words = np.stack([laminates[i].words for i in hard])
+        bits = np.unpackbits(words.view(np.uint8), axis=1, bitorder="little")[:, :len(first.universe)]
+        merged += weights[hard] @ bits.astype(np.float32)
+    if soft:
+        merged += weights[soft] @ np.stack([laminates[i].weights for i in soft])
+    merged /= np.float32(total)
+
+    # Edges outside the universe: one weighted bincount over all laminates' extra codes
+    extra_codes, extra_weights = [], []
+    for weight, lam in zip(weights.tolist(), laminates):
+        if isinstance(lam, WeightedLaminate):
+            extra_codes.append(np.fromiter(lam.extra.keys(), dtype=np.int64, count=len(lam.extra)))
+            extra_weights.append(weight * np.fromiter(lam.extra.values(), dtype=np.float64, count=len(lam.extra)))
+        else:
+            extra_codes.append(np.fromiter(lam.extra, dtype=np.int64, count=len(lam.extra)))
+            extra_weights.append(np.full(len(lam.extra), weight, dtype=np.float64))
+    codes, inverse = np.unique(np.concatenate(extra_codes), return_inverse=True)
+    sums = np.bincount(inverse, weights=np.concatenate(extra_weights), minlength=len(codes)) / total
+    extra = dict(zip(codes.tolist(), sums.tolist()))
+
+    result = WeightedLaminate(first.n, first.edge_length, merged, extra, source="weighted_merge")
+    return result.threshold(threshold) if threshold is not None else result
+
+def _ranks_containing(kmer, n):
+    """Returns the ranks of the n-permutations that contain a k-mer string."""
+    symbols = tuple(int(x) for x in kmer)
+    if len(set(symbols)) != len(symbols) or not all(1 <= x <= n for x in symbols):
+        return []
+    missing = [x for x in range(1, n + 1) if x not in symbols]
+    return [permutation_rank(order[:i] + symbols + order[i:])
+            for order in itertools.permutations(missing) for i in range(len(missing) + 1)]
+
+def as_networkx(laminate):
+    """Returns a networkx view of a laminate, for code that needs the full graph API."""
+    if isinstance(laminate, (BitsetLaminate, WeightedLaminate)):
+        return laminate.to_networkx()
+    return laminate
+
+def _kmer_code(kmer):
+    return int("".join(map(str, kmer)))
+
+def _sequence_edge_codes(sequence, n, k):
+    """Returns the codes of create_laminate's edges for a sequence (vectorized).
+
+    For every position i where a valid permutation starts (and i >= k), the edge
+    is sequence[i-k:i+1]: the k-mer before the permutation joined to the one
+    shifted by a symbol.
+    """
+    if not isinstance(sequence, str):
+        sequence = "".join(map(str, sequence))
+    digits = np.frombuffer(sequence.encode("ascii"), dtype=np.uint8).astype(np.int64) - 48
+    if len(digits) < n or len(digits) < k + 1:
+        return np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(digits, n)
+    in_range = ((windows >= 1) & (windows <= n)).all(axis=1)
+    masks = np.bitwise_or.reduce(np.left_shift(1, np.clip(windows, 0, 62)), axis=1)
+    valid = np.flatnonzero(in_range & (masks == (1 << (n + 1)) - 2))
+    valid = valid[valid >= k]
+    powers = 10 ** np.arange(k, -1, -1, dtype=np.int64)
+    edge_windows = np.lib.stride_tricks.sliding_window_view(digits, k + 1)
+    return edge_windows[valid - k] @ powers
 
 def create_laminate(sequence, n, k):
-    """Creates a laminate graph from a sequence."""
-    graph = nx.DiGraph()
-    seq_list = [int(x) for x in sequence]
-    for i in range(len(seq_list) - n + 1):
-        perm = tuple(seq_list[i:i + n])
-        if is_valid_permutation(perm, n):
-            if i >= k:
-                kmer1 = "".join(str(x) for x in seq_list[i - k:i])
-                kmer2 = "".join(str(x) for x in seq_list[i - k + 1:i + 1])
-                if len(kmer1) == k and len(kmer2) == k:
-                    graph.add_edge(kmer1, kmer2)
-    return graph
+    """Creates a laminate from a sequence (a BitsetLaminate over (k+1)-mer edges)."""
+    return BitsetLaminate.from_codes(n, k + 1, _sequence_edge_codes(sequence, n, k))
 
 def is_compatible(permutation, laminate_graph, n, k):
     """Checks if a permutation is compatible with a laminate graph."""
     perm_str = "".join(str(x) for x in permutation)
+    if isinstance(laminate_graph, BitsetLaminate):
+        if len(laminate_graph.universe) and len(perm_str) == n and set(perm_str) == set("123456789"[:n]):
+            rank = permutation_rank(tuple(int(x) for x in perm_str))
+            return bool((laminate_graph.compatibility_table(k)[rank >> 3] >> (rank & 7)) & 1)
+        return all(k == laminate_graph.edge_length and laminate_graph.has_code(int(perm_str[i:i + k]))
+                   for i in range(len(perm_str) - k + 1))
     for i in range(len(perm_str) - k + 1):
         kmer1 = perm_str[i:i + k - 1]
         kmer2 = perm_str[i + 1:i + k]
@@ -27,37 +589,279 @@ def is_compatible(permutation, laminate_graph, n, k):
                 return False
     return True
 
+def is_compatible_batch(ranks, laminate_graph, n, k):
+    """Vectorized is_compatible over an array of permutation ranks; returns a boolean array."""
+    if isinstance(laminate_graph, BitsetLaminate) and len(laminate_graph.universe):
+        return laminate_graph.compatible_ranks(ranks, k)
+    return np.array([is_compatible(permutation_unrank(int(rank), n), laminate_graph, n, k) for rank in ranks], dtype=bool)
+
+class LaminateAutomaton:
+    """The active laminate stack fused into one deterministic automaton over symbols.
+
+    Every laminate allows the windows it spells as edges (a laminate with edge
+    length e constrains every e-symbol window). With w the longest window, a
+    state is the last w-1 symbols read, and `table[state, symbol]` is the
+    next state or -1 when the new symbol completes a window some laminate
+    forbids. Only (w-1)-strings that start or end an allowed w-mer get a row;
+    any other prefix enters DOOMED, whose every transition is -1. The first
+    w-1 symbols are checked window by window against the per-length sets.
+    """
+
+    def __init__(self, laminates, n):
+        self.n = n
+        self.sources = [(weakref.ref(laminate), laminate.version) for laminate in laminates]  # Don't keep laminates alive
+        self._rows = None
+        allowed = {}  # {window length: sorted codes allowed by every laminate of that length}
+        for laminate in laminates:
+            codes = np.unique(laminate.edge_codes())
+            e = laminate.edge_length
+            allowed[e] = np.intersect1d(allowed[e], codes, assume_unique=True) if e in allowed else codes
+        self.allowed = allowed
+        self.window = max(allowed, default=0)
+        w = self.window
+        if not w:
+            self.state_codes = np.zeros(1, dtype=np.int64)
+            self.table = np.zeros((2, 10), dtype=np.int32)  # No constraints: one state accepting everything
+            self.table[1] = -1
+            return
+
+        # Allowed w-mers, keeping only those whose last e-window passes every shorter laminate
+        valid = allowed[w]
+        for e, codes in allowed.items():
+            if e < w and len(valid):
+                valid = valid[_sorted_contains(codes, valid % 10 ** e)]
+        tail = 10 ** (w - 1)
+        self.state_codes = np.unique(np.concatenate([valid // 10, valid % tail]))
+        self.table = np.full((len(self.state_codes) + 1, 10), -1, dtype=np.int32)  # Last row: DOOMED
+        self.table[np.searchsorted(self.state_codes, valid // 10), valid % 10] = np.searchsorted(self.state_codes, valid % tail)
+
+    @property
+    def doomed(self):
+        return len(self.state_codes)
+
+    def is_current(self, laminates):
+        """True if compiled from exactly these laminates, none changed since."""
+        return (len(laminates) == len(self.sources)
+                and all(lam is src() and lam.version == version for lam, (src, version) in zip(laminates, self.sources)))
+
+    def is_dead(self):
+        """True once one of its laminates has been garbage collected (it can never be current again)."""
+        return any(src() is None for src, _ in self.sources)
+
+    def _warm_up(self, candidate):
+        """Checks windows ending in the first w-1 symbols; returns the first bad position or -1."""
+        for i in range(min(len(candidate), self.window - 1)):
+            if candidate[i] not in "0123456789":
+                return i  # Not a symbol, so no laminate allows it
+            for e, codes in self.allowed.items():
+                if e <= i + 1 and not _sorted_contains(codes, [int(candidate[i - e + 1:i + 1])])[0]:
+                    return i
+        return -1
+
+    def state_of(self, prefix):
+        """Returns the state after reading `prefix` (at least w-1 symbols), or -1 if it is already rejected."""
+        prefix = str(prefix)
+        if self.window <= 1:
+            return -1 if self.first_violation(prefix) >= 0 else 0
+        if len(prefix) < self.window - 1:
+            raise ValueError(f"Need at least {self.window - 1} symbols to enter the automaton.")
+        if self.first_violation(prefix) >= 0:
+            return -1
+        code = int(prefix[-(self.window - 1):])
+        idx = int(np.searchsorted(self.state_codes, code))
+        return idx if idx < len(self.state_codes) and self.state_codes[idx] == code else self.doomed
+
+    def step(self, state, symbol):
+        """Next state after appending `symbol` (a digit), or -1."""
+        return int(self.table[state, int(symbol)]) if state >= 0 else -1
+
+    def allowed_symbols(self, state):
+        """Digits that can be appended in `state` without breaking a laminate."""
+        return np.flatnonzero(self.table[state] >= 0) if state >= 0 else np.zeros(0, dtype=np.int64)
+
+    def first_violation(self, candidate):
+        """Single pass over `candidate`; returns the position of the first symbol that
+        completes a forbidden window, or -1 if every window is allowed."""
+        if not isinstance(candidate, str):
+            candidate = "".join(map(str, candidate))
+        bad = self._warm_up(candidate)
+        if bad >= 0 or len(candidate) < max(self.window, 1):
+            return bad
+        if self._rows is None:
+            # Python rows indexed by byte: the per-symbol loop below avoids NumPy scalar indexing, and
+            # anything that is not a digit reads -1, as if from the DOOMED state
+            self._rows = [[-1] * 48 + row + [-1] * 198 for row in self.table.tolist()]
+        rows = self._rows
+        if self.window <= 1:
+            state = 0
+        else:
+            state = self.doomed
+            code = int(candidate[:self.window - 1])
+            idx = int(np.searchsorted(self.state_codes, code))
+            if idx < len(self.state_codes) and self.state_codes[idx] == code:
+                state = idx
+        start = max(self.window - 1, 0)
+        for i, byte in enumerate(candidate[start:].encode("ascii", "replace"), start):  # One byte per symbol
+            state = rows[state][byte]
+            if state < 0:
+                return i
+        return -1
+
+    def accepts(self, candidate):
+        return self.first_violation(candidate) < 0
+
+
+def _sorted_contains(sorted_codes, codes):
+    """Membership of `codes` in a sorted code array."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if not len(sorted_codes):
+        return np.zeros(len(codes), dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_codes, codes), len(sorted_codes) - 1)
+    return sorted_codes[idx] == codes
+
+_automaton_cache = []  # Recently compiled LaminateAutomatons, newest last
+_converted_graphs = weakref.WeakKeyDictionary()  # {networkx laminate: (sorted edge codes, BitsetLaminate)}
+
+def _as_bitset_laminate(laminate, n):
+    """Converts a networkx laminate, reusing the previous conversion while its edges are unchanged."""
+    if isinstance(laminate, BitsetLaminate):
+        return laminate
+    codes = np.unique(np.array([int(u + v[-1]) for u, v in laminate.edges()], dtype=np.int64))
+    cached = _converted_graphs.get(laminate)
+    if cached is None or not np.array_equal(cached[0], codes):
+        cached = (codes, BitsetLaminate.from_graph(laminate, n))
+        _converted_graphs[laminate] = cached
+    return cached[1]
+
+def compile_laminate_stack(laminates, n):
+    """Returns a LaminateAutomaton for the active laminates (positive, anti and constraint alike).
+
+    Compiled automatons are reused while the same laminate objects are
+    unchanged (by version). networkx laminates are converted first, and the
+    conversion is reused while the graph's edges stay the same, so they hit
+    the cache too. The cache only holds weak references to laminates.
+    """
+    laminates = [_as_bitset_laminate(lam, n) for lam in laminates]
+    _automaton_cache[:] = [automaton for automaton in _automaton_cache if not automaton.is_dead()]
+    for automaton in _automaton_cache:
+        if automaton.n == n and automaton.is_current(laminates):
+            return automaton
+    automaton = LaminateAutomaton(laminates, n)
+    _automaton_cache.append(automaton)
+    if len(_automaton_cache) > 8:
+        _automaton_cache.pop(0)
+    return automaton
+
 def create_anti_laminate(anti_prodigals, n, k):
-    """Creates an anti-laminate graph from a set of anti-prodigals."""
+    """Creates an anti-laminate from a set of anti-prodigals.
+
+    The anti-laminate is every k-mer edge of the n-permutations (the cached
+    template) minus the edges spelled by the anti-prodigal k-mers, so the cost
+    is proportional to the number of anti-prodigals rather than n!.
+    """
+    return AntiLaminate(n, k, removed=[_kmer_code(anti_prodigal) for anti_prodigal in anti_prodigals if len(anti_prodigal) == k])
+
+def laminate_validation_context(n, edge_length, winners, losers, layout_memory):
+    """Builds the dense arrays validate_laminate gathers edge scores from.
+
+    Build it once and pass it as `context` when validating many laminates
+    with the same n, edge length and data.
+    """
+    context = {
+        "edge_length": edge_length,
+        "winners": dense_kmer_weights(winners, n, edge_length),
+        "losers": dense_kmer_weights(losers, n, edge_length),
+        "layout": None,  # None: layout_memory is not a dict, so counts are looked up per edge
+    }
+    if isinstance(layout_memory, dict):
+        items = []
+        for key, entry in layout_memory.items():
+            try:
+                (n_u, u), (n_v, v) = key
+            except (TypeError, ValueError):
+                continue  # Not a ((n, u), (n, v)) layout edge
+            if n_u == n_v == n and isinstance(u, str) and isinstance(v, str) and len(u) + 1 == edge_length and u[1:] == v[:-1]:
+                items.append((u + v[-1], entry.get("count", 0)))
+        codes = kmers_to_codes([kmer for kmer, _ in items], edge_length)
+        counts = np.array([count for _, count in items], dtype=np.float64)
+        order = np.argsort(codes)
+        context["layout"] = (codes[order], counts[order])
+    return context
+
+def _validate_bitset_laminate(laminate, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals, context):
+    """validate_laminate for a BitsetLaminate, on integer edge arrays."""
+    codes = laminate.edge_codes()
+    edge_length = laminate.edge_length
+    if len(codes):
+        # Node validity (the De Bruijn property holds by construction)
+        if edge_length != k:
+            return False, f"Invalid node length: {str(codes[0])[:-1]} (should be {k-1})", 0
+        digits = (codes[:, None] // 10 ** np.arange(edge_length - 1, -1, -1, dtype=np.int64)) % 10
+        bad = (digits < 1) | (digits > n)
+        if bad.any():
+            row, col = np.argwhere(bad)[0]
+            kmer = str(codes[row])
+            return False, f"Invalid digit in node: {kmer[:-1] if col < edge_length - 1 else kmer[1:]}", 0
 
-    anti_laminate = nx.DiGraph()
+    # Laminate Type Consistency, on the compact graph
+    if laminate_type == "negative" and len(codes):
+        num_nodes, sources, targets = _laminate_edge_arrays(laminate)
+        adjacency = sp.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(num_nodes, num_nodes))
+        num_sccs, labels = connected_components(adjacency, directed=True, connection="strong")
+        if num_sccs == 1:
+            return False, "Anti-laminate cannot be strongly connected", 0
+        if np.bincount(labels).max() > 1 or np.any(sources == targets):  # A cycle is an SCC of 2+ nodes or a self-loop
+            return False, "Anti-laminate cannot contain cycles", 0
 
-    # Create a complete graph with all possible (n-1)-mers as nodes and edges
-    for perm in generate_permutations(n):
-        perm_str = "".join(map(str, perm))
-        for i in range(len(perm_str) - (k - 1) + 1):
-            kmer1 = perm_str[i:i + k - 1]
-            kmer2 = perm_str[i + 1:i + k]
-            if len(kmer1) == k-1 and len(kmer2) == k - 1:
-                anti_laminate.add_edge(kmer1, kmer2)
+    # --- Contextual Validation, gathered from dense arrays ---
+    score = 0
+    if len(codes):
+        if context is None or context["edge_length"] != edge_length:
+            context = laminate_validation_context(n, edge_length, winners, losers, layout_memory)
+        winner_weights = gather_kmer_weights(context["winners"], codes)
+        loser_weights = gather_kmer_weights(context["losers"], codes)
+        if laminate_type == "positive":
+            if context["layout"] is not None:
+                counts = gather_kmer_weights(context["layout"], codes)
+            else:
+                counts = np.array([layout_memory.get(((n, kmer[:-1]), (n, kmer[1:])), {'count': 0})['count']
+                                   for kmer in map(str, codes.tolist())], dtype=np.float64)
+            score = float(np.sum(winner_weights - loser_weights) - np.sum(10 / (counts + 1)))
+        elif laminate_type == "negative":
+            score = -float(np.sum(winner_weights + loser_weights))
+        score = score / len(codes)
 
+    # --- Anti-Prodigal Consistency (for positive laminates) ---
+    if laminate_type == "positive":
+        anti_codes = [_kmer_code(anti_prodigal) for anti_prodigal in anti_prodigals if len(anti_prodigal) == k]
+        if anti_codes:
+            score -= 100 * int(laminate.contains_codes(anti_codes).sum())
 
-    # Remove edges that correspond to anti-prodigal k-mers
-    for anti_prodigal in anti_prodigals:
-        if len(anti_prodigal) == k:  # Ensure the anti-prodigal is a k-mer
-            prefix = anti_prodigal[:-1]
-            suffix = anti_prodigal[1:]
-            if anti_laminate.has_edge(prefix, suffix):
-                anti_laminate.remove_edge(prefix, suffix)
+    return True, None, score
 
-    return anti_laminate
+def validate_laminates(laminates, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals):
+    """Validates a list of laminates, sharing the dense scoring arrays between them."""
+    contexts = {}
+    results = []
+    for laminate in laminates:
+        context = None
+        if isinstance(laminate, BitsetLaminate):
+            if laminate.edge_length not in contexts:
+                contexts[laminate.edge_length] = laminate_validation_context(n, laminate.edge_length, winners, losers, layout_memory)
+            context = contexts[laminate.edge_length]
+        results.append(validate_laminate(laminate, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals, context))
+    return results
 
-def validate_laminate(laminate, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals):
+def validate_laminate(laminate, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals, context=None):
     """Validates a laminate graph (positive or anti-laminate).
 
     Includes contextual validation against winners, losers, layout_memory,
-    and anti_prodigals.
+    and anti_prodigals. BitsetLaminates are validated on their edge-code
+    arrays; `context` (from laminate_validation_context) can be reused across
+    calls.
     """
+    if isinstance(laminate, BitsetLaminate):
+        return _validate_bitset_laminate(laminate, n, k, laminate_type, winners, losers, layout_memory, anti_prodigals, context)
 
     # --- (Existing Node and Edge Validity Checks - as before) ---
     # Node Validity
@@ -128,22 +932,94 @@ def analyze_laminate_density(laminate):
         return 0
     return num_edges / max_possible_edges
 
-def analyze_laminate_connectivity(laminate):
-    """Analyzes the connectivity of a laminate graph."""
-    if nx.number_of_nodes(laminate) == 0:
-        return 0
-    return nx.average_node_connectivity(laminate)
+def analyze_laminate_connectivity(laminate, num_samples=32, time_budget=0.05):
+    """Analyzes the connectivity of a laminate graph (sampled average node connectivity, or None if nothing was sampled)."""
+    return estimate_laminate_connectivity(laminate, num_samples, time_budget)["node_connectivity"]
+
+_connectivity_cache = weakref.WeakKeyDictionary()  # {BitsetLaminate: (version, parameters, result)}
+
+def _laminate_edge_arrays(laminate):
+    """Returns (num_nodes, sources, targets) with the laminate's edges as node-ID arrays."""
+    if isinstance(laminate, BitsetLaminate):
+        codes = laminate.edge_codes()
+        prefixes, suffixes = codes // 10, codes % (10 ** max(laminate.edge_length - 1, 0))
+        nodes = np.union1d(prefixes, suffixes)
+        return len(nodes), np.searchsorted(nodes, prefixes), np.searchsorted(nodes, suffixes)
+    index = {node: i for i, node in enumerate(laminate.nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in laminate.edges()], dtype=np.int64).reshape(-1, 2)
+    return len(index), edges[:, 0], edges[:, 1]
+
+def estimate_laminate_connectivity(laminate, num_samples=32, time_budget=0.05, seed=0):
+    """Estimates a laminate's connectivity from SCC statistics and sampled max-flows.
+
+    The average node connectivity (what nx.average_node_connectivity computes
+    over all ordered node pairs) is estimated from random pairs. Each pair is a
+    unit-capacity max-flow on the node-split graph, solved by scipy, until
+    num_samples pairs are done or time_budget seconds have passed. The budget
+    starts once the node-split graph is built, and at least one pair is always
+    evaluated. Results for a BitsetLaminate are cached per laminate version,
+    unless nothing could be sampled.
+
+    Returns:
+        dict: num_nodes, num_edges, num_sccs, largest_scc_fraction,
+        node_connectivity (the estimate; 0.0 with fewer than two nodes, None
+        if num_samples < 1) and samples (pairs evaluated).
+    """
+    parameters = (num_samples, time_budget, seed)
+    if isinstance(laminate, BitsetLaminate):
+        cached = _connectivity_cache.get(laminate)
+        if cached is not None and cached[0] == laminate.version and cached[1] == parameters:
+            return cached[2]
+    num_nodes, sources, targets = _laminate_edge_arrays(laminate)
+    result = {"num_nodes": num_nodes, "num_edges": len(sources), "num_sccs": num_nodes,
+              "largest_scc_fraction": 1.0 if num_nodes else 0.0, "node_connectivity": 0.0, "samples": 0}
+    if num_nodes >= 2:
+        adjacency = sp.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(num_nodes, num_nodes))
+        num_sccs, labels = connected_components(adjacency, directed=True, connection="strong")
+        result["num_sccs"] = int(num_sccs)
+        result["largest_scc_fraction"] = float(np.bincount(labels).max() / num_nodes)
+        # Node i splits into 2i -> 2i+1 and edge (u, v) becomes 2u+1 -> 2v, all with capacity 1
+        nodes = np.arange(num_nodes)
+        rows = np.concatenate([2 * nodes, 2 * sources + 1])
+        cols = np.concatenate([2 * nodes + 1, 2 * targets])
+        split = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(2 * num_nodes, 2 * num_nodes))
+        rng = np.random.default_rng(seed)
+        total = 0
+        deadline = time.perf_counter() + time_budget
+        while result["samples"] < num_samples and (not result["samples"] or time.perf_counter() < deadline):
+            u, v = rng.choice(num_nodes, size=2, replace=False)
+            total += maximum_flow(split, int(2 * u + 1), int(2 * v)).flow_value
+            result["samples"] += 1
+        if not result["samples"]:
+            result["node_connectivity"] = None
+            return result  # Not an estimate, so don't cache it
+        result["node_connectivity"] = float(total) / result["samples"]
+    if isinstance(laminate, BitsetLaminate):
+        _connectivity_cache[laminate] = (laminate.version, parameters, result)
+    return result
 
 def get_allowed_transitions(laminate, kmer):
     """Gets allowed transitions from a kmer based on the laminate."""
     return list(laminate.neighbors(kmer))
 
-def merge_laminates(laminates, method="intersection"):
-    """Merges multiple laminates using different strategies."""
+def merge_laminates(laminates, method="intersection", weights=None, threshold=None):
+    """Merges multiple laminates using different strategies.
+
+    "weighted_average" takes optional per-laminate `weights` and returns edge
+    confidences (a WeightedLaminate, or a graph with "weight" edge attributes);
+    with a `threshold` it returns the hard laminate of edges at or above it.
+    """
 
     if not laminates:
         return nx.DiGraph()  # Return an empty graph if the list is empty
 
+    if method in ("intersection", "union") and all(isinstance(lam, BitsetLaminate) for lam in laminates):
+        # Word-wise AND/OR over the bitsets
+        merged_laminate = laminates[0].copy()
+        for laminate in laminates[1:]:
+            merged_laminate = merged_laminate & laminate if method == "intersection" else merged_laminate | laminate
+        return merged_laminate
+
     if method == "intersection":
         # Keep only edges present in *all* laminates
         merged_laminate = nx.DiGraph()
@@ -166,26 +1042,29 @@ def merge_laminates(laminates, method="intersection"):
         return merged_laminate
 
     elif method == "weighted_average":
-        # Placeholder for weighted average merging (more complex implementation)
-        # Requires edge weights in the laminate graphs.
-        raise NotImplementedError("Weighted average merging not yet implemented.")
+        if all(isinstance(lam, (BitsetLaminate, WeightedLaminate)) for lam in laminates):
+            return weighted_merge(laminates, weights, threshold)
+        # networkx graphs: accumulate per edge, reading any "weight" attribute as confidence
+        weights = [1.0] * len(laminates) if weights is None else list(weights)
+        total = sum(weights)
+        confidence = {}
+        for weight, laminate in zip(weights, map(as_networkx, laminates)):
+            for u, v, data in laminate.edges(data=True):
+                confidence[(u, v)] = confidence.get((u, v), 0.0) + weight * data.get("weight", 1.0) / total
+        merged_laminate = nx.DiGraph()
+        for (u, v), value in confidence.items():
+            if threshold is None:
+                merged_laminate.add_edge(u, v, weight=value)
+            elif value >= threshold and value > 0:
+                merged_laminate.add_edge(u, v)
+        return merged_laminate
     else:
         raise ValueError("Invalid merge method.")
 
 def create_n7_constraint_laminate(sequence, n, k):
     """Creates a laminate representing a minimal superpermutation for n=7."""
     # Implementation is identical to create_laminate
-    graph = nx.DiGraph()
-    seq_list = [int(x) for x in sequence]
-    for i in range(len(seq_list) - n + 1):
-        perm = tuple(seq_list[i:i + n])
-        if is_valid_permutation(perm, n):
-            if i >= k:
-                kmer1 = "".join(str(x) for x in seq_list[i - k:i])
-                kmer2 = "".join(str(x) for x in seq_list[i - k + 1:i + 1])
-                if len(kmer1) == k and len(kmer2) == k:
-                    graph.add_edge(kmer1, kmer2)
-    return graph
+    return create_laminate(sequence, n, k)
 
 def create_constraint_laminate(sequence, n, k):
     """Generalized Constraint Laminate"""
@@ -196,17 +1075,13 @@ def update_laminate(laminate, sequences, n, k, type):
     """Updates a laminate with new sequences, either adding positive edges, or removing from an anti"""
     if type == "positive":
       for seq in sequences:
-        new_edges = []
-        seq_list = [int(x) for x in seq]
-        for i in range(len(seq_list) - n + 1):
-            perm = tuple(seq_list[i:i + n])
-            if is_valid_permutation(perm, n):
-                if i >= k:
-                    kmer1 = "".join(str(x) for x in seq_list[i - k:i])
-                    kmer2 = "".join(str(x) for x in seq_list[i - k + 1:i + 1])
-                    if len(kmer1) == k and len(kmer2) == k:
-                        new_edges.append((kmer1,kmer2))
-        laminate.add_edges_from(new_edges) #Add all the edges at once.
+        new_codes = _sequence_edge_codes(seq, n, k)
+        if isinstance(laminate, BitsetLaminate):
+            laminate.add_codes(new_codes)
+        else:
+            laminate.add_edges_from((kmer[:-1], kmer[1:]) for kmer in map(str, new_codes.tolist())) #Add all the edges at once.
+    elif type == "negative" and isinstance(laminate, BitsetLaminate):
+        laminate.remove_codes([_kmer_code(anti_prodigal) for anti_prodigal in sequences if len(anti_prodigal) == k]) # One logged delta
     elif type == "negative":
         for anti_prodigal in sequences: # Assuming sequences are now anti-prodigals
             if len(anti_prodigal) == k:  # Ensure the anti-prodigal is a k-mer
@@ -216,84 +1091,319 @@ def update_laminate(laminate, sequences, n, k, type):
                     laminate.remove_edge(prefix, suffix)
     return laminate
 
-_next_laminate_id = 1
+def refresh_laminate(laminate, sequence, n, k):
+    """Replaces a laminate's edges with those of create_laminate(sequence, n, k) in place.
+
+    Only the edges that differ are added or removed (and logged), so a constraint
+    laminate can follow a new best superpermutation without being rebuilt.
+    """
+    target = np.unique(_sequence_edge_codes(sequence, n, k))
+    current = laminate.edge_codes()
+    laminate.remove_codes(np.setdiff1d(current, target))
+    laminate.add_codes(np.setdiff1d(target, current))
+    return laminate
 
-def add_laminate_to_album(laminate, n, k, source, description, metadata=None):
-    """Adds a laminate to the 'laminate album' (a dictionary)."""
-    global _next_laminate_id
-    laminate_id = _next_laminate_id
-    _next_laminate_id += 1
+# --- Laminate Album ---
 
-    if (n, k) not in laminate_album:
-        laminate_album[(n, k)] = []  # Initialize if needed
+LAMINATE_ALBUM_DIR = "laminate_album"
 
-    laminate_entry = {
-        "id": laminate_id,
-        "graph": laminate,  # Store the actual graph object
-        "source": source,
-        "description": description,
-        "metadata": metadata if metadata is not None else {}, #Avoid errors
-        "score": 0, #Initialize to zero
-    }
-    # Calculate the score using validate_laminate
-    is_valid, error_message, score = validate_laminate(laminate, n, k, "positive", winners, losers, layout_memory, {})
-    if is_valid:
-        laminate_entry["score"] = score
+def _laminate_nbytes(laminate):
+    """Approximate resident size of a laminate, including its compiled tables."""
+    size = sum(table.nbytes for table in laminate._compat.values()) + 64 * len(laminate.extra)
+    if isinstance(laminate, AntiLaminate):
+        size += 64 * len(laminate.removed) + (laminate._words.nbytes if laminate._words is not None else 0)
     else:
-        logging.error(f"Failed to add laminate to album: {error_message}") #Log if not valid
-        return None  # Don't add invalid laminates
+        size += laminate.words.nbytes
+    return size
 
-    laminate_album[(n, k)].append(laminate_entry)
-    logging.info(f"Added laminate to album: ID={laminate_id}, Source={source}, n={n}, k={k}")
-    return laminate_id
 
-def select_laminates(n, k, task, context, all_laminates):
-    """Selects laminates from the album based on the current context."""
-    # Placeholder implementation:  Select a few "good" laminates based on source
-    # and score.  In a real implementation, this would be much more sophisticated.
+class LaminateAlbum:
+    """Indexed store of laminates with lazy loading and a resident-memory budget.
+
+    Every laminate is written to `directory` when added (edge codes, or the
+    removal set for an anti-laminate) and only kept in memory while it is
+    being used. Entries are indexed by (n, k) and by (n, k, tag) in lists kept
+    sorted by score, so selecting the best `count` laminates is O(count) no
+    matter how many the album holds. When resident laminates exceed
+    `memory_budget` bytes, laminates are dropped from memory (after writing
+    back any changes): first those used at most once, then the rest, least
+    recently used first within each group.
+
+    The entry index is saved as album.json next to the laminate files, so an
+    album opened on an existing directory (a later run) picks up its
+    laminates and keeps numbering after them. Adds, removals and rescoring
+    only mark the index dirty; flush() writes it (and any changed resident
+    laminates) in one go, so call it before the album is dropped. Only one
+    process should write to a directory at a time; give concurrent albums
+    their own directories.
+    """
+
+    def __init__(self, directory=LAMINATE_ALBUM_DIR, memory_budget=256 * 2**20):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.entries = {}  # {id: entry metadata}
+        self.resident = {}  # {id: laminate}
+        self.resident_bytes = 0
+        self._charged = {}  # {id: bytes added to resident_bytes for it}
+        self._index_dirty = False
+        self._ranked = {}  # {(n, k) or (n, k, tag): [(-score, id)] sorted}
+        self._by_source = {}  # {(n, k, source): set of ids}
+        self._clock = 0
+        self.next_id = 1
+        self._load_index()
+
+    def _path(self, laminate_id):
+        return os.path.join(self.directory, f"laminate_{laminate_id}.npy")
+
+    def _index_path(self):
+        return os.path.join(self.directory, "album.json")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        for entry in index["entries"]:
+            entry["tags"] = tuple(entry["tags"])
+            self.entries[entry["id"]] = entry
+            for key in self._index_keys(entry):
+                self._ranked.setdefault(key, []).append((-entry["score"], entry["id"]))
+            self._by_source.setdefault((entry["n"], entry["k"], entry["source"]), set()).add(entry["id"])
+            self._clock = max(self._clock, entry["last_used"])
+        for ranked in self._ranked.values():
+            ranked.sort()
+        self.next_id = max([index["next_id"]] + [laminate_id + 1 for laminate_id in self.entries])
+        logging.info(f"Loaded laminate album index with {len(self.entries)} laminates from {self.directory}.")
+
+    def _save_index(self):
+        """Atomically rewrites album.json."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"next_id": self.next_id, "entries": list(self.entries.values())}, f, default=str)
+        os.replace(tmp_path, self._index_path())
+        self._index_dirty = False
+
+    def _index_keys(self, entry):
+        n, k = entry["n"], entry["k"]
+        return [(n, k)] + [(n, k, tag) for tag in entry["tags"]]
+
+    def _write(self, entry, laminate):
+        os.makedirs(self.directory, exist_ok=True)
+        codes = np.array(sorted(laminate.removed), dtype=np.int64) if entry["kind"] == "anti" else laminate.edge_codes()
+        np.save(self._path(entry["id"]), codes)
+        entry["saved_version"] = laminate.version
+
+    def _touch(self, laminate_id):
+        self._clock += 1
+        entry = self.entries[laminate_id]
+        entry["uses"] += 1
+        entry["last_used"] = self._clock
+
+    def add(self, laminate, n, k, source, description="", tags=(), metadata=None, score=0.0):
+        """Adds a laminate (BitsetLaminate, AntiLaminate or networkx graph) and returns its ID."""
+        if not isinstance(laminate, BitsetLaminate):
+            laminate = BitsetLaminate.from_graph(laminate, n)
+        laminate_id = self.next_id
+        self.next_id += 1
+        entry = {
+            "id": laminate_id,
+            "n": n,
+            "k": k,
+            "edge_length": laminate.edge_length,
+            "kind": "anti" if isinstance(laminate, AntiLaminate) else "bitset",
+            "source": source,
+            "description": description,
+            "tags": tuple(tags),
+            "metadata": metadata if metadata is not None else {},
+            "score": score,
+            "uses": 0,
+            "last_used": 0,
+            "saved_version": laminate.version,
+        }
+        self._clock += 1
+        entry["last_used"] = self._clock
+        self.entries[laminate_id] = entry
+        self._write(entry, laminate)
+        for key in self._index_keys(entry):
+            bisect.insort(self._ranked.setdefault(key, []), (-score, laminate_id))
+        self._by_source.setdefault((n, k, source), set()).add(laminate_id)
+        self._make_resident(laminate_id, laminate)
+        self._index_dirty = True
+        return laminate_id
 
-    relevant_laminates = []
-    high_score_laminates = []
+    def get(self, laminate_id):
+        """Returns a laminate, loading it from disk if it is not resident."""
+        laminate = self.resident.get(laminate_id)
+        if laminate is None:
+            entry = self.entries[laminate_id]
+            codes = np.load(self._path(laminate_id), mmap_mode="r")
+            if entry["kind"] == "anti":
+                laminate = AntiLaminate(entry["n"], entry["edge_length"], removed=codes.tolist(), source=entry["source"])
+            else:
+                laminate = BitsetLaminate.from_codes(entry["n"], entry["edge_length"], codes, source=entry["source"])
+            laminate.version = laminate.log_start = entry["saved_version"]
+            self._make_resident(laminate_id, laminate)
+        else:
+            self._charge(laminate_id, laminate)  # It may have grown (compiled tables) since it was charged
+        self._touch(laminate_id)
+        return laminate
 
-    # Filter by n and k
-    if (n,k) in all_laminates:
-        for laminate_entry in all_laminates[(n, k)]:
-            if laminate_entry['score'] > 0: #Only use laminates that have passed validation.
-                relevant_laminates.append(laminate_entry)
+    def _charge(self, laminate_id, laminate):
+        """Charges a resident laminate's current size, replacing what it was charged before."""
+        size = _laminate_nbytes(laminate)
+        self.resident_bytes += size - self._charged.get(laminate_id, 0)
+        self._charged[laminate_id] = size
 
-    # Sort by score (descending)
-    relevant_laminates = sorted(relevant_laminates, key=lambda x: x['score'], reverse = True)
+    def _make_resident(self, laminate_id, laminate):
+        self.resident[laminate_id] = laminate
+        self._charge(laminate_id, laminate)
+        self.evict()
 
-    # Select top scoring.
-    selected_laminates = relevant_laminates[:5] #Get 5 for now.
+    def evict(self, keep=()):
+        """Drops resident laminates until the memory budget is met."""
+        while self.resident_bytes > self.memory_budget and len(self.resident) > 1:
+            candidates = [i for i in self.resident if i not in keep]
+            if not candidates:
+                break
+            victim = min(candidates, key=lambda i: (self.entries[i]["uses"] > 1, self.entries[i]["last_used"]))
+            self._unload(victim)
 
-    # Return the *graphs* themselves, not the entire entry
-    return [lam["graph"] for lam in selected_laminates]
+    def _unload(self, laminate_id):
+        laminate = self.resident.pop(laminate_id)
+        entry = self.entries[laminate_id]
+        if laminate.version != entry["saved_version"]:
+            self._write(entry, laminate)  # Write back changes made while resident
+            self._index_dirty = True
+        self.resident_bytes -= self._charged.pop(laminate_id)
+
+    def remove(self, laminate_id):
+        """Removes a laminate from the album and from disk."""
+        entry = self.entries.pop(laminate_id, None)
+        if entry is None:
+            return False
+        if self.resident.pop(laminate_id, None) is not None:
+            self.resident_bytes -= self._charged.pop(laminate_id)
+        for key in self._index_keys(entry):
+            ranked = self._ranked[key]
+            del ranked[bisect.bisect_left(ranked, (-entry["score"], laminate_id))]
+        self._by_source[(entry["n"], entry["k"], entry["source"])].discard(laminate_id)
+        try:
+            os.remove(self._path(laminate_id))
+        except OSError:
+            pass
+        self._index_dirty = True
+        return True
+
+    def update_score(self, laminate_id, score):
+        """Changes a laminate's score and moves it in the rankings."""
+        entry = self.entries[laminate_id]
+        for key in self._index_keys(entry):
+            ranked = self._ranked[key]
+            del ranked[bisect.bisect_left(ranked, (-entry["score"], laminate_id))]
+            bisect.insort(ranked, (-score, laminate_id))
+        entry["score"] = score
+        self._index_dirty = True
+
+    def select_ids(self, n, k, task=None, count=5):
+        """Returns the IDs of the `count` best-scored laminates for (n, k), optionally with a task tag."""
+        key = (n, k) if task is None else (n, k, task)
+        return [laminate_id for _, laminate_id in self._ranked.get(key, [])[:count]]
+
+    def select(self, n, k, task=None, count=5):
+        """Returns the `count` best-scored laminates for (n, k), loading them as needed."""
+        ids = self.select_ids(n, k, task, count)
+        laminates = [self.get(laminate_id) for laminate_id in ids]
+        self.evict(keep=ids)
+        return laminates
+
+    def ids_by_source(self, n, k, source):
+        return sorted(self._by_source.get((n, k, source), ()))
+
+    def list(self, n=None, k=None):
+        """Returns the entry metadata, optionally filtered by n and k."""
+        return [entry for entry in self.entries.values()
+                if (n is None or entry["n"] == n) and (k is None or entry["k"] == k)]
+
+    def flush(self):
+        """Writes back every resident laminate that changed since it was saved, and the index if it changed."""
+        for laminate_id, laminate in self.resident.items():
+            entry = self.entries[laminate_id]
+            if laminate.version != entry["saved_version"]:
+                self._write(entry, laminate)
+                self._index_dirty = True
+        if self._index_dirty:
+            self._save_index()
+
+
+_default_album = None
+
+def get_laminate_album():
+    """Returns the default album used by the functions below, opening it (in the current directory) on first use.
+
+    The album is flushed when the interpreter exits.
+    """
+    global _default_album
+    if _default_album is None:
+        _default_album = LaminateAlbum()
+        atexit.register(_default_album.flush)
+    return _default_album
+
+def __getattr__(name):
+    if name == "laminate_album":  # Old module attribute, now created lazily
+        return get_laminate_album()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def add_laminate_to_album(laminate, n, k, source, description, metadata=None, tags=(), winners=None, losers=None, layout_memory=None, anti_prodigals=()):
+    """Validates a laminate, scores it and adds it to the laminate album.
+
+    Returns:
+        int: The laminate ID, or None if validation failed.
+    """
+    is_valid, error_message, score = validate_laminate(laminate, n, k, "positive", winners or {}, losers or {}, layout_memory or {}, anti_prodigals)
+    if not is_valid:
+        logging.error(f"Failed to add laminate to album: {error_message}") #Log if not valid
+        return None  # Don't add invalid laminates
+    laminate_id = get_laminate_album().add(laminate, n, k, source, description, tags, metadata, score)
+    logging.info(f"Added laminate to album: ID={laminate_id}, Source={source}, n={n}, k={k}")
+    return laminate_id
+
+def select_laminates(n, k, task, context, all_laminates=None, num_to_select=5):
+    """Selects the best-scored laminates for (n, k) and a task.
+
+    `all_laminates` is a LaminateAlbum (the default album if None), or a dict
+    {(n, k): [{"score": ..., "graph": ...}]} as older callers pass it. With an
+    album, tasks are matched against the tags given when laminates were added;
+    a task with no tagged laminates falls back to the best laminates for
+    (n, k). A dict has no tags, so its best validated (score > 0) graphs for
+    (n, k) are returned.
+    """
+    if isinstance(all_laminates, dict):
+        entries = sorted((entry for entry in all_laminates.get((n, k), []) if entry["score"] > 0),
+                         key=lambda entry: entry["score"], reverse=True)
+        return [entry["graph"] for entry in entries[:num_to_select]]
+    album = all_laminates if all_laminates is not None else get_laminate_album()
+    if album.select_ids(n, k, task, 1):
+        return album.select(n, k, task, num_to_select)
+    return album.select(n, k, None, num_to_select)
 
 def remove_laminate_from_album(laminate_id):
     """Removes a laminate from the album by ID."""
-    global laminate_album
-    for key in list(laminate_album.keys()):  # Iterate over a copy of keys
-        laminates_list = laminate_album[key]
-        for laminate in laminates_list:
-            if laminate["id"] == laminate_id:
-                laminates_list.remove(laminate)
-                logging.info(f"Removed laminate with ID {laminate_id} from album.")
-                return
-        if not laminates_list:  # If the list is empty after removal, delete the key
-          del laminate_album[key]
+    if get_laminate_album().remove(laminate_id):
+        logging.info(f"Removed laminate with ID {laminate_id} from album.")
 
 def list_laminates():
     """Lists the available laminates in the album, with their metadata."""
-    #This would be added to data_manager, to make it more organized.
+    laminate_album = get_laminate_album()
     print("Current Laminates in Album:")
-    for key, lam_list in laminate_album.items(): #Iterate through dict
-        print(f"  n={key[0]}, k={key[1]}:")
-        for laminate in lam_list: #Iterate through list
-            print(f"    ID: {laminate['id']}")
-            print(f"    Source: {laminate['source']}")
-            print(f"    Description: {laminate['description']}")
-            print(f"    Score: {laminate['score']}")
-            if laminate['metadata']:
-                print(f"    Metadata: {laminate['metadata']}")
-            print("-" * 20)
\ No newline at end of file
+    for entry in sorted(laminate_album.list(), key=lambda e: (e["n"], e["k"], e["id"])):
+        print(f"  n={entry['n']}, k={entry['k']}:")
+        print(f"    ID: {entry['id']}")
+        print(f"    Source: {entry['source']}")
+        print(f"    Description: {entry['description']}")
+        print(f"    Score: {entry['score']}")
+        print(f"    Uses: {entry['uses']}, Resident: {entry['id'] in laminate_album.resident}")
+        if entry['metadata']:
+            print(f"    Metadata: {entry['metadata']}")
+        print("-" * 20)
\ No newline at end of file
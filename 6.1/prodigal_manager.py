@@ -1,26 +1,590 @@
 # prodigal_manager.py
+import bisect
+import concurrent.futures
+import copy
 import json
 import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
 # Assuming analysis_scripts_final and utils are in the same directory
 from analysis_scripts_final import calculate_winners_losers, identify_anti_prodigals, is_prodigal, calculate_sequence_score, find_prodigal_results,  calculate_extensibility_score, analyze_prodigal, extend_prodigal
-from utils import is_valid_permutation, calculate_overlap, hash_permutation, unhash_permutation
+from utils import is_valid_permutation, calculate_overlap, hash_permutation, unhash_permutation, compute_checksum
+
+# Weights of the ranking score; each prodigal's score is the weighted sum of its features
+DEFAULT_RANKING_WEIGHTS = {
+    "length": 1.0,
+    "overlap_rate": 100.0,
+    "winner_score": 1.0,
+    "loser_score": -1.0,
+    "breakpoints": -10.0,  # Fewer breakpoints are better.
+    "extensibility_score": 5.0,
+}
+
+def ranking_features(p_data):
+    """Returns a prodigal's ranking features, keyed like DEFAULT_RANKING_WEIGHTS."""
+    return {
+        "length": p_data["length"],
+        "overlap_rate": p_data["overlap_rate"],
+        "winner_score": p_data["winner_score"],
+        "loser_score": p_data["loser_score"],
+        "breakpoints": len(p_data["breakpoints"]),
+        "extensibility_score": p_data["extensibility_score"],
+    }
+
+def sequence_minimizers(sequence, k, window):
+    """Returns the minimizer fingerprints of a digit sequence (a set of ints).
+
+    Every `window` consecutive k-mers contribute the one with the smallest
+    (mixed) hash. Any substring at least k + window - 1 long shares all of its
+    own minimizers with the sequences containing it, which is what the
+    containment index relies on.
+    """
+    if len(sequence) < k + window - 1:
+        return set()
+    digits = np.frombuffer(sequence.encode(), dtype=np.uint8).astype(np.uint64) - np.uint64(48)
+    powers = np.uint64(10) ** np.arange(k - 1, -1, -1, dtype=np.uint64)
+    codes = np.lib.stride_tricks.sliding_window_view(digits, k) @ powers
+    hashes = codes * np.uint64(0x9E3779B97F4A7C15)  # Mix, so minimizers are not just the lexicographically smallest k-mers
+    hashes ^= hashes >> np.uint64(29)
+    positions = np.lib.stride_tricks.sliding_window_view(hashes, window).argmin(axis=1) + np.arange(len(hashes) - window + 1)
+    return set(hashes[np.unique(positions)].tolist())
+
+
+def _signed64(value):
+    """Maps an unsigned 64-bit minimizer into SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+# SQLite column holding each ranking feature
+_FEATURE_COLUMNS = {
+    "length": "length",
+    "overlap_rate": "overlap_rate",
+    "winner_score": "winner_score",
+    "loser_score": "loser_score",
+    "breakpoints": "num_breakpoints",
+    "extensibility_score": "extensibility_score",
+}
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prodigals (
+    id INTEGER PRIMARY KEY,
+    sequence TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    overlap_rate REAL NOT NULL,
+    n_value INTEGER NOT NULL,
+    source TEXT,
+    winner_score REAL NOT NULL,
+    loser_score REAL NOT NULL,
+    extensibility_score REAL NOT NULL,
+    num_breakpoints INTEGER NOT NULL,
+    parent_prodigals TEXT NOT NULL,
+    child_prodigals TEXT NOT NULL,
+    used_count INTEGER NOT NULL,
+    rank_score REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_prodigals_checksum ON prodigals (checksum);
+CREATE INDEX IF NOT EXISTS idx_prodigals_n_length ON prodigals (n_value, length);
+CREATE INDEX IF NOT EXISTS idx_prodigals_n_overlap ON prodigals (n_value, overlap_rate);
+CREATE INDEX IF NOT EXISTS idx_prodigals_n_rank ON prodigals (n_value, rank_score DESC, id DESC);
+CREATE TABLE IF NOT EXISTS breakpoints (
+    prodigal_id INTEGER NOT NULL REFERENCES prodigals (id) ON DELETE CASCADE,
+    position INTEGER,
+    reason TEXT,
+    n_values TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_breakpoints_prodigal ON breakpoints (prodigal_id);
+CREATE TABLE IF NOT EXISTS minimizers (
+    minimizer INTEGER NOT NULL,
+    prodigal_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_minimizers_minimizer ON minimizers (minimizer);
+CREATE INDEX IF NOT EXISTS idx_minimizers_prodigal ON minimizers (prodigal_id);
+"""
+
+
+class SQLiteProdigalStore:
+    """Prodigal storage in a local SQLite database.
+
+    Behaves like the {prodigal_id: {data}} dict ProdigalManager keeps for the
+    JSON backend (get/[]/in/len/items), but rows are read on demand and
+    iteration streams from a cursor, so memory does not grow with the
+    library. Breakpoints live in a child table, and the duplicate,
+    containment and ranking indexes are SQL indexes. Writes are grouped into
+    transactions of `batch_size` and committed by commit().
+    """
+
+    _COLUMNS = ("id", "sequence", "length", "overlap_rate", "n_value", "source", "winner_score", "loser_score",
+                "extensibility_score", "parent_prodigals", "child_prodigals", "used_count")
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0  # Writes since the last commit
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SQLITE_SCHEMA)
+
+    def _wrote(self, count=1):
+        self.pending += count
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def _row_to_prodigal(self, row):
+        p_data = dict(zip(self._COLUMNS, row))
+        p_data["parent_prodigals"] = json.loads(p_data["parent_prodigals"])
+        p_data["child_prodigals"] = json.loads(p_data["child_prodigals"])
+        p_data["breakpoints"] = [{"position": position, "reason": reason, "n_values": json.loads(n_values)}
+                                 for position, reason, n_values in self.conn.execute(
+                                     "SELECT position, reason, n_values FROM breakpoints WHERE prodigal_id = ? ORDER BY rowid",
+                                     (p_data["id"],))]
+        return p_data
+
+    def _select(self, where="", params=(), order="", limit=None):
+        """Streams prodigals matching a WHERE clause, one row at a time."""
+        sql = f"SELECT {', '.join(self._COLUMNS)} FROM prodigals {where} {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        for row in self.conn.execute(sql, params):
+            yield self._row_to_prodigal(row)
+
+    # --- dict interface ---
+
+    def get(self, prodigal_id, default=None):
+        return next(self._select("WHERE id = ?", (prodigal_id,)), default)
+
+    def __getitem__(self, prodigal_id):
+        p_data = self.get(prodigal_id)
+        if p_data is None:
+            raise KeyError(prodigal_id)
+        return p_data
+
+    def __contains__(self, prodigal_id):
+        return self.conn.execute("SELECT 1 FROM prodigals WHERE id = ?", (prodigal_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM prodigals").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT id FROM prodigals ORDER BY id"))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((p_data["id"], p_data) for p_data in self._select(order="ORDER BY id"))
+
+    def values(self):
+        return self._select(order="ORDER BY id")
+
+    def __setitem__(self, prodigal_id, p_data):
+        """Inserts or replaces a prodigal (its rank score is kept; see set_rank_score)."""
+        self.put_many([(prodigal_id, p_data)])
+
+    def put_many(self, items):
+        """Inserts or replaces many prodigals with executemany, in the current transaction."""
+        items = list(items)
+        rows = [(prodigal_id, p_data["sequence"], compute_checksum(p_data["sequence"]), p_data["length"],
+                 p_data["overlap_rate"], p_data["n_value"], p_data["source"], p_data["winner_score"],
+                 p_data["loser_score"], p_data["extensibility_score"], len(p_data["breakpoints"]),
+                 json.dumps(p_data["parent_prodigals"]), json.dumps(p_data["child_prodigals"]), p_data["used_count"],
+                 prodigal_id)
+                for prodigal_id, p_data in items]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO prodigals (id, sequence, checksum, length, overlap_rate, n_value, source, winner_score, "
+            "loser_score, extensibility_score, num_breakpoints, parent_prodigals, child_prodigals, used_count, rank_score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT rank_score FROM prodigals WHERE id = ?), 0))",
+            rows)
+        self.conn.executemany("DELETE FROM breakpoints WHERE prodigal_id = ?", [(prodigal_id,) for prodigal_id, _ in items])
+        self.conn.executemany("INSERT INTO breakpoints (prodigal_id, position, reason, n_values) VALUES (?, ?, ?, ?)",
+                              [(prodigal_id, bp.get("position"), bp.get("reason"), json.dumps(bp.get("n_values")))
+                               for prodigal_id, p_data in items for bp in p_data["breakpoints"]])
+        self._wrote(len(items))
+
+    def max_id(self):
+        return self.conn.execute("SELECT MAX(id) FROM prodigals").fetchone()[0]
+
+    # --- Indexes ---
+
+    def find_checksum(self, checksum):
+        row = self.conn.execute("SELECT id FROM prodigals WHERE checksum = ? LIMIT 1", (checksum,)).fetchone()
+        return row[0] if row else None
+
+    def find_substring(self, sequence):
+        """ID of the first prodigal containing `sequence` (a full scan, for sequences too short to fingerprint)."""
+        row = self.conn.execute("SELECT id FROM prodigals WHERE instr(sequence, ?) > 0 ORDER BY id LIMIT 1", (sequence,)).fetchone()
+        return row[0] if row else None
+
+    def index_minimizers(self, prodigal_id, minimizers):
+        self.conn.executemany("INSERT INTO minimizers (minimizer, prodigal_id) VALUES (?, ?)",
+                              [(_signed64(m), prodigal_id) for m in minimizers])
+
+    def unindex_minimizers(self, prodigal_id):
+        self.conn.execute("DELETE FROM minimizers WHERE prodigal_id = ?", (prodigal_id,))
+
+    def rarest_minimizer_ids(self, minimizers):
+        """IDs of the prodigals sharing the least common of `minimizers`."""
+        signed = list({_signed64(m) for m in minimizers})
+        counts = []
+        for start in range(0, len(signed), 500):  # Stay under SQLite's bound-parameter limit
+            chunk = signed[start:start + 500]
+            counts += self.conn.execute(f"SELECT minimizer, COUNT(*) FROM minimizers WHERE minimizer IN ({', '.join('?' * len(chunk))}) "
+                                        "GROUP BY minimizer", chunk).fetchall()
+        if len(counts) < len(signed):
+            return []  # Some minimizer is in no prodigal, so none contains the sequence
+        rarest = min(counts, key=lambda row: row[1])[0]
+        return [row[0] for row in self.conn.execute("SELECT prodigal_id FROM minimizers WHERE minimizer = ?", (rarest,))]
+
+    def set_rank_score(self, prodigal_id, score):
+        self.conn.execute("UPDATE prodigals SET rank_score = ? WHERE id = ?", (score, prodigal_id))
+
+    def rescore(self, weights):
+        """Recomputes every rank score in one UPDATE."""
+        expression = " + ".join(f"? * {_FEATURE_COLUMNS[name]}" for name in weights)
+        self.conn.execute(f"UPDATE prodigals SET rank_score = {expression}", tuple(weights.values()))
+        self.commit()
+
+    def query(self, n=None, min_length=None, min_overlap_rate=None, order_by="rank_score", limit=None):
+        """Streams prodigals through the indexes, best first by `order_by`
+        ("rank_score", "length" or "overlap_rate")."""
+        if order_by not in ("rank_score", "length", "overlap_rate"):
+            raise ValueError(f"Cannot order prodigals by {order_by}.")
+        clauses, params = [], []
+        for clause, value in (("n_value = ?", n), ("length >= ?", min_length), ("overlap_rate >= ?", min_overlap_rate)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._select(where, tuple(params), f"ORDER BY {order_by} DESC, id DESC", limit)
+
+
+_SHARED_MAGIC = 0x50524F44  # "PROD"
+_SHARED_VERSION = 1
+_SHARED_INT_COLUMNS = ("id", "seq_offset", "length", "meta_offset", "meta_length", "n_value", "used_count", "rank_order")
+_SHARED_FLOAT_COLUMNS = ("overlap_rate", "winner_score", "loser_score", "extensibility_score", "rank_score")
+
+
+class SharedProdigalLibrary:
+    """Read-only view of a prodigal library exported into shared memory.
+
+    The arena holds a small header, one int64/float64 column per field
+    (rows sorted by prodigal ID), `rank_order` (row indices sorted by n, then
+    rank), every sequence concatenated into one uint8 buffer, and the
+    variable-length fields (source, breakpoints, parent/child links) as JSON
+    in a second buffer. Attaching maps the block and wraps NumPy views
+    around it, so it costs O(1) regardless of library size. Records are
+    decoded only when asked for. Rank scores are those at export time.
+    """
+
+    _HEADER = 5  # magic, version, prodigals, sequence bytes, meta bytes
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        header = np.ndarray(self._HEADER, dtype=np.int64, buffer=shm.buf)
+        if header[0] != _SHARED_MAGIC or header[1] != _SHARED_VERSION:
+            raise ValueError(f"Shared memory block {shm.name} is not a prodigal library.")
+        count, seq_bytes, meta_bytes = (int(x) for x in header[2:5])
+        offset = self._HEADER * 8
+        self.columns = {}
+        for column in _SHARED_INT_COLUMNS + _SHARED_FLOAT_COLUMNS:
+            dtype = np.int64 if column in _SHARED_INT_COLUMNS else np.float64
+            self.columns[column] = np.ndarray(count, dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += count * 8
+        self.sequences = np.ndarray(seq_bytes, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        self.meta = np.ndarray(meta_bytes, dtype=np.uint8, buffer=shm.buf, offset=offset + seq_bytes)
+        self._ranked_n = self.columns["n_value"][self.columns["rank_order"]]  # Sorted: rows of each n are contiguous
+
+    @classmethod
+    def create(cls, prodigals, rank_score, name=None):
+        """Exports an {id: record} mapping; `rank_score(record)` gives each record's score."""
+        records = sorted(prodigals.items())
+        sequences = [p_data["sequence"].encode() for _, p_data in records]
+        metas = [json.dumps({key: p_data[key] for key in ("source", "breakpoints", "parent_prodigals", "child_prodigals")}).encode()
+                 for _, p_data in records]
+        count, seq_bytes, meta_bytes = len(records), sum(map(len, sequences)), sum(map(len, metas))
+        size = cls._HEADER * 8 + count * 8 * (len(_SHARED_INT_COLUMNS) + len(_SHARED_FLOAT_COLUMNS)) + seq_bytes + meta_bytes
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        np.ndarray(cls._HEADER, dtype=np.int64, buffer=shm.buf)[:] = (_SHARED_MAGIC, _SHARED_VERSION, count, seq_bytes, meta_bytes)
+        library = cls(shm, owner=True)
+        columns = library.columns
+        columns["id"][:] = [pid for pid, _ in records]
+        columns["length"][:] = [len(seq) for seq in sequences]
+        columns["seq_offset"][:] = np.cumsum(columns["length"]) - columns["length"]
+        columns["meta_length"][:] = [len(meta) for meta in metas]
+        columns["meta_offset"][:] = np.cumsum(columns["meta_length"]) - columns["meta_length"]
+        for column in ("n_value", "used_count"):
+            columns[column][:] = [p_data[column] for _, p_data in records]
+        for column in ("overlap_rate", "winner_score", "loser_score", "extensibility_score"):
+            columns[column][:] = [p_data[column] for _, p_data in records]
+        columns["rank_score"][:] = [rank_score(p_data) for _, p_data in records]
+        # Same order as the manager's rankings: by n, then score desc, then ID desc
+        columns["rank_order"][:] = np.lexsort((-columns["id"], -columns["rank_score"], columns["n_value"]))
+        library.sequences[:] = np.frombuffer(b"".join(sequences), dtype=np.uint8)
+        library.meta[:] = np.frombuffer(b"".join(metas), dtype=np.uint8)
+        library._ranked_n = columns["n_value"][columns["rank_order"]]
+        return library
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to an exported library by name (in a worker process)."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            # Older Pythons register every attach; left registered, this process's resource
+            # tracker would unlink the exporter's live block when the process exits.
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def _record(self, row):
+        columns = self.columns
+        start, length = int(columns["seq_offset"][row]), int(columns["length"][row])
+        meta_start = int(columns["meta_offset"][row])
+        meta = json.loads(self.meta[meta_start:meta_start + int(columns["meta_length"][row])].tobytes())
+        return {
+            "sequence": self.sequences[start:start + length].tobytes().decode(),
+            "length": length,
+            "overlap_rate": float(columns["overlap_rate"][row]),
+            "n_value": int(columns["n_value"][row]),
+            "source": meta["source"],
+            "breakpoints": meta["breakpoints"],
+            "winner_score": float(columns["winner_score"][row]),
+            "loser_score": float(columns["loser_score"][row]),
+            "extensibility_score": float(columns["extensibility_score"][row]),
+            "parent_prodigals": meta["parent_prodigals"],
+            "child_prodigals": meta["child_prodigals"],
+            "used_count": int(columns["used_count"][row]),
+            "id": int(columns["id"][row]),
+        }
+
+    def get_prodigal_by_id(self, prodigal_id):
+        """Retrieves a prodigal by its ID (binary search), or None."""
+        ids = self.columns["id"]
+        row = int(np.searchsorted(ids, prodigal_id))
+        if row < len(ids) and ids[row] == prodigal_id:
+            return self._record(row)
+        return None
+
+    def iter_best_prodigals(self, n, count=None):
+        start, end = np.searchsorted(self._ranked_n, [n, n + 1])
+        if count is not None:
+            end = min(end, start + count)
+        for row in self.columns["rank_order"][start:end]:
+            yield self._record(int(row))
+
+    def get_best_prodigals(self, n, task, context, count=None):
+        """Same as ProdigalManager.get_best_prodigals, from the exported rankings."""
+        return {p_data["id"]: p_data for p_data in self.iter_best_prodigals(n, count)}
+
+    def close(self):
+        """Detaches; the exporting process also frees the block."""
+        self.columns, self.sequences, self.meta, self._ranked_n = {}, None, None, None  # Drop views before closing
+        self.shm.close()
+        if self.owner:
+            self.unlink()
+
+    def unlink(self):
+        """Removes the block's name; readers still attached keep their mapping. Tolerates a name already gone."""
+        self.owner = False
+        # A reader sharing our resource tracker (a forked worker) unregistered the name when it
+        # attached; register it again so unlink's own unregister finds it.
+        resource_tracker.register(self.shm._name, "shared_memory")
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+
+_worker_data = None  # [winners, losers, layout_memory, laminates, anti_laminates]
+_worker_data_paths = []  # Snapshot and patch files already applied to _worker_data
+_MAX_POOL_PATCHES = 32  # Patches after which add_prodigals publishes a new snapshot instead
+
+def _load_worker_data(paths):
+    """Brings a pool worker's shared data up to date: reloads the snapshot (paths[0]) if it is new,
+    then applies only the patches it has not applied yet."""
+    global _worker_data, _worker_data_paths
+    if not _worker_data_paths or _worker_data_paths[0] != paths[0]:
+        with open(paths[0], "rb") as f:
+            _worker_data = pickle.load(f)
+        _worker_data_paths = [paths[0]]
+    for path in paths[len(_worker_data_paths):]:
+        with open(path, "rb") as f:
+            _apply_data_patch(_worker_data, pickle.load(f))
+        _worker_data_paths.append(path)
+
+def _published_copy(data):
+    """The workers' view of `data` right after a snapshot, for diffing later publishes against."""
+    winners, losers, layout_memory, laminates, anti_laminates = data
+    layout_copy = copy.deepcopy(dict(layout_memory)) if isinstance(layout_memory, dict) else layout_memory
+    return [dict(winners), dict(losers), layout_copy,
+            [(lam, getattr(lam, "version", None)) for lam in laminates],
+            [(lam, getattr(lam, "version", None)) for lam in anti_laminates]]
+
+def _dict_patch(current, published, deep=False):
+    """Returns (changed items, removed keys) of `current` against `published`, and updates `published`."""
+    changed = {key: value for key, value in current.items() if key not in published or published[key] != value}
+    removed = [key for key in published if key not in current]
+    published.update(copy.deepcopy(changed) if deep else changed)
+    for key in removed:
+        del published[key]
+    return changed, removed
+
+def _laminate_patch(current, published):
+    """Returns (length, [(index, "deltas" or "full", payload)]) for the laminates that changed, and updates `published`.
+
+    A laminate the workers already hold at an older version is sent as its
+    delta log entries since then; anything else (a new object, a trimmed log,
+    a networkx graph, which has no version) is sent whole.
+    """
+    entries = []
+    for i, lam in enumerate(current):
+        version = getattr(lam, "version", None)
+        old_lam, old_version = published[i] if i < len(published) else (None, None)
+        if old_lam is lam and version is not None:
+            if version == old_version:
+                continue
+            try:
+                entries.append((i, "deltas", lam.deltas_since(old_version)))
+                continue
+            except ValueError:  # Trimmed past what the workers have
+                pass
+        entries.append((i, "full", lam))
+    published[:] = [(lam, getattr(lam, "version", None)) for lam in current]
+    return len(current), entries
+
+def _data_patch(data, published):
+    """Returns the patch taking the workers from `published` to `data` (None if nothing changed)."""
+    winners, losers, layout_memory, laminates, anti_laminates = data
+    old_lengths = (len(published[3]), len(published[4]))
+    if isinstance(layout_memory, dict) and isinstance(published[2], dict):
+        layout_patch = ("delta",) + _dict_patch(layout_memory, published[2], deep=True)
+    elif layout_memory is None and published[2] is None:
+        layout_patch = ("delta", {}, [])
+    else:
+        layout_patch = ("full", layout_memory)  # Can't diff it, so send it every time
+        published[2] = copy.deepcopy(dict(layout_memory)) if isinstance(layout_memory, dict) else layout_memory
+    patch = [_dict_patch(winners, published[0]), _dict_patch(losers, published[1]), layout_patch,
+             _laminate_patch(laminates, published[3]), _laminate_patch(anti_laminates, published[4])]
+    changed = (any(patch[0]) or any(patch[1]) or layout_patch[0] == "full" or any(layout_patch[1:])
+               or any(entries or length != old for (length, entries), old in zip(patch[3:], old_lengths)))
+    return patch if changed else None
+
+def _apply_data_patch(data, patch):
+    """Applies a _data_patch to a worker's data (in place)."""
+    for target, (changed, removed) in zip(data[:2], patch[:2]):
+        target.update(changed)
+        for key in removed:
+            target.pop(key, None)
+    if patch[2][0] == "delta":
+        _, changed, removed = patch[2]
+        data[2].update(changed)
+        for key in removed:
+            data[2].pop(key, None)
+    else:
+        data[2] = patch[2][1]
+    for laminates, (length, entries) in zip(data[3:], patch[3:]):
+        del laminates[length:]
+        for i, kind, payload in entries:
+            if kind == "deltas":
+                laminates[i].apply_deltas(payload)
+            elif i < len(laminates):
+                laminates[i] = payload
+            else:
+                laminates.append(payload)
+
+def _extend_and_analyze(sequence, n_value, data):
+    """Steps 1-2 of add_prodigal; `data` is (winners, losers, layout_memory, laminates, anti_laminates)."""
+    extended_sequence, _ = extend_prodigal(sequence, n_value, *data)
+    return extended_sequence, analyze_prodigal(extended_sequence, n_value, *data)
+
+def _extend_and_analyze_worker(task):
+    """Extends and analyzes one sequence in a worker process."""
+    sequence, n_value, data_paths = task
+    _load_worker_data(data_paths)
+    return _extend_and_analyze(sequence, n_value, _worker_data)
 
 
 class ProdigalManager:
     """Manages the collection, storage, analysis, and ranking of prodigal results."""
 
-    def __init__(self, n, prodigal_file="prodigal_results.json"):
+    def __init__(self, n, prodigal_file="prodigal_results.json", contained_policy="link", ranking_weights=None, backend="json",
+                 journal=False, journal_sync_every=100, journal_compact_every=10000):
         """Initializes the ProdigalManager.
 
         Args:
             n (int): The value of n for this ProdigalManager.
             prodigal_file (str): The filename for storing prodigal data.
+            contained_policy (str): What add_prodigal does with a sequence fully contained
+                in an existing prodigal: "link" it as that prodigal's child (the default; it
+                is still added), or "skip" it.
+            ranking_weights (dict): Overrides for DEFAULT_RANKING_WEIGHTS.
+            backend (str): "json" keeps every prodigal in memory and rewrites prodigal_file on
+                save; "sqlite" keeps them in a SQLite database next to it (prodigal_file with
+                a .sqlite extension), importing an existing JSON file on first use.
+            journal (bool): JSON backend only. Append every add/update to a JSONL journal
+                (replayed by load_prodigals) instead of relying on save_prodigals rewrites.
+            journal_sync_every (int): Journal entries per fsync.
+            journal_compact_every (int): Journal entries after which save_prodigals writes a
+                new snapshot in the background.
         """
         self.n = n
         self.prodigal_file = prodigal_file
+        self.contained_policy = contained_policy
         self.prodigal_results = {}  # {prodigal_id: {data}}
         self.next_prodigal_id = 0
+        # Duplicate/containment indexes (fingerprints: k-mers of 2n symbols, one minimizer per n k-mers)
+        self.fingerprint_k = min(2 * n, 19)
+        self.fingerprint_window = max(n, 1)
+        self.hash_index = {}  # {sequence checksum: prodigal_id}
+        self.fingerprint_index = {}  # {minimizer: [prodigal_ids]}
+        # Rankings, kept sorted as prodigals are added/updated
+        self.ranking_weights = dict(DEFAULT_RANKING_WEIGHTS, **(ranking_weights or {}))
+        self.rankings = {}  # {n_value: sorted [(-score, -prodigal_id)]}
+        self.rank_scores = {}  # {prodigal_id: score}
+        self.backend = backend
+        self.store = None
+        if backend == "sqlite":
+            self.store = SQLiteProdigalStore(os.path.splitext(prodigal_file)[0] + ".sqlite")
+        elif backend != "json":
+            raise ValueError(f"Unknown prodigal backend: {backend}")
+        self.journal = journal and self.store is None  # SQLite commits are already transactional
+        self.journal_sync_every = journal_sync_every
+        self.journal_compact_every = journal_compact_every
+        self.journal_entries = 0  # Entries since the last snapshot
+        self._journal_file = None
+        self._journal_unsynced = 0
+        self._compaction_thread = None
+        # Worker pool for add_prodigals, started on first use and kept until close()
+        self._pool = None
+        self._pool_workers = 0
+        self._pool_data_paths = []  # Snapshot, then the patches published since
+        self._pool_published = None  # What the workers will hold after applying them
         self.load_prodigals() # Load any saved
+        if self.journal:
+            self._journal_file = open(self._journal_paths()[0], "a")
 
 
     def add_prodigal(self, sequence, n_value, source, winners={}, losers={}, layout_memory=None, laminates=[], anti_laminates=[]):
@@ -39,15 +603,89 @@ class ProdigalManager:
         # 2. Analyze the prodigal
         prodigal_data = analyze_prodigal(extended_sequence, n_value, winners, losers, layout_memory, laminates, anti_laminates)
 
+        self._commit_prodigal(extended_sequence, prodigal_data, n_value, source)
+
+    def add_prodigals(self, sequences, n_value, source, winners={}, losers={}, layout_memory=None, laminates=[], anti_laminates=[],
+                      workers=1, chunksize=8):
+        """Adds many prodigals, extending and analyzing them in a process pool.
+
+        The pool is started on first use and reused by later calls until
+        close(). The read-only data (winners, losers, layout_memory,
+        laminates, anti_laminates) goes to the workers as a pickled snapshot
+        file, followed by small patch files holding only what changed since
+        the previous call (changed winner/loser/layout entries, laminate delta
+        logs), and each worker applies only the files it has not seen.
+        Duplicate checks and ID assignment run
+        serially here, in input order, so the result is the same as calling
+        add_prodigal in a loop.
+
+        Returns:
+            list: IDs of the prodigals that were added.
+        """
+        sequences = list(sequences)
+        data = (winners, losers, layout_memory, laminates, anti_laminates)
+        if workers > 1 and len(sequences) > 1:
+            pool = self._worker_pool(workers, data)
+            tasks = [(sequence, n_value, tuple(self._pool_data_paths)) for sequence in sequences]
+            results = list(pool.map(_extend_and_analyze_worker, tasks, chunksize=chunksize))
+        else:
+            results = [_extend_and_analyze(sequence, n_value, data) for sequence in sequences]
+        added = []
+        for extended_sequence, prodigal_data in results:
+            prodigal_id = self._commit_prodigal(extended_sequence, prodigal_data, n_value, source)
+            if prodigal_id is not None:
+                added.append(prodigal_id)
+        return added
+
+    def _worker_pool(self, workers, data):
+        """Returns the persistent worker pool, publishing `data` to it if it changed."""
+        if self._pool is None or self._pool_workers != workers:
+            self.shutdown_pool()
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            self._pool_workers = workers
+        if self._pool_published is not None and len(self._pool_data_paths) <= _MAX_POOL_PATCHES:
+            data_patch = _data_patch(data, self._pool_published)
+            if data_patch is not None:
+                self._pool_data_paths.append(self._write_pool_data(data_patch))
+            return self._pool
+        self._remove_pool_data()  # No task still needs it: pool.map has returned
+        self._pool_data_paths = [self._write_pool_data([data[0], data[1], data[2], list(data[3]), list(data[4])])]
+        self._pool_published = _published_copy(data)
+        return self._pool
+
+    def _write_pool_data(self, payload):
+        """Pickles a snapshot or patch to a new temporary file and returns its path."""
+        fd, path = tempfile.mkstemp(prefix=f"prodigal_worker_data_{os.getpid()}_", suffix=".pkl")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def _remove_pool_data(self):
+        for path in self._pool_data_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._pool_data_paths, self._pool_published = [], None
+
+    def shutdown_pool(self):
+        """Stops the add_prodigals worker pool (a later call starts a new one)."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool, self._pool_workers = None, 0
+        self._remove_pool_data()
+
+    def _commit_prodigal(self, extended_sequence, prodigal_data, n_value, source):
+        """Steps 3-5 of add_prodigal; returns the new prodigal's ID, or None if it was not added."""
         # 3. Check if it's actually a prodigal (might not be, after extension)
         if prodigal_data["is_prodigal"]:
 
-            # 4. Check if it's a duplicate (using sequence hash)
-            is_new = True
-            for existing_prodigal_id, existing_prodigal in self.prodigal_results.items():
-                if extended_sequence == existing_prodigal['sequence']:
-                    is_new = False
-                    break
+            # 4. Check if it's a duplicate (using sequence hash) or already inside a known prodigal
+            is_new = self.find_duplicate(extended_sequence) is None
+            container_id = self.find_container(extended_sequence) if is_new else None
+            if container_id is not None and self.contained_policy == "skip":
+                logging.debug(f"Skipped prodigal contained in prodigal {container_id}.")
+                return None
 
             if is_new:
                 # 5. Add to the database
@@ -62,111 +700,596 @@ class ProdigalManager:
                     "winner_score": prodigal_data["winner_score"],
                     "loser_score": prodigal_data["loser_score"],
                     "extensibility_score": prodigal_data["extensibility_score"],
-                    "parent_prodigals": [],  # To be filled in if created by combining prodigals
+                    "parent_prodigals": [container_id] if container_id is not None else [],  # To be filled in if created by combining prodigals
                     "child_prodigals": [], # Or if this is used to make another.
                     "used_count": 0,
                     "id" : prodigal_id
                 }
                 self.next_prodigal_id += 1
+                self._index_prodigal(prodigal_id)
+                self._rank_prodigal(prodigal_id)
+                self._journal_append("add", prodigal_id)
+                if container_id is not None:
+                    container = self.prodigal_results[container_id]
+                    container["child_prodigals"].append(prodigal_id)
+                    self.prodigal_results[container_id] = container  # Write back (the SQLite store hands out copies)
+                    self._journal_append("update", container_id)
                 logging.info(f"Added new prodigal (ID: {prodigal_id}, Length: {len(extended_sequence)} , Source: {source})")
+                return prodigal_id
             else:
                 logging.debug("Skipped adding duplicate prodigal.")
         else:
             logging.debug("Sequence not prodigal after extension.")
+        return None
+
+
+    # --- Duplicate and containment indexes ---
+
+    def _index_prodigal(self, prodigal_id):
+        sequence = self.prodigal_results[prodigal_id]["sequence"]
+        minimizers = sequence_minimizers(sequence, self.fingerprint_k, self.fingerprint_window)
+        if self.store is not None:
+            self.store.index_minimizers(prodigal_id, minimizers)  # The checksum is a column of the prodigal row
+            return
+        self.hash_index[compute_checksum(sequence)] = prodigal_id
+        for minimizer in minimizers:
+            self.fingerprint_index.setdefault(minimizer, []).append(prodigal_id)
+
+    def _unindex_prodigal(self, prodigal_id):
+        if self.store is not None:
+            self.store.unindex_minimizers(prodigal_id)
+            return
+        sequence = self.prodigal_results[prodigal_id]["sequence"]
+        if self.hash_index.get(compute_checksum(sequence)) == prodigal_id:
+            del self.hash_index[compute_checksum(sequence)]
+        for minimizer in sequence_minimizers(sequence, self.fingerprint_k, self.fingerprint_window):
+            ids = self.fingerprint_index.get(minimizer, [])
+            if prodigal_id in ids:
+                ids.remove(prodigal_id)
+                if not ids:
+                    del self.fingerprint_index[minimizer]
+
+    def rebuild_indexes(self):
+        """Rebuilds the hash and fingerprint indexes from prodigal_results."""
+        if self.store is not None:
+            self.store.conn.execute("DELETE FROM minimizers")
+            for prodigal_id, p_data in self.store.items():
+                self.store.index_minimizers(prodigal_id, sequence_minimizers(p_data["sequence"], self.fingerprint_k, self.fingerprint_window))
+            self.store.commit()
+            return
+        self.hash_index = {}
+        self.fingerprint_index = {}
+        for prodigal_id in self.prodigal_results:
+            self._index_prodigal(prodigal_id)
+
+    def find_duplicate(self, sequence):
+        """Returns the ID of a stored prodigal with exactly this sequence, or None (one hash)."""
+        if self.store is not None:
+            return self.store.find_checksum(compute_checksum(sequence))
+        return self.hash_index.get(compute_checksum(sequence))
+
+    def find_container(self, sequence):
+        """Returns the ID of a stored prodigal that contains `sequence` as a substring, or None.
+
+        Only prodigals sharing the sequence's rarest minimizer are checked with a
+        substring search. Sequences shorter than one fingerprint window
+        (2n + n - 1 symbols) are too short to fingerprint, so every prodigal is
+        scanned for them instead.
+        """
+        minimizers = sequence_minimizers(sequence, self.fingerprint_k, self.fingerprint_window)
+        if not minimizers:
+            if self.store is not None:
+                return self.store.find_substring(sequence)
+            return next((prodigal_id for prodigal_id, p_data in self.prodigal_results.items() if sequence in p_data["sequence"]), None)
+        if self.store is not None:
+            candidates = self.store.rarest_minimizer_ids(minimizers)
+        else:
+            candidates = min((self.fingerprint_index.get(m, []) for m in minimizers), key=len)
+        for prodigal_id in candidates:
+            if sequence in self.prodigal_results[prodigal_id]["sequence"]:
+                return prodigal_id
+        return None
+
+    # --- Rankings ---
+
+    def rank_score(self, p_data):
+        """Combined ranking score of a prodigal under the current ranking weights."""
+        features = ranking_features(p_data)
+        return sum(self.ranking_weights[name] * value for name, value in features.items())
 
+    def _rank_prodigal(self, prodigal_id):
+        p_data = self.prodigal_results[prodigal_id]
+        score = self.rank_score(p_data)
+        if self.store is not None:
+            self.store.set_rank_score(prodigal_id, score)
+            return
+        self.rank_scores[prodigal_id] = score
+        bisect.insort(self.rankings.setdefault(p_data["n_value"], []), (-score, -prodigal_id))
 
-    def get_best_prodigals(self, n, task, context):
+    def _unrank_prodigal(self, prodigal_id):
+        if prodigal_id not in self.rank_scores:
+            return
+        ranking = self.rankings.get(self.prodigal_results[prodigal_id]["n_value"], [])
+        entry = (-self.rank_scores.pop(prodigal_id), -prodigal_id)
+        i = bisect.bisect_left(ranking, entry)
+        if i < len(ranking) and ranking[i] == entry:
+            del ranking[i]
+
+    def rebuild_rankings(self):
+        """Rescores every prodigal (one matrix-vector product) and re-sorts each n's ranking."""
+        if self.store is not None:
+            self.store.rescore(self.ranking_weights)  # One UPDATE; the rank index keeps it sorted
+            return
+        names = list(self.ranking_weights)
+        ids = list(self.prodigal_results)
+        features = np.array([[ranking_features(self.prodigal_results[pid])[name] for name in names] for pid in ids],
+                            dtype=np.float64).reshape(len(ids), len(names))
+        scores = features @ np.array([self.ranking_weights[name] for name in names], dtype=np.float64)
+        self.rank_scores = dict(zip(ids, scores.tolist()))
+        self.rankings = {}
+        for pid, score in self.rank_scores.items():
+            self.rankings.setdefault(self.prodigal_results[pid]["n_value"], []).append((-score, -pid))
+        for ranking in self.rankings.values():
+            ranking.sort()
+
+    def set_ranking_weights(self, weights):
+        """Changes (some of) the ranking weights and re-sorts the rankings; nothing is re-analyzed."""
+        self.ranking_weights.update(weights)
+        self.rebuild_rankings()
+
+    def get_best_prodigals(self, n, task, context, count=None):
         """Retrieves the best prodigals based on the current context.
 
         Args:
             n (int): The target n value.
             task (str): The task for which prodigals are needed (e.g., "generation", "completion").
             context (dict):  Additional context information (e.g., current superpermutation, missing permutations).
+            count (int): Return only the top `count` (O(count)); None returns all.
 
         Returns:
             dict: A dictionary of the best prodigals, sorted by rank.
         """
-        # 1. Filter prodigals based on n_value
-        relevant_prodigals = {
-            pid: data for pid, data in self.prodigal_results.items() if data["n_value"] == n
-        }
-
-        # 2. Rank prodigals
-        ranked_prodigals = self.rank_prodigals(relevant_prodigals)
+        return {p_data["id"]: p_data for p_data in self.iter_best_prodigals(n, count)}
 
-        # 3.  Return (for now, return all, sorted)
-        return ranked_prodigals
+    def iter_best_prodigals(self, n, count=None):
+        """Yields the best prodigals for n in rank order (lazily, with the SQLite backend)."""
+        if self.store is not None:
+            yield from self.store.query(n=n, limit=count)
+            return
+        ranking = self.rankings.get(n, [])
+        if count is not None:
+            ranking = ranking[:count]
+        for _, neg_id in ranking:
+            yield self.prodigal_results[-neg_id]
 
     def rank_prodigals(self, prodigals):
-        """Ranks prodigals based on a combined score."""
-        #This is a basic ranking, and can be improved.
+        """Ranks prodigals based on a combined score (see DEFAULT_RANKING_WEIGHTS)."""
         scored_prodigals = []
         for p_id, p_data in prodigals.items():
-            score = (
-                p_data["length"] * 1 +
-                p_data["overlap_rate"] * 100 +
-                p_data["winner_score"] -
-                p_data["loser_score"] -
-                len(p_data["breakpoints"]) * 10 + # Fewer breakpoints are better.
-                p_data['extensibility_score'] * 5
-            )
-            scored_prodigals.append((score, p_id))
+            scored_prodigals.append((self.rank_score(p_data), p_id))
 
         # Sort by score (highest first) and return as a dictionary
         sorted_prodigals = sorted(scored_prodigals, reverse=True)
         return {prodigals[p_id]["id"]: prodigals[p_id] for score, p_id in sorted_prodigals}
 
     def load_prodigals(self):
-        """Loads prodigal data from the JSON file."""
+        """Loads prodigal data from the JSON file (or opens the SQLite store)."""
+        if self.store is not None:
+            if not len(self.store) and os.path.exists(self.prodigal_file):
+                self._import_json_into_store()
+            self.prodigal_results = self.store
+            max_id = self.store.max_id()
+            self.next_prodigal_id = max_id + 1 if max_id is not None else 0
+            logging.info(f"Opened {len(self.store)} prodigals in {self.store.path}.")
+            return
+        loaded_prodigals = {}
         try:
             with open(self.prodigal_file, 'r') as f:
                 prodigal_data = json.load(f)
                 # Convert keys to integers and 'breakpoints' to list of dicts
-                loaded_prodigals = {}
                 for p_id_str, p_data in prodigal_data.items():
                     p_id = int(p_id_str)
-                    loaded_prodigals[p_id] = {
-                        'sequence': p_data['sequence'],
-                        'length': p_data['length'],
-                        'overlap_rate': p_data['overlap_rate'],
-                        'n_value': p_data['n_value'],
-                        'source': p_data['source'],
-                        'breakpoints': [{'position': bp['position'], 'reason': bp['reason'], 'n_values': bp['n_values']}
-                                         for bp in p_data.get('breakpoints', [])],  # Ensure 'breakpoints' exists
-                        'winner_score': p_data.get('winner_score', 0), # Handle potentially missing
-                        'loser_score': p_data.get('loser_score', 0),
-                        'extensibility_score': p_data.get('extensibility_score', 0),
-                        'parent_prodigals': p_data.get('parent_prodigals', []),
-                        'child_prodigals': p_data.get('child_prodigals', []),
-                        'used_count': p_data.get('used_count', 0),
-                        'id': p_id
-                    }
-                self.prodigal_results = loaded_prodigals
-                self.next_prodigal_id = max(self.prodigal_results.keys(), default=0) + 1 if self.prodigal_results else 0 #Next id
-                logging.info(f"Loaded {len(self.prodigal_results)} prodigals from {self.prodigal_file}.")
+                    loaded_prodigals[p_id] = self._prodigal_from_json(p_id, p_data)
+                logging.info(f"Loaded {len(loaded_prodigals)} prodigals from {self.prodigal_file}.")
         except FileNotFoundError:
             logging.info(f"No prodigal data file found: {self.prodigal_file}. Starting with an empty database.")
-            self.prodigal_results = {}
-            self.next_prodigal_id = 0
         except json.JSONDecodeError:
             logging.error(f"Error decoding JSON from {self.prodigal_file}.  Check for file corruption.")
-            self.prodigal_results = {}
-            self.next_prodigal_id = 0
+            loaded_prodigals = {}
+        if self.journal:
+            self._replay_journal(loaded_prodigals)
+        self.prodigal_results = loaded_prodigals
+        self.next_prodigal_id = max(self.prodigal_results.keys(), default=0) + 1 if self.prodigal_results else 0 #Next id
+        self.rebuild_indexes()
+        self.rebuild_rankings()
+
+    @staticmethod
+    def _prodigal_from_json(p_id, p_data):
+        """Normalizes a prodigal record read from the JSON file or the journal."""
+        return {
+            'sequence': p_data['sequence'],
+            'length': p_data['length'],
+            'overlap_rate': p_data['overlap_rate'],
+            'n_value': p_data['n_value'],
+            'source': p_data['source'],
+            'breakpoints': [{'position': bp['position'], 'reason': bp['reason'], 'n_values': bp['n_values']}
+                             for bp in p_data.get('breakpoints', [])],  # Ensure 'breakpoints' exists
+            'winner_score': p_data.get('winner_score', 0), # Handle potentially missing
+            'loser_score': p_data.get('loser_score', 0),
+            'extensibility_score': p_data.get('extensibility_score', 0),
+            'parent_prodigals': p_data.get('parent_prodigals', []),
+            'child_prodigals': p_data.get('child_prodigals', []),
+            'used_count': p_data.get('used_count', 0),
+            'id': p_id
+        }
+
+    # --- Journal (JSON backend) ---
+
+    def _journal_paths(self):
+        """(current journal, journal being compacted into the next snapshot)."""
+        base = os.path.splitext(self.prodigal_file)[0]
+        return f"{base}.journal.jsonl", f"{base}.journal.compacting.jsonl"
+
+    def _replay_journal(self, prodigals):
+        """Applies journal entries on top of the loaded snapshot (older journal first)."""
+        current, compacting = self._journal_paths()
+        replayed = 0
+        for path in (compacting, current):
+            if not os.path.exists(path):
+                continue
+            good_bytes = 0
+            with open(path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated entry")
+                        entry = json.loads(line)
+                    except ValueError:  # Includes JSONDecodeError
+                        # Run killed mid-write: drop the torn tail so later appends start on a clean line
+                        logging.warning(f"Dropping torn journal entry at {path}:{line_number}.")
+                        break
+                    prodigals[entry["id"]] = self._prodigal_from_json(entry["id"], entry["data"])
+                    good_bytes += len(line)
+                    replayed += 1
+            if good_bytes < os.path.getsize(path):
+                os.truncate(path, good_bytes)
+        self.journal_entries = replayed
+        if replayed:
+            logging.info(f"Replayed {replayed} journal entries.")
+
+    def _journal_append(self, op, prodigal_id):
+        if self._journal_file is None:
+            return
+        self._journal_file.write(json.dumps({"op": op, "id": prodigal_id, "data": self.prodigal_results[prodigal_id]}) + "\n")
+        self.journal_entries += 1
+        self._journal_unsynced += 1
+        if self._journal_unsynced >= self.journal_sync_every:
+            self.sync_journal()
+
+    def sync_journal(self):
+        """Flushes and fsyncs the journal."""
+        if self._journal_file is not None and self._journal_unsynced:
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+            self._journal_unsynced = 0
+
+    def compact_journal(self, wait=False):
+        """Writes a snapshot of all prodigals atomically, in a background thread.
+
+        The current journal is set aside (and a fresh one started) so the
+        snapshot covers exactly its entries; it is deleted once the snapshot
+        has replaced prodigal_file. Until then load_prodigals replays it, so a
+        crash at any point loses nothing.
+        """
+        if self._journal_file is None:
+            return
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()  # One compaction at a time
+        current, compacting = self._journal_paths()
+        self.sync_journal()
+        self._journal_file.close()
+        if os.path.exists(compacting):  # Left by an interrupted compaction: keep its entries too
+            with open(compacting, 'a') as dst, open(current, 'r') as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(current)
+        else:
+            os.replace(current, compacting)
+        self._journal_file = open(current, "a")
+        self.journal_entries = 0
+        # Copy records now; the thread only serializes them
+        snapshot = {str(k): dict(v, breakpoints=list(v["breakpoints"]), parent_prodigals=list(v["parent_prodigals"]),
+                                 child_prodigals=list(v["child_prodigals"]))
+                    for k, v in self.prodigal_results.items()}
+        self._compaction_thread = threading.Thread(target=self._write_snapshot, args=(snapshot, compacting), name="prodigal-compaction")
+        self._compaction_thread.start()
+        if wait:
+            self._compaction_thread.join()
+
+    def _write_snapshot(self, snapshot, compacting):
+        tmp_file = self.prodigal_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.prodigal_file)  # Atomic: readers see the old or the new snapshot
+        os.remove(compacting)
+        logging.info(f"Compacted {len(snapshot)} prodigals into {self.prodigal_file}.")
+
+    def close(self):
+        """Stops the worker pool, syncs the journal (or commits the SQLite store) and waits for any compaction."""
+        self.shutdown_pool()
+        if self.store is not None:
+            self.store.close()
+            return
+        self.sync_journal()
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def _import_json_into_store(self):
+        """One-time import of prodigal_file into an empty SQLite store."""
+        store, self.store = self.store, None  # Load through the JSON path first
+        self.load_prodigals()
+        loaded, self.store = self.prodigal_results, store
+        self.store.put_many(loaded.items())
+        self.prodigal_results = self.store
+        for prodigal_id in loaded:
+            self._index_prodigal(prodigal_id)
+        self.rebuild_rankings()
+        self.hash_index, self.fingerprint_index, self.rankings, self.rank_scores = {}, {}, {}, {}
+        logging.info(f"Imported {len(loaded)} prodigals from {self.prodigal_file} into {self.store.path}.")
 
     def save_prodigals(self):
-        """Saves the prodigal data to the JSON file."""
+        """Saves the prodigal data to the JSON file (with SQLite: commits pending writes;
+        with the journal: fsyncs it, compacting once it is long)."""
+        if self.store is not None:
+            self.store.commit()
+            logging.info(f"Committed {len(self.store)} prodigals to {self.store.path}.")
+            return
+        if self.journal:
+            # Every change is already journaled; just make it durable, and compact now and then
+            self.sync_journal()
+            if self.journal_entries >= self.journal_compact_every:
+                self.compact_journal()
+            return
         with open(self.prodigal_file, 'w') as f:
             # Convert keys to strings before saving (JSON requires string keys)
             prodigal_results_str_keys = {str(k): v for k, v in self.prodigal_results.items()}
             json.dump(prodigal_results_str_keys, f, indent=4)
         logging.info(f"Saved {len(self.prodigal_results)} prodigals to {self.prodigal_file}.")
 
+    def export_shared(self, name=None):
+        """Exports the library into shared memory for worker processes.
+
+        Workers call SharedProdigalLibrary.attach(library.name) instead of
+        receiving this manager by pickle. The exporting process calls close()
+        on the returned library when the workers are done.
+        """
+        return SharedProdigalLibrary.create(self.prodigal_results, self.rank_score, name)
+
     def get_prodigal_by_id(self, prodigal_id):
         """Retrieves a prodigal by its ID."""
         return self.prodigal_results.get(prodigal_id)
     def update_prodigal(self, prodigal_id, new_data):
       """Updates and saves new data to an exisiting prodigal ID"""
       if prodigal_id in self.prodigal_results:
+        self._unindex_prodigal(prodigal_id)
+        self._unrank_prodigal(prodigal_id)
         self.prodigal_results[prodigal_id] = new_data
+        self._index_prodigal(prodigal_id)
+        self._rank_prodigal(prodigal_id)
+        self._journal_append("update", prodigal_id)
         return True
-      return False
\ No newline at end of file
+      return False
+
+
+def _prodigal_writer_main(manager_args, manager_kwargs, candidates, epoch, ready, stopped, prefix, publish_every, publish_interval):
+    """Writer process: the only owner of the ProdigalManager.
+
+    Drains candidate batches from the queue and commits them (duplicate
+    checks, ID assignment). At most once per `publish_interval` seconds, it
+    saves and publishes a new shared library and bumps the epoch. A None
+    batch stops it; `stopped` is set however it exits.
+    """
+    manager = None
+    published = None
+
+    def publish():
+        nonlocal published
+        version = epoch.value + 1
+        library = manager.export_shared(f"{prefix}_{version}")
+        epoch.value = version
+        if published is not None:
+            published.close()  # Unlinks the name; readers still attached keep their mapping
+        published = library
+
+    try:
+        manager = ProdigalManager(*manager_args, **manager_kwargs)
+        publish()
+        ready.set()
+        last_publish = time.monotonic()
+        pending = 0  # Prodigals added since the last publish
+        stopping = False
+        while not stopping:
+            # With nothing pending, block; otherwise wake up in time for the next publish
+            timeout = max(0.0, last_publish + publish_interval - time.monotonic()) if pending else None
+            try:
+                batches = [candidates.get(timeout=timeout)]
+            except queue.Empty:
+                batches = []
+            while batches and sum(len(batch) for batch in batches if batch) < publish_every:
+                try:
+                    batches.append(candidates.get_nowait())
+                except queue.Empty:
+                    break
+            for batch in batches:
+                if batch is None:
+                    stopping = True
+                    continue
+                for candidate in batch:
+                    if manager._commit_prodigal(*candidate) is not None:
+                        pending += 1
+            # Each export copies the whole library, so it is rate-limited rather than per batch
+            if pending and not stopping and time.monotonic() - last_publish >= publish_interval:
+                manager.save_prodigals()
+                publish()
+                logging.info(f"Prodigal writer published epoch {epoch.value} ({pending} new prodigals).")
+                pending = 0
+                last_publish = time.monotonic()
+    finally:
+        stopped.set()
+        if manager is not None:
+            manager.save_prodigals()
+            manager.close()
+        if published is not None:
+            published.close()
+
+
+class ProdigalClient:
+    """Worker-side handle to a ProdigalWriter.
+
+    Extends and analyzes candidates locally and sends the results to the
+    writer. library() returns the latest published SharedProdigalLibrary and
+    re-attaches only when the writer's epoch has moved on. Pass it to worker
+    processes when they are created (Process args or a pool initializer),
+    because the queue and the epoch counter cannot be pickled later.
+    """
+
+    def __init__(self, candidates, epoch, stopped, prefix):
+        self.candidates = candidates
+        self.epoch = epoch
+        self.stopped = stopped
+        self.prefix = prefix
+        self._library = None
+        self._library_epoch = 0
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_library"], state["_library_epoch"] = None, 0  # Each process attaches on its own
+        return state
+
+    def current_epoch(self):
+        return self.epoch.value
+
+    def submit(self, candidates):
+        """Sends [(extended_sequence, prodigal_data, n_value, source)] to the writer as one batch."""
+        if candidates:
+            self.candidates.put(list(candidates))
+
+    def add_prodigal(self, sequence, n_value, source, winners={}, losers={}, layout_memory=None, laminates=[], anti_laminates=[]):
+        """Same as ProdigalManager.add_prodigal, but the commit happens in the writer."""
+        self.add_prodigals([sequence], n_value, source, winners, losers, layout_memory, laminates, anti_laminates)
+
+    def add_prodigals(self, sequences, n_value, source, winners={}, losers={}, layout_memory=None, laminates=[], anti_laminates=[]):
+        data = (winners, losers, layout_memory, laminates, anti_laminates)
+        self.submit([_extend_and_analyze(sequence, n_value, data) + (n_value, source) for sequence in sequences])
+
+    def library(self, attempts=20):
+        """Returns the newest published library (attached once per epoch).
+
+        A version can be superseded between reading the epoch and attaching,
+        so a missing block is retried with backoff, up to `attempts` times.
+
+        Raises:
+            RuntimeError: If the writer has stopped, or no version could be attached.
+        """
+        delay = 0.001
+        for _ in range(attempts):
+            if self.stopped.is_set():
+                raise RuntimeError("The prodigal writer has stopped; its library is no longer published.")
+            version = self.epoch.value
+            if version == self._library_epoch:
+                return self._library
+            try:
+                library = SharedProdigalLibrary.attach(f"{self.prefix}_{version}")
+            except FileNotFoundError:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+                continue
+            if self._library is not None:
+                self._library.close()
+            self._library, self._library_epoch = library, version
+            return library
+        raise RuntimeError(f"Could not attach to prodigal library {self.prefix}_{self.epoch.value} "
+                           f"after {attempts} attempts; is the writer still running?")
+
+    def close(self):
+        if self._library is not None:
+            self._library.close()
+            self._library, self._library_epoch = None, 0
+
+
+class ProdigalWriter:
+    """Runs a ProdigalManager in a single writer process for concurrent ingestion.
+
+    Any number of workers send candidate prodigals through ProdigalClient.
+    Only the writer deduplicates, assigns IDs and persists them, so there
+    are no locks and no lost updates. When prodigals have been added, the
+    writer saves and publishes a new read-only library version in shared
+    memory and increments the epoch counter, at most once per
+    `publish_interval` seconds: each version is a full export, so bursts of
+    batches share one.
+
+    Usage:
+        with ProdigalWriter(n, prodigal_file, journal=True) as writer:
+            client = writer.client()  # hand to workers at creation
+            ...
+    """
+
+    def __init__(self, n, prodigal_file="prodigal_results.json", publish_every=256, publish_interval=1.0, **manager_kwargs):
+        """Args:
+            n, prodigal_file, **manager_kwargs: Passed to the writer's ProdigalManager.
+            publish_every (int): Most candidates committed per drain of the queue.
+            publish_interval (float): Least seconds between published versions.
+        """
+        context = multiprocessing.get_context()
+        self.candidates = context.Queue()
+        self.epoch = context.Value("q", 0)
+        self.stopped = context.Event()
+        self.prefix = f"pw{os.getpid()}_{os.urandom(3).hex()}"
+        self._ready = context.Event()
+        self._process = context.Process(target=_prodigal_writer_main, daemon=True,
+                                        args=((n, prodigal_file), manager_kwargs, self.candidates, self.epoch, self._ready,
+                                              self.stopped, self.prefix, publish_every, publish_interval))
+
+    def start(self):
+        """Starts the writer and waits for its first epoch (the loaded library)."""
+        resource_tracker.ensure_running()  # Writer and workers then share this process's tracker
+        self._process.start()
+        while not self._ready.wait(1):
+            if not self._process.is_alive():
+                raise RuntimeError(f"Prodigal writer exited with code {self._process.exitcode}.")
+        return self
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def client(self):
+        return ProdigalClient(self.candidates, self.epoch, self.stopped, self.prefix)
+
+    def close(self):
+        """Stops the writer after it has committed and saved everything already queued.
+
+        Call it once the workers have finished submitting.
+        """
+        if self._process.is_alive():
+            self.candidates.put(None)
+        self._process.join()
+        self.stopped.set()  # Also covers a writer that died without setting it
+        if self._process.exitcode:
+            # A killed writer cannot unlink its last published version; do it here
+            try:
+                library = SharedProdigalLibrary.attach(f"{self.prefix}_{self.epoch.value}")
+                library.owner = True
+                library.close()
+            except (FileNotFoundError, ValueError):
+                pass
+            raise RuntimeError(f"Prodigal writer exited with code {self._process.exitcode}.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,61 @@
+# test_graph_utils.py
+import itertools
+import random
+
+from graph_utils import (add_weights_to_debruijn, build_de_bruijn_graph, find_bridges, load_overlap_graph, run_atsp_search,
+                         update_edge_weights)
+from utils import calculate_overlap
+
+
+def _edge_weights(graph):
+    """{kmer: (winner_weight, loser_weight)} for a networkx or compact De Bruijn graph."""
+    if hasattr(graph, "edge_codes"):
+        return {graph.kmer(e): (graph.winner_weight[e], graph.loser_weight[e]) for e in range(graph.num_edges)}
+    return {u + v[-1]: (data["winner_weight"], data["loser_weight"]) for u, v, data in graph.edges(data=True)}
+
+
+def test_networkx_and_compact_graphs_get_the_same_weights():
+    n, k = 5, 4
+    kmers = sorted({"".join(map(str, p))[i:i + k] for p in itertools.permutations(range(1, n + 1)) for i in range(n - k + 1)})
+    winners = {(n, kmer): float(i % 7) for i, kmer in enumerate(kmers[::3])}
+    losers = {(n, kmer): -float(i % 5) for i, kmer in enumerate(kmers[1::4])}
+    winners[(n - 1, kmers[0])] = 99.0  # Another n's key must not leak in
+
+    networkx_graph = build_de_bruijn_graph(kmers, n, k)
+    compact_graph = build_de_bruijn_graph(kmers, n, k, compact=True)
+    add_weights_to_debruijn(networkx_graph, winners, losers)
+    add_weights_to_debruijn(compact_graph, winners, losers)
+    assert _edge_weights(networkx_graph) == _edge_weights(compact_graph)
+    assert any(weights != (0, 0) for weights in _edge_weights(compact_graph).values())
+
+    # Incremental updates of the compact graph match a full reweighting
+    changed = {(n, kmers[2]), (n, kmers[5])}
+    winners[(n, kmers[2])] = 42.0
+    losers[(n, kmers[5])] = -42.0
+    update_edge_weights(compact_graph, changed, winners, losers)
+    add_weights_to_debruijn(networkx_graph, winners, losers)
+    assert _edge_weights(networkx_graph) == _edge_weights(compact_graph)
+
+
+def test_bridges_never_cost_more_than_the_direct_junction(tmp_path):
+    n = 5
+    overlap_graph = load_overlap_graph(n, cache_dir=str(tmp_path))
+    rng = random.Random(0)
+    pairs = [("12345", "35421"), ("1234512", "23451")]
+    for _ in range(20):
+        pairs.append(("".join(rng.sample("12345", n)), "".join(rng.sample("12345", n))))
+    missing = {hash(p) for p in itertools.permutations(range(1, n + 1)) if sum(p[:2]) % 2}
+    for segment1, segment2 in pairs:
+        direct = n - calculate_overlap(segment1, segment2)
+        for kwargs in ({}, {"missing": missing, "missing_bonus": 0.5}):
+            bridges = find_bridges(overlap_graph, segment1, segment2, 3 * n, **kwargs)
+            assert bridges, (segment1, segment2)
+            assert all((segment1 + bridge).endswith(segment2) for _, bridge in bridges)
+            if not kwargs:
+                assert bridges[0][0] <= direct, (segment1, segment2, bridges)
+
+
+def test_atsp_search_reaches_the_optimum_for_n4(tmp_path):
+    superpermutation, length = run_atsp_search(4, time_budget=1.0, cache_dir=str(tmp_path))
+    assert length == len(superpermutation) == 33
+    assert all("".join(map(str, p)) in superpermutation for p in itertools.permutations(range(1, 5)))
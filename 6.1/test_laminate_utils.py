@@ -0,0 +1,90 @@
+# test_laminate_utils.py
+import gc
+
+import numpy as np
+
+import laminate_utils
+from laminate_utils import (BitsetLaminate, LaminateAlbum, compile_laminate_stack, edge_universe, estimate_laminate_connectivity,
+                            select_laminates)
+
+
+def test_loaded_laminates_start_at_version_zero_with_a_bounded_log(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    laminate = BitsetLaminate.from_codes(n, k, universe[:40])
+    assert (laminate.version, laminate.delta_log, laminate.deltas_since(0)) == (0, [], [])
+    assert laminate.number_of_edges() == 40
+
+    laminate.max_log_entries = 8
+    for code in universe[40:60].tolist():
+        laminate.add_codes([code])
+    assert len(laminate.delta_log) == laminate.max_log_entries
+    assert laminate.deltas_since(laminate.version - 1)[0][1].tolist() == [code]
+    with np.testing.assert_raises(ValueError):
+        laminate.deltas_since(0)
+
+
+def test_album_charges_and_refunds_the_same_bytes(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    album = LaminateAlbum(str(tmp_path / "album"), memory_budget=1)
+    ids = [album.add(BitsetLaminate.from_codes(n, k, universe[i:i + 20]), n, k, "test", score=i) for i in range(4)]
+    album.get(ids[-1]).compatibility_table(k)  # Grows while resident
+    album.get(ids[0])
+    for laminate_id in ids:
+        album.remove(laminate_id)
+    assert (album.resident, album.resident_bytes) == ({}, 0)
+
+
+def test_album_index_is_written_on_flush(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    directory = tmp_path / "album"
+    album = LaminateAlbum(str(directory))
+    for i in range(3):
+        album.update_score(album.add(BitsetLaminate.from_codes(n, k, universe[:10 + i]), n, k, "test"), float(i))
+    assert not (directory / "album.json").exists()
+    album.flush()
+    reopened = LaminateAlbum(str(directory))
+    assert reopened.select_ids(n, k) == [3, 2, 1]
+    assert reopened.get(3).number_of_edges() == 12
+
+
+def test_select_laminates_accepts_an_entry_dict():
+    all_laminates = {(5, 4): [{"score": 0.5, "graph": "b"}, {"score": 0.0, "graph": "invalid"}, {"score": 2.0, "graph": "a"}]}
+    assert select_laminates(5, 4, "bridge", {}, all_laminates) == ["a", "b"]
+    assert select_laminates(5, 3, "bridge", {}, all_laminates) == []
+
+
+def test_connectivity_always_samples_and_never_caches_a_non_estimate(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    laminate = BitsetLaminate.from_codes(n, k, universe)
+    result = estimate_laminate_connectivity(laminate, num_samples=8, time_budget=0.0)
+    assert result["samples"] == 1 and result["node_connectivity"] > 0
+    assert estimate_laminate_connectivity(laminate, num_samples=8, time_budget=0.0) is result  # Cached
+
+    result = estimate_laminate_connectivity(laminate, num_samples=0)
+    assert (result["samples"], result["node_connectivity"]) == (0, None)
+    assert estimate_laminate_connectivity(laminate, num_samples=0) is not result
+
+
+def test_automaton_rejects_bad_symbols_and_reuses_converted_graphs(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    laminate = BitsetLaminate.from_codes(n, k, universe)
+    automaton = compile_laminate_stack([laminate], n)
+    assert automaton.first_violation("1234512") == -1
+    for candidate, position in (("12345/2", 5), ("123451:", 6), ("1234512é", 7), ("12x4512", 2), ("1234-12", 4)):
+        assert automaton.first_violation(candidate) == position, candidate
+
+    graph = laminate.to_networkx()
+    assert compile_laminate_stack([graph], n) is compile_laminate_stack([graph], n)
+    graph.remove_edge("123", "234")
+    assert compile_laminate_stack([graph], n).first_violation("123451") == 3
+
+    cached = len(laminate_utils._automaton_cache)
+    del laminate, graph
+    gc.collect()
+    compile_laminate_stack([], n)
+    assert len(laminate_utils._automaton_cache) < cached
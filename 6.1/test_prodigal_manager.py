@@ -0,0 +1,81 @@
+# test_prodigal_manager.py
+import pickle
+
+import pytest
+
+import prodigal_manager
+from laminate_utils import AntiLaminate, BitsetLaminate, edge_universe
+from prodigal_manager import ProdigalManager
+
+
+def _prodigal_data():
+    return {"is_prodigal": True, "overlap_rate": 1.0, "breakpoints": [], "winner_score": 0.0, "loser_score": 0.0,
+            "extensibility_score": 0.0}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_contained_sequences_are_linked_by_default_even_when_short(tmp_path, backend):
+    manager = ProdigalManager(4, str(tmp_path / "prodigals.json"), backend=backend)
+    long_id = manager._commit_prodigal("1234123412341234", _prodigal_data(), 4, "test")
+    assert manager.find_container("2341234") == long_id  # Shorter than one fingerprint window (3n - 1 symbols)
+    short_id = manager._commit_prodigal("2341234", _prodigal_data(), 4, "test")
+    assert short_id is not None
+    assert manager.prodigal_results[short_id]["parent_prodigals"] == [long_id]
+    assert manager.prodigal_results[long_id]["child_prodigals"] == [short_id]
+    assert manager.find_container("4321") is None
+
+    skipping = ProdigalManager(4, str(tmp_path / "skipping.json"), contained_policy="skip", backend=backend)
+    skipping._commit_prodigal("1234123412341234", _prodigal_data(), 4, "test")
+    assert skipping._commit_prodigal("3412341", _prodigal_data(), 4, "test") is None
+
+
+def test_pool_data_is_published_as_a_snapshot_then_patches(tmp_path):
+    n, k = 5, 4
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    laminate = BitsetLaminate.from_codes(n, k, universe[:30])
+    anti_laminate = AntiLaminate(n, k, removed=universe[:5].tolist())
+    winners, losers, layout_memory = {(n, "1234"): 1.0}, {(n, "4321"): 2.0}, {"a": {"count": 1}}
+    data = (winners, losers, layout_memory, [laminate], [anti_laminate])
+    manager = ProdigalManager(n, str(tmp_path / "prodigals.json"))
+
+    def worker_view():
+        prodigal_manager._load_worker_data(tuple(manager._pool_data_paths))
+        return prodigal_manager._worker_data
+
+    try:
+        manager._worker_pool(2, data)
+        snapshot = manager._pool_data_paths[0]
+        assert worker_view()[:3] == [winners, losers, layout_memory]
+        manager._worker_pool(2, data)
+        assert manager._pool_data_paths == [snapshot]  # Nothing changed, nothing written
+
+        winners[(n, "2345")] = 3.0
+        del losers[(n, "4321")]
+        layout_memory["a"]["count"] += 1
+        laminate.add_codes(universe[30:40])
+        anti_laminate.remove_codes(universe[5:7])
+        data = (winners, losers, layout_memory, [laminate, laminate.copy()], [anti_laminate])
+        manager._worker_pool(2, data)
+        assert len(manager._pool_data_paths) == 2
+        worker_winners, worker_losers, worker_layout, worker_laminates, worker_anti = worker_view()
+        assert (worker_winners, worker_losers, worker_layout) == (winners, losers, layout_memory)
+        assert [lam.edge_codes().tolist() for lam in worker_laminates] == [laminate.edge_codes().tolist()] * 2
+        assert worker_anti[0].removed == anti_laminate.removed
+    finally:
+        manager.shutdown_pool()
+    assert manager._pool_data_paths == []
+
+
+def test_laminates_pickle_without_their_universe(tmp_path):
+    n, k = 6, 5
+    universe, _ = edge_universe(n, k, cache_dir=str(tmp_path))
+    laminate = BitsetLaminate.from_codes(n, k, universe[::3])
+    laminate.compatibility_table(k)
+    blob = pickle.dumps(laminate)
+    assert len(blob) < universe.nbytes
+    restored = pickle.loads(blob)
+    assert restored.universe is laminate.universe and restored._compat == {}
+    assert restored.edge_codes().tolist() == laminate.edge_codes().tolist()
+    anti_laminate = AntiLaminate(n, k, removed=universe[:3].tolist())
+    anti_laminate.words  # Materialized, but not pickled
+    assert pickle.loads(pickle.dumps(anti_laminate)).number_of_edges() == len(universe) - 3
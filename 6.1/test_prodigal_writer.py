@@ -0,0 +1,65 @@
+# test_prodigal_writer.py
+import multiprocessing
+import time
+
+import pytest
+
+from prodigal_manager import ProdigalClient, ProdigalManager, ProdigalWriter
+
+
+def _candidate(sequence, winner_score):
+    """An already extended and analyzed candidate, as ProdigalClient.submit takes them."""
+    prodigal_data = {"is_prodigal": True, "overlap_rate": 1.0, "breakpoints": [], "winner_score": winner_score,
+                     "loser_score": 0.0, "extensibility_score": 0.0}
+    return (sequence, prodigal_data, 5, "test")
+
+
+def _read_library(client, results):
+    """Reader process: attaches to the current library, reports it and exits."""
+    library = client.library()
+    results.put(sorted(p_data["sequence"] for p_data in library.get_best_prodigals(5, "generation", {}).values()))
+    client.close()
+
+
+def _wait_for_epoch(client, epoch, timeout=30):
+    deadline = time.monotonic() + timeout
+    while client.current_epoch() < epoch:
+        assert time.monotonic() < deadline, "writer never published"
+        time.sleep(0.01)
+
+
+def test_writer_publishes_to_readers_and_late_readers(tmp_path):
+    prodigal_file = str(tmp_path / "prodigals.json")
+    expected = ["123451234", "543215432"]
+    writer = ProdigalWriter(6, prodigal_file, publish_interval=0)
+    with writer:
+        client = writer.client()
+        assert len(client.library()) == 0  # Epoch 1: the (empty) loaded library
+        client.submit([_candidate("123451234", 1.0), _candidate("123451234", 1.0), _candidate("543215432", 2.0)])
+        _wait_for_epoch(client, 2)
+
+        # A reader attaches and exits, then a late reader must still find the library
+        results = multiprocessing.Queue()
+        for _ in range(2):
+            reader = multiprocessing.Process(target=_read_library, args=(client, results))
+            reader.start()
+            assert results.get(timeout=30) == expected
+            reader.join()
+            assert reader.exitcode == 0
+        assert sorted(p_data["sequence"] for p_data in client.library().get_best_prodigals(5, "generation", {}).values()) == expected
+        client.close()
+
+    assert not writer.is_alive()
+    with pytest.raises(RuntimeError):
+        client.library()  # The writer is gone
+    manager = ProdigalManager(6, prodigal_file)
+    assert sorted(p_data["sequence"] for p_data in manager.prodigal_results.values()) == expected
+
+
+def test_library_gives_up_on_a_missing_version():
+    context = multiprocessing.get_context()
+    client = ProdigalClient(context.Queue(), context.Value("q", 3), context.Event(), f"pw_missing_{time.monotonic_ns()}")
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="after 4 attempts"):
+        client.library(attempts=4)
+    assert time.monotonic() - start < 5
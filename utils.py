@@ -67,8 +67,29 @@ def unhash_permutation(perm_hash, n):
     else:
         raise TypeError("Permutation hash must be int")
 
-def generate_n_minus_1_superpermutation(n, seed):
+def permutation_rank(perm) -> int:
+    """Returns the 0-based lexicographic rank of a permutation of 1..n (Lehmer code)."""
+    n = len(perm)
+    rank = 0
+    for i in range(n):
+        smaller = sum(1 for x in perm[i + 1:] if x < perm[i])
+        rank += smaller * math.factorial(n - 1 - i)
+    return rank
+
+def permutation_unrank(rank: int, n: int) -> tuple:
+    """Returns the permutation of 1..n with the given lexicographic rank."""
+    remaining = list(range(1, n + 1))
+    perm = []
+    for i in range(n - 1, -1, -1):
+        index, rank = divmod(rank, math.factorial(i))
+        perm.append(remaining.pop(index))
+    return tuple(perm)
+
+def generate_n_minus_1_superpermutation(n, seed, config=None):
     """Generates a distinct superpermutation for n-1.
+
+    config's "prodigal_select_count" caps the best prodigals fetched each
+    iteration (all of them when it is missing).
     """
     #We will use our modified n-1 code.
 
@@ -82,6 +103,7 @@ def generate_n_minus_1_superpermutation(n, seed):
     hypothetical_prodigal_generation_count = 50  # n-1 is fast
     num_iterations = 1000 #Should be enough.
     layout_k_values = [n - 2, n - 3]
+    prodigal_select_count = (config or {}).get("prodigal_select_count")  # Only the top prodigals are needed each iteration
 
     if seed is not None:
         random.seed(seed)
@@ -128,7 +150,7 @@ def generate_n_minus_1_superpermutation(n, seed):
 
 
         #Find best prodigals
-        best_prodigals = prodigal_manager.get_best_prodigals(n=n-1, task="generation", context={})
+        best_prodigals = prodigal_manager.get_best_prodigals(n=n-1, task="generation", context={}, count=prodigal_select_count)
         # 2. Construct Superpermutation (using the dynamic approach, starting from EMPTY)
         superpermutation, used_permutations = construct_superpermutation([], best_prodigals, winners, losers, layout_memory, meta_hierarchy, limbo_list, n-1, hypothetical_prodigals, laminates)
         #print(f"  Superpermutation length: {len(superpermutation)}")
@@ -144,8 +166,7 @@ def generate_n_minus_1_superpermutation(n, seed):
 
         # Find and add new prodigal results. Stricter criteria.
         new_prodigals = find_prodigal_results(superpermutation, n-1, overlap_threshold=prodigal_overlap_threshold,  min_length=prodigal_min_length)
-        for prodigal_seq in new_prodigals:
-            prodigal_manager.add_prodigal(prodigal_seq, n-1, "dynamic_generation")
+        prodigal_manager.add_prodigals(new_prodigals, n-1, "dynamic_generation")
 
         # Update "Winners" and "Losers" (using the new superpermutation, and k=6 and k=5)
         new_winners6, new_losers6 = calculate_winners_losers([superpermutation], n-1, k=n-2)